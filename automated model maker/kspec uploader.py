@@ -6,12 +6,24 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton,
     QFileDialog, QMessageBox, QHBoxLayout, QLabel, QLineEdit,
     QScrollArea, QComboBox, QCheckBox, QGridLayout, QInputDialog,
-    QFrame, QSpacerItem, QSizePolicy
+    QFrame, QSpacerItem, QSizePolicy, QProgressDialog
 )
 from PyQt5.QtGui import QIcon, QFont, QPixmap, QPalette, QColor
 from PyQt5.QtCore import Qt
 import json
+import copy
+import hashlib
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Chunked asset upload (backend /assets/*): 4 MB chunks, 4 in flight
+ASSET_CHUNK_SIZE = 4 * 1024 * 1024
+ASSET_UPLOAD_WORKERS = 4
+ASSET_CHUNK_RETRIES = 3
+# The backend only accepts asset uploads with its upload (or admin) token
+ASSET_UPLOAD_TOKEN = os.getenv("KSPEC_UPLOAD_TOKEN", "")
+MODEL_KEYS = ["YOLO_DONTDETECT", "YOLO_ROIDETECT", "YOLO_SIMPLEDETECT"]
 
 # Modern styling constants
 MODERN_STYLE = """
@@ -168,6 +180,142 @@ QFrame {
 }
 """
 
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def collect_local_assets(kspec):
+    """(container, key) pairs of every model/image path in the KSpec that exists on this machine."""
+    fields = []
+    if kspec.get("mainImagePath"):
+        fields.append((kspec, "mainImagePath"))
+    for comp in kspec.get("components", []):
+        if comp.get("mainImage"):
+            fields.append((comp, "mainImage"))
+        pipeline = comp.get("pipelineConfig", {})
+        for key in MODEL_KEYS:
+            if pipeline.get(key) and pipeline[key] != "SKIP":
+                fields.append((pipeline, key))
+        for sub in comp.get("subComponents", []):
+            if sub.get("referenceImage"):
+                fields.append((sub, "referenceImage"))
+    for sub in kspec.get("subComponents", []):
+        if sub.get("referenceImage"):
+            fields.append((sub, "referenceImage"))
+    return [(c, k) for c, k in fields if os.path.isfile(c[k])]
+
+
+class AssetUploader:
+    """
+    Uploads KSpec assets to the backend blob store in parallel, checksummed chunks.
+    Assets the server already has (by SHA-256) are skipped, and a re-run resumes
+    from the chunks the server reports as received.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        if ASSET_UPLOAD_TOKEN:
+            self.session.headers["X-Upload-Token"] = ASSET_UPLOAD_TOKEN
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def _send_chunk(self, upload_id, path, index):
+        with open(path, "rb") as f:
+            f.seek(index * ASSET_CHUNK_SIZE)
+            data = f.read(ASSET_CHUNK_SIZE)
+        headers = {"X-Chunk-SHA256": hashlib.sha256(data).hexdigest(), "Content-Type": "application/octet-stream"}
+        url = f"{self.base_url}/assets/upload/{upload_id}/chunks/{index}"
+        for attempt in range(ASSET_CHUNK_RETRIES):
+            try:
+                response = self.session.put(url, data=data, headers=headers, timeout=60)
+                if response.status_code == 200:
+                    break
+                if attempt == ASSET_CHUNK_RETRIES - 1:
+                    raise RuntimeError(f"Chunk {index} rejected: {response.text[:200]}")
+            except requests.exceptions.RequestException:
+                if attempt == ASSET_CHUNK_RETRIES - 1:
+                    raise
+        with self._lock:
+            self.sent_bytes += len(data)
+
+    def upload(self, kspec, on_progress=None):
+        """
+        Returns a copy of the KSpec whose local asset paths are replaced by server blob paths.
+        on_progress(sent_bytes, total_bytes, message) is called from this (the calling) thread.
+        """
+        kspec = copy.deepcopy(kspec)
+        fields = collect_local_assets(kspec)
+
+        assets = {}  # sha256 -> (path, ext)
+        for index, (container, key) in enumerate(fields):
+            path = container[key]
+            if on_progress:
+                on_progress(0, 0, f"Hashing {os.path.basename(path)} ({index + 1}/{len(fields)})")
+            sha = sha256_file(path)
+            container[key] = sha
+            assets.setdefault(sha, (path, os.path.splitext(path)[1].lower()))
+
+        check = self.session.post(
+            f"{self.base_url}/assets/check",
+            json={"assets": [{"sha256": sha, "ext": ext} for sha, (_, ext) in assets.items()]},
+            timeout=30,
+        )
+        check.raise_for_status()
+        blobs = dict(check.json()["present"])
+
+        # Plan chunks for everything the server is missing (minus chunks it already holds)
+        pending = []
+        for sha in check.json()["missing"]:
+            path, ext = assets[sha]
+            size = os.path.getsize(path)
+            response = self.session.post(
+                f"{self.base_url}/assets/upload/init",
+                json={"sha256": sha, "ext": ext, "size": size, "chunk_size": ASSET_CHUNK_SIZE},
+                timeout=30,
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Starting upload of {path} failed: {response.text[:200]}")
+            init = response.json()
+            if init.get("complete"):
+                blobs[sha] = init["blob"]
+                continue
+            received = set(init["received"])
+            chunks = [i for i in range(init["total_chunks"]) if i not in received]
+            self.total_bytes += size
+            self.sent_bytes += size - sum(min(ASSET_CHUNK_SIZE, size - i * ASSET_CHUNK_SIZE) for i in chunks)
+            pending.append((sha, init["upload_id"], path, chunks))
+
+        with ThreadPoolExecutor(max_workers=ASSET_UPLOAD_WORKERS) as pool:
+            futures = {
+                pool.submit(self._send_chunk, upload_id, path, i)
+                for _, upload_id, path, chunks in pending for i in chunks
+            }
+            skipped = len(assets) - len(pending)
+            while futures:
+                done, futures = wait(futures, timeout=0.1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()  # re-raise chunk failures
+                if on_progress:
+                    on_progress(self.sent_bytes, self.total_bytes,
+                                f"Uploading {len(pending)} assets ({skipped} already on server)")
+
+        for sha, upload_id, _, _ in pending:
+            response = self.session.post(f"{self.base_url}/assets/upload/{upload_id}/complete", timeout=120)
+            if response.status_code != 200:
+                raise RuntimeError(f"Finalizing {assets[sha][0]} failed: {response.text[:200]}")
+            blobs[sha] = response.json()["blob"]
+
+        for container, key in fields:
+            container[key] = blobs[container[key]]
+        return kspec
+
+
 class KSpecUploader(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -2014,15 +2162,30 @@ class FinalReviewPage(QWidget):
     def dummy_upload(self):
         progress_msg = None
         try:
-            # Show progress message
-            #
+            # Show progress while assets are hashed and uploaded
+            progress_msg = QProgressDialog("Preparing upload...", None, 0, 1000, self)
+            progress_msg.setWindowTitle("Uploading KSpec")
+            progress_msg.setWindowModality(Qt.WindowModal)
+            progress_msg.setMinimumDuration(0)
+            progress_msg.show()
             QApplication.processEvents()
 
+            def on_progress(sent, total, message):
+                progress_msg.setValue(int(sent * 1000 / total) if total else 0)
+                mb = 1024 * 1024
+                progress_msg.setLabelText(f"{message}\n{sent / mb:.1f} / {total / mb:.1f} MB" if total else message)
+                QApplication.processEvents()
+
             # ✅ Use dynamic backend IP from main window
-            backend_url = f"{self.parent_window.backend_ip.rstrip('/')}/recievenewkspec"
+            base_url = self.parent_window.backend_ip.rstrip('/')
+            backend_url = f"{base_url}/recievenewkspec"
+
+            # ✅ Models + images go up first (chunked, resumable); metadata then points at server blobs
+            uploaded_kspec = AssetUploader(base_url).upload(self.final_kspec, on_progress)
+            on_progress(1, 1, "Registering KSpec...")
 
             data = {
-                'kspec_metadata': json.dumps(self.final_kspec, ensure_ascii=False)
+                'kspec_metadata': json.dumps(uploaded_kspec, ensure_ascii=False)
             }
 
             response = requests.post(backend_url, data=data, timeout=60)
@@ -2068,7 +2231,7 @@ class FinalReviewPage(QWidget):
             QMessageBox.critical(
                 self,
                 "❌ Upload Timeout",
-                "Upload timed out (metadata only). Please try again."
+                "Upload timed out. Please try again; assets already sent will not be re-uploaded."
             )
         except Exception as req_error:
             QMessageBox.critical(
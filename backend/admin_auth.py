@@ -0,0 +1,44 @@
+import os
+import hmac
+
+from fastapi.responses import JSONResponse
+
+# ✅ Guard for /debug/* and other admin-only endpoints.
+# Callers must send KSPEC_ADMIN_TOKEN in the X-Admin-Token header; without a token
+# configured the endpoints are closed. The client address is no proof: behind a
+# reverse proxy on the same host every request arrives from loopback. For local
+# development KSPEC_ADMIN_LOOPBACK=1 opens them to loopback clients instead.
+# The KSpec uploader may instead send KSPEC_UPLOAD_TOKEN in X-Upload-Token, which
+# opens the /assets/* upload routes only.
+ADMIN_TOKEN_ENV = "KSPEC_ADMIN_TOKEN"
+ADMIN_HEADER = "x-admin-token"
+UPLOAD_TOKEN_ENV = "KSPEC_UPLOAD_TOKEN"
+UPLOAD_HEADER = "x-upload-token"
+ADMIN_LOOPBACK_ENV = "KSPEC_ADMIN_LOOPBACK"
+_LOOPBACK = {"127.0.0.1", "::1"}
+
+
+def is_admin(headers, client_host: str):
+    token = os.getenv(ADMIN_TOKEN_ENV)
+    if token:
+        return hmac.compare_digest(headers.get(ADMIN_HEADER, ""), token)
+    return os.getenv(ADMIN_LOOPBACK_ENV) == "1" and client_host in _LOOPBACK
+
+
+def admin_denied(request):
+    """None for admins, else the 403 response to return."""
+    client_host = request.client.host if request.client else ""
+    if is_admin(request.headers, client_host):
+        return None
+    if not os.getenv(ADMIN_TOKEN_ENV) and os.getenv(ADMIN_LOOPBACK_ENV) != "1":
+        return JSONResponse({"status": "error", "message": f"Admin endpoints are disabled, set {ADMIN_TOKEN_ENV}"},
+                            status_code=403)
+    return JSONResponse({"status": "error", "message": "Admin only"}, status_code=403)
+
+
+def uploader_denied(request):
+    """None for the KSpec uploader (upload token) or an admin, else the 403 response to return."""
+    token = os.getenv(UPLOAD_TOKEN_ENV)
+    if token and hmac.compare_digest(request.headers.get(UPLOAD_HEADER, ""), token):
+        return None
+    return admin_denied(request)
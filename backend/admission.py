@@ -0,0 +1,224 @@
+import os
+import math
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from utils import fair_queue
+
+# ✅ Admission control for the inference endpoints (process_component, verify_vin,
+# verify_person). Each worker process runs at most INFERENCE_CONCURRENCY pipelines at
+# once; up to INFERENCE_QUEUE more wait in line for at most INFERENCE_MAX_WAIT seconds.
+# Anything beyond that gets an immediate 503 with a Retry-After (estimated from the
+# queue and the recent service time, jittered so tablets don't retry in lockstep)
+# instead of piling up until they time out and retry into an even longer queue.
+# The pipeline runs in the threadpool, so the event loop stays free to turn requests
+# away quickly. Limits are per worker process; under prefork multiply by the workers.
+# The line is not FIFO but utils.fair_queue: priority classes, then fair turns per
+# station (X-Station-ID header, else the client address), at most
+# INFERENCE_QUEUE_PER_STATION waiting per station.
+#
+#   KSPEC_INFERENCE_CONCURRENCY=1   KSPEC_INFERENCE_QUEUE=16   KSPEC_INFERENCE_MAX_WAIT=10
+#   KSPEC_INFERENCE_QUEUE_PER_STATION=4
+INFERENCE_CONCURRENCY = int(os.getenv("KSPEC_INFERENCE_CONCURRENCY", "1"))
+INFERENCE_QUEUE = int(os.getenv("KSPEC_INFERENCE_QUEUE", "16"))
+INFERENCE_MAX_WAIT = float(os.getenv("KSPEC_INFERENCE_MAX_WAIT", "10"))
+INFERENCE_QUEUE_PER_STATION = int(os.getenv("KSPEC_INFERENCE_QUEUE_PER_STATION", "4"))
+STATION_HEADER = "x-station-id"
+PRIORITY_HEADER = "x-priority"
+MAX_RETRY_AFTER = 30
+_WINDOW = 1000  # recent waits / service times kept for the metrics
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _percentile(values, pct: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def _summary(samples):
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {"count": len(values), "p50_ms": round(_percentile(values, 50), 1),
+            "p95_ms": round(_percentile(values, 95), 1), "max_ms": round(values[-1], 1)}
+
+
+class _ClassStats:
+    def __init__(self):
+        self.counts = {"admitted": 0, "rejected_queue_full": 0, "rejected_station_queue_full": 0,
+                       "rejected_timeout": 0}
+        self.waits = deque(maxlen=_WINDOW)
+        self.service = deque(maxlen=_WINDOW)
+        self.latency = deque(maxlen=_WINDOW)  # wait + service
+
+
+class Gate:
+    """
+    Bounded line (utils.fair_queue) in front of a limited number of slots. acquire()
+    returns at once when a slot is free, waits its turn otherwise, and raises Rejected
+    when the line (or the station's share of it) is full or the wait runs out.
+    Used from the event loop only; stats are read from any thread.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_wait: float, max_per_station: int):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.max_per_station = max(1, max_per_station)
+        self.active = 0
+        self._queue = fair_queue.FairQueue()  # futures
+        self._lock = threading.Lock()  # guards the stats below
+        self._classes = {cls: _ClassStats() for cls in fair_queue.PRIORITY_CLASSES}
+
+    def retry_after(self, cls: str):
+        """Seconds until a new cls request would likely get a slot, with jitter."""
+        with self._lock:
+            service = sorted(self._classes[cls].service)
+        typical = (_percentile(service, 50) or 1000) / 1000
+        estimate = (self._queue.queued_ahead(cls) + 1) * typical / self.concurrency
+        return int(min(MAX_RETRY_AFTER, max(1, math.ceil(estimate)) + random.randint(0, 2)))
+
+    def _reject(self, cls: str, reason: str):
+        with self._lock:
+            self._classes[cls].counts[f"rejected_{reason}"] += 1
+        raise Rejected(reason, self.retry_after(cls))
+
+    def _admitted(self, cls: str, waited_ms: float):
+        with self._lock:
+            self._classes[cls].counts["admitted"] += 1
+            self._classes[cls].waits.append(waited_ms)
+
+    async def acquire(self, cls: str = fair_queue.DEFAULT_CLASS, station: str = ""):
+        if self.active < self.concurrency and not len(self._queue):
+            self.active += 1
+            self._admitted(cls, 0.0)
+            return
+        if len(self._queue) >= self.max_queue:
+            self._reject(cls, "queue_full")
+        if self._queue.queued(station=station) >= self.max_per_station:
+            self._reject(cls, "station_queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = self._queue.push(future, cls, station)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over just as we gave up: pass it on
+            else:
+                future.cancel()
+                self._queue.discard(entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(cls, "timeout")
+        self._admitted(cls, (time.perf_counter() - started) * 1000)
+
+    def release(self):
+        # Hand the slot straight to the next waiter in line, so newcomers can't jump it
+        while True:
+            job = self._queue.pop()
+            if job is None:
+                break
+            future = job[0]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def record_service(self, cls: str, service_ms: float, waited_ms: float):
+        with self._lock:
+            self._classes[cls].service.append(service_ms)
+            self._classes[cls].latency.append(waited_ms + service_ms)
+
+    def stats(self):
+        with self._lock:
+            classes = {cls: {**s.counts, "queued": self._queue.queued(cls=cls), "wait": _summary(s.waits),
+                             "service": _summary(s.service), "latency": _summary(s.latency)}
+                       for cls, s in self._classes.items()}
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "max_queue_per_station": self.max_per_station,
+            "max_wait_s": self.max_wait,
+            "active": self.active,
+            "queued": len(self._queue),
+            "queued_by_station": self._queue.by_station(),
+            "classes": classes,
+        }
+
+
+inference = Gate("inference", INFERENCE_CONCURRENCY, INFERENCE_QUEUE, INFERENCE_MAX_WAIT, INFERENCE_QUEUE_PER_STATION)
+
+
+def rejected_response(e: Rejected):
+    return JSONResponse(
+        {"status": "busy", "message": "Server is busy, retry shortly", "reason": e.reason, "retry_after": e.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def station_of(request):
+    station = request.headers.get(STATION_HEADER, "").strip()
+    if station and len(station) <= 64:
+        return station
+    return request.client.host if request.client else "unknown"
+
+
+def priority_of(request, default: str):
+    """The endpoint's class, or a lower one when the client asks for it (X-Priority: batch)."""
+    asked = request.headers.get(PRIORITY_HEADER)
+    if asked and fair_queue.normalize_class(asked) == asked.strip().lower():
+        asked = asked.strip().lower()
+        if fair_queue.rank(asked) > fair_queue.rank(default):
+            return asked
+    return default
+
+
+async def run_inference(request, priority: str, fn, *args):
+    """
+    Run a blocking inference pipeline under the inference gate as priority class
+    `priority` for the calling station; 503 response when saturated.
+    """
+    from utils import sampling_profiler, tracing
+
+    cls, station = priority_of(request, priority), station_of(request)
+    queued_at = time.perf_counter()
+    try:
+        await inference.acquire(cls, station)
+    except Rejected as e:
+        tracing.event("admission_rejected", level="warning", gate=inference.name, reason=e.reason,
+                      retry_after=e.retry_after, priority=cls, station=station)
+        return rejected_response(e)
+
+    def work():
+        sampling_profiler.watch_current_thread()
+        fair_queue.current_job.set((cls, station))
+        return fn(*args)
+
+    started = time.perf_counter()
+    try:
+        return await run_in_threadpool(work)
+    finally:
+        inference.record_service(cls, (time.perf_counter() - started) * 1000, (started - queued_at) * 1000)
+        inference.release()
+
+
+def stats():
+    return {inference.name: inference.stats()}
@@ -0,0 +1,48 @@
+import time
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+
+from utils.audit_analytics import PART_DIMENSIONS, query_parts, query_workers, parse_window
+
+router = APIRouter()
+
+
+@router.get("/analytics")
+async def get_analytics(
+    view: str = Query("parts", description="parts (NOT OK hotspots) or workers (throughput)"),
+    group_by: str = Query("model,variant,component,part", description="Comma list of " + ", ".join(PART_DIMENSIONS)),
+    since: str = Query(None, description="ISO date/datetime, inclusive"),
+    until: str = Query(None, description="ISO date/datetime, inclusive"),
+    hours: int = Query(None, description="Trailing window in hours (overrides since)"),
+    limit: int = Query(100, ge=1, le=5000)
+):
+    try:
+        started = time.perf_counter()
+        since_dt, until_dt = parse_window(since, until, hours)
+
+        if view == "workers":
+            rows = query_workers(since_dt, until_dt)
+            dimensions = ["worker"]
+        elif view == "parts":
+            dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+            unknown = [d for d in dimensions if d not in PART_DIMENSIONS]
+            if unknown:
+                return JSONResponse({"status": "error", "message": f"Unknown group_by: {', '.join(unknown)}"}, status_code=400)
+            rows = query_parts(dimensions, since_dt, until_dt)
+        else:
+            return JSONResponse({"status": "error", "message": f"Unknown view: {view}"}, status_code=400)
+
+        return JSONResponse({
+            "status": "success",
+            "view": view,
+            "group_by": dimensions,
+            "since": since_dt.isoformat() if since_dt else None,
+            "until": until_dt.isoformat() if until_dt else None,
+            "total_groups": len(rows),
+            "rows": rows[:limit],
+            "query_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
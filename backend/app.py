@@ -1,18 +1,123 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-
-# ✅ Import your existing routes
-from routes.verify_person import router as verify_person_router
-from routes.verify_vin import router as verify_vin_router
-from routes.get_case_spec import router as get_case_spec_router  # <-- NEW
-from routes.process_component import router as process_component_router
-from routes.initialize_audit import router as initializer_audit_router 
-from routes.finalize_audit import router as finalize_audit_router
-from routes.recieve_new_kspec import router as recieve_kspec_router
-from routes.manage_kspecs import router as manage_kspecs_router
-from routes.manage_vins import router as manage_vins_router
-from routes.manage_workers import router as manage_workers_router
-app = FastAPI()
+import os
+import importlib
+from contextlib import asynccontextmanager
+
+from utils import runtime_profile, startup
+
+# ✅ Thread pools and inference concurrency for this host (data/runtime_profile.json),
+# set before numpy / cv2 / torch / paddle load and before routes read the concurrency
+runtime_profile.apply()
+
+with startup.timed("import fastapi"):
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from fastapi.staticfiles import StaticFiles
+
+# ✅ Import your existing routes (each import is timed, see /ready)
+ROUTE_MODULES = [
+    "verify_person",
+    "verify_vin",
+    "get_case_spec",
+    "get_capture_profile",
+    "process_component",
+    "initialize_audit",
+    "finalize_audit",
+    "recieve_new_kspec",
+    "manage_kspecs",
+    "manage_vins",
+    "manage_workers",
+    "analytics",
+    "audits",
+    "image_derivatives",
+    "asset_upload",
+    "metrics",
+    "debug_profile",
+    "debug_memory",
+]
+if os.getenv("KSPEC_STANDIN_ENGINES"):
+    # Offline load tests / benchmarks: fake YOLO + OCR, see utils.standin_engines
+    from utils import standin_engines
+    standin_engines.install()
+
+routers = []
+for module_name in ROUTE_MODULES:
+    with startup.timed(f"import routes.{module_name}"):
+        routers.append(importlib.import_module(f"routes.{module_name}").router)
+
+
+def _warm_up_yolo():
+    from utils import yolo_utils
+    yolo_utils.warm_up()
+
+
+def _warm_up_ocr():
+    from utils.ocr_utils import get_ocr
+    get_ocr()
+
+
+def _warm_up_vin_table():
+    from routes.verify_vin import get_vin_map
+    get_vin_map()
+
+
+def _warm_up_worker_table():
+    from routes.verify_person import get_worker_df
+    get_worker_df()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Heavy subsystems load in the background; requests that need them before
+    # they are ready simply wait for the same one-time load.
+    from utils import inference_client, memory_accounting, results_store
+    memory_accounting.start_from_env()
+    with startup.timed("results index"):
+        results_store.load_index()  # first start on the sharded layout: migrate + build it
+    if inference_client.enabled():
+        # YOLO / OCR live in the shared inference service (utils.inference_server)
+        startup.start_background("inference_server", inference_client.wait_until_ready)
+    else:
+        startup.start_background("ocr", _warm_up_ocr)
+        startup.start_background("yolo", _warm_up_yolo)
+    startup.start_background("vin_table", _warm_up_vin_table)
+    startup.start_background("worker_table", _warm_up_worker_table)
+    startup.print_timeline()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# ✅ X-Debug-Profile header on /process_component -> sampled profile of that request
+from routes.debug_profile import RequestProfileMiddleware
+app.add_middleware(RequestProfileMiddleware)
+
+# ✅ Per-request memory accounting -> /metrics "request_memory"
+from routes.debug_memory import RequestMemoryMiddleware
+app.add_middleware(RequestMemoryMiddleware)
+
+# ✅ Image uploads over the byte limit -> 413 before their body is received
+from utils.image_decode import UploadLimitMiddleware
+app.add_middleware(UploadLimitMiddleware)
+
+# ✅ Request id + span tracing -> logs/trace.jsonl (outermost, so it covers the others)
+from utils.tracing import TracingMiddleware
+app.add_middleware(TracingMiddleware)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Content-addressed files never change under the same URL -> let clients cache them for good."""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# ✅ Content-addressed blobs and image variants (mounted before /data so they match first)
+os.makedirs("data/blobs", exist_ok=True)
+os.makedirs("data/variants", exist_ok=True)
+app.mount("/data/blobs", ImmutableStaticFiles(directory="data/blobs"), name="blobs")
+app.mount("/data/variants", ImmutableStaticFiles(directory="data/variants"), name="variants")
 
 # ✅ Serve static files (images, reference files, models)
 # This ensures URLs like http://<ip>:8000/data/reference_images/... work
@@ -22,15 +127,15 @@ app.mount("/data", StaticFiles(directory="data"), name="data")
 async def health_check():
     return{"status":"ok"}
 
-# ✅ Include all routes
-app.include_router(verify_person_router)
-app.include_router(verify_vin_router)
-app.include_router(get_case_spec_router)  # <-- NEW
-app.include_router(process_component_router)
-app.include_router(initializer_audit_router)
-app.include_router(finalize_audit_router)
-app.include_router(recieve_kspec_router)
-app.include_router(manage_kspecs_router)
-app.include_router(manage_vins_router)
-app.include_router(manage_workers_router)
+@app.get("/ready")
+async def ready_check():
+    """Per-subsystem readiness; 503 until every required subsystem has loaded."""
+    from utils import kspec_registry
+    report = startup.readiness()
+    report["kspecs"] = {"version": kspec_registry.version(), "count": len(kspec_registry.all_specs())}
+    report["timeline"] = startup.timeline()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
+# ✅ Include all routes
+for router in routers:
+    app.include_router(router)
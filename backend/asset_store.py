@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from utils import file_lock
+
+# ✅ Content-addressed store for KSpec models and images:
+#   data/blobs/<sha256[:2]>/<sha256><ext>
+# Variants that share a model or image share one blob. refs.json records which blobs
+# each KSpec points at; a blob is deleted only when no KSpec references it any more.
+# Blobs uploaded through /assets/* but never referenced by a KSpec (the uploader
+# stopped before /recievenewkspec) and abandoned staging folders are removed by
+# collect_garbage() once they are older than UPLOAD_GC_GRACE_HOURS.
+BASE_DATA_DIR = "data"
+BLOBS_DIR = os.path.join(BASE_DATA_DIR, "blobs")
+REFS_FILE = os.path.join(BLOBS_DIR, "refs.json")
+REFS_LOCK_FILE = os.path.join(BLOBS_DIR, "refs.lock")
+HASH_CHUNK = 1024 * 1024
+
+UPLOADS_DIR = os.path.join(BASE_DATA_DIR, "uploads")
+UPLOAD_GC_GRACE_SECONDS = float(os.getenv("UPLOAD_GC_GRACE_HOURS", "24")) * 3600
+
+MODEL_KEYS = ("YOLO_DONTDETECT", "YOLO_ROIDETECT", "YOLO_SIMPLEDETECT")
+BLOB_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[A-Za-z0-9]{1,8}$")
+
+_lock = threading.RLock()
+
+
+@contextmanager
+def ingest_lock():
+    """
+    Hold across "a KSpec's blobs still exist" (missing_blobs) + set_refs(...), so a
+    concurrent delete / GC can't free them in between. Hashing and copying (put_file)
+    happen before, outside it: whatever was freed meanwhile shows up as missing.
+    """
+    os.makedirs(BLOBS_DIR, exist_ok=True)
+    with _lock, file_lock.locked(REFS_LOCK_FILE):
+        yield
+
+
+def _load_refs():
+    if not os.path.exists(REFS_FILE):
+        return {}
+    with open(REFS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_refs(refs: dict):
+    tmp_path = f"{REFS_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(refs, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, REFS_FILE)
+
+
+def file_sha256(path: str):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def blob_path(sha256: str, ext: str):
+    """Relative path (also the static URL path) of a blob."""
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256}{ext.lower()}".replace("\\", "/")
+
+
+def is_blob(path: str):
+    return bool(path) and path.replace("\\", "/").startswith(BLOBS_DIR.replace("\\", "/") + "/")
+
+
+def has_blob(sha256: str, ext: str):
+    return os.path.exists(blob_path(sha256, ext))
+
+
+def keep_blob(sha256: str, ext: str):
+    """Renew an existing blob's grace period when an upload is answered with it."""
+    try:
+        os.utime(blob_path(sha256, ext))
+    except FileNotFoundError:
+        pass
+
+
+def put_file(source_path: str):
+    """Hash a file into the store (copy skipped if the content is already there). Returns its blob path."""
+    ext = os.path.splitext(source_path)[1]
+    target = blob_path(file_sha256(source_path), ext)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, target)
+    return target
+
+
+def adopt_file(verified_path: str, sha256: str, ext: str):
+    """Move an already hash-verified file (e.g. an assembled chunked upload) into the store."""
+    target = blob_path(sha256, ext)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(verified_path, target)
+    return target
+
+
+def iter_asset_fields(kspec: dict):
+    """Yield (container, key, kind) for every model/image path in a KSpec, kind = "model" or "image"."""
+    if kspec.get("mainImagePath"):
+        yield kspec, "mainImagePath", "image"
+    for comp in kspec.get("components", []):
+        if comp.get("mainImage"):
+            yield comp, "mainImage", "image"
+        pipeline = comp.get("pipelineConfig", {})
+        for key in MODEL_KEYS:
+            if pipeline.get(key) and pipeline[key] != "SKIP":
+                yield pipeline, key, "model"
+        for sub in comp.get("subComponents", []):
+            if sub.get("referenceImage"):
+                yield sub, "referenceImage", "image"
+    for sub in kspec.get("subComponents", []):
+        if sub.get("referenceImage"):
+            yield sub, "referenceImage", "image"
+
+
+def kspec_blobs(kspec: dict):
+    return sorted({c[k] for c, k, _ in iter_asset_fields(kspec) if is_blob(c[k])})
+
+
+def missing_blobs(kspec: dict):
+    """Blobs a KSpec points at that are not (any more) in the store."""
+    return [blob for blob in kspec_blobs(kspec) if not os.path.exists(blob)]
+
+
+def _delete_unreferenced(candidates, refs: dict):
+    still_used = {b for blobs in refs.values() for b in blobs}
+    deleted = []
+    for blob in candidates:
+        if blob in still_used:
+            continue
+        try:
+            os.remove(blob)
+            deleted.append(blob)
+        except FileNotFoundError:
+            pass
+    if deleted:
+        from utils import image_variants
+        for blob in deleted:
+            image_variants.delete_variants(os.path.splitext(os.path.basename(blob))[0])
+    return deleted
+
+
+def set_refs(model_code: str, kspec: dict):
+    """Point a KSpec's references at its current blobs; returns blobs freed by the change."""
+    with ingest_lock():
+        refs = _load_refs()
+        old = set(refs.get(model_code, []))
+        refs[model_code] = kspec_blobs(kspec)
+        _save_refs(refs)
+        return _delete_unreferenced(old - set(refs[model_code]), refs)
+
+
+def release(model_code: str):
+    """Drop a KSpec's references and delete blobs nothing else uses."""
+    with ingest_lock():
+        refs = _load_refs()
+        old = set(refs.pop(model_code, []))
+        _save_refs(refs)
+        return _delete_unreferenced(old, refs)
+
+
+def collect_garbage(grace_seconds: float = UPLOAD_GC_GRACE_SECONDS):
+    """
+    Delete blobs no KSpec references and upload staging folders, both untouched for
+    grace_seconds (so an upload whose KSpec is still on its way is left alone).
+    """
+    cutoff = time.time() - grace_seconds
+    removed_uploads = 0
+    if os.path.isdir(UPLOADS_DIR):
+        for name in os.listdir(UPLOADS_DIR):
+            staging = os.path.join(UPLOADS_DIR, name)
+            if os.path.isdir(staging) and os.path.getmtime(staging) < cutoff:
+                shutil.rmtree(staging, ignore_errors=True)
+                removed_uploads += 1
+
+    with ingest_lock():
+        refs = _load_refs()
+        candidates = []
+        for prefix in os.listdir(BLOBS_DIR):
+            prefix_dir = os.path.join(BLOBS_DIR, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if BLOB_NAME_RE.match(name) and os.path.getmtime(path) < cutoff:
+                    candidates.append(f"{BLOBS_DIR}/{prefix}/{name}".replace("\\", "/"))
+        deleted = _delete_unreferenced(candidates, refs)
+    return {"blobs_deleted": len(deleted), "uploads_deleted": removed_uploads}
+
+
+def stats():
+    with _lock:
+        refs = _load_refs()
+    blobs = {b for bs in refs.values() for b in bs}
+    total_bytes = sum(os.path.getsize(b) for b in blobs if os.path.exists(b))
+    return {"kspecs": len(refs), "blobs": len(blobs), "bytes": total_bytes}
+
+
+def migrate_kspecs():
+    """
+    Copy assets of KSpecs stored before the blob store into it and rewrite their paths.
+    The legacy files stay where they are (several KSpecs may point at one); delete_kspec
+    removes a KSpec's legacy folders.
+    """
+    from utils import kspec_store
+
+    migrated = 0
+    manifest = kspec_store.read_manifest()
+    for model_code in manifest:
+        kspec = kspec_store.load_kspec(model_code, manifest)
+        changed = False
+        for container, key, _ in iter_asset_fields(kspec):
+            path = container[key]
+            if not is_blob(path) and os.path.exists(path):
+                container[key] = put_file(path)
+                changed = True
+        if changed:
+            kspec_store.save_kspec(model_code, kspec)
+            migrated += 1
+        set_refs(model_code, kspec)
+    return migrated
+
+
+def _after_fork_in_child():
+    # A lock held by a parent thread at fork would stay held forever in the child
+    global _lock
+    _lock = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+if __name__ == "__main__":
+    # python -m utils.asset_store     -> copy existing KSpec assets into the blob store
+    # python -m utils.asset_store gc  -> delete unreferenced uploads and blobs
+    import sys
+
+    if sys.argv[1:] == ["gc"]:
+        print(f"Garbage collected: {collect_garbage()}; store: {stats()}")
+    else:
+        print(f"Migrated {migrate_kspecs()} KSpecs; store: {stats()}")
@@ -0,0 +1,231 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from utils import asset_store
+from utils.admin_auth import uploader_denied, admin_denied
+
+router = APIRouter()
+
+# ✅ Chunked, resumable upload of KSpec assets straight into the blob store.
+# The upload id is the content hash, so an interrupted upload resumes (even after a
+# server restart) by asking which chunks already arrived. Each chunk carries its own
+# SHA-256 and the assembled file is verified against the asset hash before it becomes a blob.
+# Only the KSpec uploader (KSPEC_UPLOAD_TOKEN) or an admin may call these routes, and only
+# model and image files are accepted. Hashing and file assembly run in the threadpool.
+UPLOADS_DIR = asset_store.UPLOADS_DIR
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+ASSET_EXTENSIONS = (".pt", ".onnx", ".jpg", ".jpeg", ".png", ".webp")
+
+SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class AssetRef(BaseModel):
+    sha256: str
+    ext: str
+
+
+class AssetCheck(BaseModel):
+    assets: list[AssetRef]
+
+
+class UploadInit(BaseModel):
+    sha256: str
+    ext: str
+    size: int
+    chunk_size: int
+
+
+def _upload_id(sha256: str, ext: str):
+    return f"{sha256}{ext.lower()}"
+
+
+def _valid_asset(sha256: str, ext: str):
+    return bool(SHA_RE.match(sha256)) and ext.lower() in ASSET_EXTENSIONS
+
+
+def _parse_upload_id(upload_id: str):
+    sha256, ext = upload_id[:64], upload_id[64:]
+    if not _valid_asset(sha256, ext):
+        return None
+    return sha256, ext
+
+
+def _staging_dir(upload_id: str):
+    return os.path.join(UPLOADS_DIR, upload_id)
+
+
+def _load_meta(upload_id: str):
+    meta_path = os.path.join(_staging_dir(upload_id), "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _received_chunks(upload_id: str):
+    staging = _staging_dir(upload_id)
+    if not os.path.isdir(staging):
+        return []
+    return sorted(int(name[:-5]) for name in os.listdir(staging) if name.endswith(".part"))
+
+
+@router.post("/assets/check")
+async def check_assets(payload: AssetCheck, request: Request):
+    """Which assets the server already has; present ones come back with their blob path."""
+    denied = uploader_denied(request)
+    if denied:
+        return denied
+    present, missing = {}, []
+    for asset in payload.assets:
+        if not _valid_asset(asset.sha256, asset.ext):
+            return JSONResponse({"status": "error", "message": f"Invalid sha256 or extension: {asset.ext}"}, status_code=400)
+        if asset_store.has_blob(asset.sha256, asset.ext):
+            asset_store.keep_blob(asset.sha256, asset.ext)
+            present[asset.sha256] = asset_store.blob_path(asset.sha256, asset.ext)
+        else:
+            missing.append(asset.sha256)
+    return JSONResponse({"status": "success", "present": present, "missing": missing})
+
+
+@router.post("/assets/upload/init")
+async def init_upload(payload: UploadInit, request: Request):
+    denied = uploader_denied(request)
+    if denied:
+        return denied
+    try:
+        if not _valid_asset(payload.sha256, payload.ext):
+            return JSONResponse({"status": "error", "message": "Invalid sha256 or extension"}, status_code=400)
+        if not 0 < payload.chunk_size <= MAX_CHUNK_SIZE or payload.size < 0:
+            return JSONResponse({"status": "error", "message": "Invalid size or chunk_size"}, status_code=400)
+
+        upload_id = _upload_id(payload.sha256, payload.ext)
+        if asset_store.has_blob(payload.sha256, payload.ext):
+            asset_store.keep_blob(payload.sha256, payload.ext)
+            return JSONResponse({
+                "status": "success",
+                "upload_id": upload_id,
+                "complete": True,
+                "blob": asset_store.blob_path(payload.sha256, payload.ext),
+            })
+
+        total_chunks = max(1, -(-payload.size // payload.chunk_size))
+        meta = _load_meta(upload_id)
+        if meta and (meta["size"] != payload.size or meta["chunk_size"] != payload.chunk_size):
+            # Same content announced with different chunking -> start over
+            shutil.rmtree(_staging_dir(upload_id), ignore_errors=True)
+            meta = None
+        if not meta:
+            os.makedirs(_staging_dir(upload_id), exist_ok=True)
+            meta = {"size": payload.size, "chunk_size": payload.chunk_size, "total_chunks": total_chunks}
+            with open(os.path.join(_staging_dir(upload_id), "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+
+        return JSONResponse({
+            "status": "success",
+            "upload_id": upload_id,
+            "complete": False,
+            "total_chunks": total_chunks,
+            "received": _received_chunks(upload_id),
+        })
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+def _store_chunk(upload_id: str, index: int, data: bytes, chunk_sha: str):
+    """Verify and write one chunk (threadpool). Returns False on a checksum mismatch."""
+    if hashlib.sha256(data).hexdigest() != chunk_sha:
+        return False
+    part_path = os.path.join(_staging_dir(upload_id), f"{index}.part")
+    with open(f"{part_path}.tmp", "wb") as f:
+        f.write(data)
+    os.replace(f"{part_path}.tmp", part_path)
+    return True
+
+
+@router.put("/assets/upload/{upload_id}/chunks/{index}")
+async def upload_chunk(upload_id: str, index: int, request: Request):
+    denied = uploader_denied(request)
+    if denied:
+        return denied
+    try:
+        meta = _load_meta(upload_id) if _parse_upload_id(upload_id) else None
+        if not meta:
+            return JSONResponse({"status": "error", "message": "Unknown upload"}, status_code=404)
+        if not 0 <= index < meta["total_chunks"]:
+            return JSONResponse({"status": "error", "message": "Chunk index out of range"}, status_code=400)
+
+        data = await request.body()
+        expected_len = min(meta["chunk_size"], meta["size"] - index * meta["chunk_size"])
+        if len(data) != expected_len:
+            return JSONResponse({"status": "error", "message": f"Chunk {index} should be {expected_len} bytes"}, status_code=400)
+
+        chunk_sha = request.headers.get("x-chunk-sha256", "").lower()
+        if not await run_in_threadpool(_store_chunk, upload_id, index, data, chunk_sha):
+            return JSONResponse({"status": "error", "message": f"Checksum mismatch on chunk {index}"}, status_code=422)
+        return JSONResponse({"status": "success", "received": index})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@router.post("/assets/upload/{upload_id}/complete")
+def complete_upload(upload_id: str, request: Request):
+    # Plain def: assembling and hashing a model file of up to several hundred MB blocks
+    denied = uploader_denied(request)
+    if denied:
+        return denied
+    try:
+        parsed = _parse_upload_id(upload_id)
+        if not parsed:
+            return JSONResponse({"status": "error", "message": "Unknown upload"}, status_code=404)
+        sha256, ext = parsed
+        if asset_store.has_blob(sha256, ext):
+            asset_store.keep_blob(sha256, ext)
+            shutil.rmtree(_staging_dir(upload_id), ignore_errors=True)
+            return JSONResponse({"status": "success", "blob": asset_store.blob_path(sha256, ext)})
+
+        meta = _load_meta(upload_id)
+        if not meta:
+            return JSONResponse({"status": "error", "message": "Unknown upload"}, status_code=404)
+        missing = sorted(set(range(meta["total_chunks"])) - set(_received_chunks(upload_id)))
+        if missing:
+            return JSONResponse({"status": "incomplete", "missing": missing}, status_code=409)
+
+        # Assemble + verify in one streaming pass
+        staging = _staging_dir(upload_id)
+        assembled = os.path.join(staging, "assembled")
+        h = hashlib.sha256()
+        with open(assembled, "wb") as out:
+            for index in range(meta["total_chunks"]):
+                with open(os.path.join(staging, f"{index}.part"), "rb") as part:
+                    data = part.read()
+                h.update(data)
+                out.write(data)
+
+        if h.hexdigest() != sha256:
+            shutil.rmtree(staging, ignore_errors=True)
+            return JSONResponse({"status": "error", "message": "Assembled file does not match sha256, upload again"}, status_code=422)
+
+        blob = asset_store.adopt_file(assembled, sha256, ext)
+        shutil.rmtree(staging, ignore_errors=True)
+        return JSONResponse({"status": "success", "blob": blob})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@router.post("/assets/gc")
+def collect_garbage(request: Request):
+    """Admin: delete uploads and blobs no KSpec references (also: python -m utils.asset_store gc)."""
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    try:
+        return JSONResponse({"status": "success", **asset_store.collect_garbage(), "store": asset_store.stats()})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
@@ -0,0 +1,297 @@
+import os
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+# ✅ Incrementally maintained audit counters, bucketed by hour.
+# Every outcome is appended to an event log and folded into in-memory counters, so
+# /analytics never has to crawl results/. Counters catch up by reading the log from
+# the last offset seen, which also folds in events written by other worker processes.
+# Every SNAPSHOT_EVERY events the counters are saved with the log offset they cover
+# (snapshot.json), so a starting process loads them and replays only the tail.
+# A retaken part replaces its earlier verdict: only the last one per (VIN, component,
+# part) is counted while the audit is open; finishing the audit freezes them, and so
+# does OPEN_AUDIT_HOURS without a take (audits started and never finalized), measured
+# in event time so every process replaying the log drops the same ones.
+#
+#   KSPEC_ANALYTICS_OPEN_AUDIT_HOURS=24
+ANALYTICS_DIR = "data/analytics"
+EVENTS_FILE = os.path.join(ANALYTICS_DIR, "events.jsonl")
+SNAPSHOT_FILE = os.path.join(ANALYTICS_DIR, "snapshot.json")
+SNAPSHOT_EVERY = 5000
+BUCKET_FORMAT = "%Y-%m-%dT%H"
+OPEN_AUDIT_HOURS = int(os.getenv("KSPEC_ANALYTICS_OPEN_AUDIT_HOURS", "24"))
+
+PART_DIMENSIONS = ("model", "variant", "case_spec", "component", "part", "worker")
+AUDIT_DIMENSIONS = ("worker", "variant", "case_spec", "verdict")
+
+_lock = threading.Lock()
+# bucket -> {dimension tuple: [ok, notok]}
+_part_counts = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+# bucket -> {dimension tuple: finished audits}
+_audit_counts = defaultdict(lambda: defaultdict(int))
+# (vin, component, part) -> (bucket, dimension tuple, 0 ok / 1 notok) of open audits
+_latest = {}
+_newest_bucket = ""  # newest event hour applied; _latest is pruned when it moves on
+_offset = 0  # bytes of EVENTS_FILE already applied
+_since_snapshot = 0  # events applied since the last snapshot was written or loaded
+
+
+def _bucket(when: datetime):
+    return when.strftime(BUCKET_FORMAT)
+
+
+def _expire_latest(bucket: str):
+    """Freeze the takes of audits that saw no event for OPEN_AUDIT_HOURS (once per new hour)."""
+    global _newest_bucket
+    if bucket <= _newest_bucket:
+        return
+    _newest_bucket = bucket
+    cutoff = _bucket(datetime.strptime(bucket, BUCKET_FORMAT) - timedelta(hours=OPEN_AUDIT_HOURS))
+    # An audit's parts expire together, by its most recent take
+    last_take = {}
+    for (vin, _, _), (b, _, _) in _latest.items():
+        last_take[vin] = max(b, last_take.get(vin, ""))
+    for part in [p for p in _latest if last_take[p[0]] < cutoff]:
+        del _latest[part]
+
+
+def _apply(event: dict):
+    bucket = event["bucket"]
+    _expire_latest(bucket)
+    vin = event.get("vin")  # events logged before retakes were tracked have none
+    if event["type"] == "part":
+        key = tuple(event.get(d, "") for d in PART_DIMENSIONS)
+        verdict = 0 if event["verdict"] == "ok" else 1
+        if vin:
+            part = (vin, event.get("component", ""), event.get("part", ""))
+            previous = _latest.get(part)
+            if previous:
+                _part_counts[previous[0]][previous[1]][previous[2]] -= 1
+            _latest[part] = (bucket, key, verdict)
+        _part_counts[bucket][key][verdict] += 1
+    elif event["type"] == "audit":
+        key = tuple(event.get(d, "") for d in AUDIT_DIMENSIONS)
+        _audit_counts[bucket][key] += 1
+        if vin:
+            for part in [p for p in _latest if p[0] == vin]:
+                del _latest[part]
+
+
+def _save_snapshot():
+    """Write the counters with the offset they cover (caller holds _lock)."""
+    global _since_snapshot
+    snapshot = {
+        "offset": _offset,
+        "parts": [[b, list(k), c[0], c[1]] for b, counts in _part_counts.items() for k, c in counts.items() if any(c)],
+        "audits": [[b, list(k), n] for b, counts in _audit_counts.items() for k, n in counts.items()],
+        "latest": [[list(p), b, list(k), v] for p, (b, k, v) in _latest.items()],
+    }
+    tmp_path = f"{SNAPSHOT_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, SNAPSHOT_FILE)
+    _since_snapshot = 0
+
+
+def _load_snapshot():
+    global _offset
+    try:
+        with open(SNAPSHOT_FILE, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return
+    except ValueError:
+        print("⚠️ Ignoring unreadable analytics snapshot, replaying the whole log")
+        return
+    for b, k, ok, notok in snapshot["parts"]:
+        _part_counts[b][tuple(k)] = [ok, notok]
+    for b, k, n in snapshot["audits"]:
+        _audit_counts[b][tuple(k)] = n
+    for p, b, k, v in snapshot["latest"]:
+        _latest[tuple(p)] = (b, tuple(k), v)
+    _offset = snapshot["offset"]
+
+
+def _catch_up():
+    """Apply events appended since the last call (caller holds _lock)."""
+    global _offset, _since_snapshot
+    try:
+        if os.path.getsize(EVENTS_FILE) <= _offset:
+            return
+    except FileNotFoundError:
+        return
+    with open(EVENTS_FILE, "rb") as f:
+        f.seek(_offset)
+        data = f.read()
+    complete = data.rfind(b"\n") + 1  # leave a half-written last line for next time
+    for line in data[:complete].decode("utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            _apply(json.loads(line))
+        except (ValueError, KeyError):
+            print(f"⚠️ Skipping bad analytics event: {line[:80]}")
+        _since_snapshot += 1
+    _offset += complete
+    if _since_snapshot >= SNAPSHOT_EVERY:
+        _save_snapshot()
+
+
+def _record(event: dict):
+    line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+    with _lock:
+        # One O_APPEND write per event, so lines from several processes never interleave
+        fd = os.open(EVENTS_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        _catch_up()
+
+
+def record_part_result(case_spec: str, model: str, variant: str, component: str,
+                       part: str, worker: str, verdict: str, when: datetime = None, full_vin: str = None):
+    """Count one /process_component outcome (verdict "ok" or "notok"), replacing an earlier take."""
+    _record({
+        "type": "part",
+        "bucket": _bucket(when or datetime.now()),
+        "vin": full_vin,
+        "case_spec": case_spec,
+        "model": model,
+        "variant": variant,
+        "component": component,
+        "part": part,
+        "worker": worker,
+        "verdict": verdict,
+    })
+
+
+def record_audit_finished(worker: str, case_spec: str, variant: str,
+                          verdict: str, when: datetime = None, full_vin: str = None):
+    """Count one /finalize_audit with its final verdict (OK / NOT OK / INCOMPLETE)."""
+    _record({
+        "type": "audit",
+        "bucket": _bucket(when or datetime.now()),
+        "vin": full_vin,
+        "worker": worker,
+        "case_spec": case_spec,
+        "variant": variant,
+        "verdict": verdict,
+    })
+
+
+# ============================== #
+# ✅ QUERIES (memory only)
+# ============================== #
+def _buckets_in_range(counts: dict, since: datetime, until: datetime):
+    lo = _bucket(since) if since else ""
+    hi = _bucket(until) if until else "~"
+    return [b for b in counts if lo <= b <= hi]
+
+
+def query_parts(group_by: list, since: datetime = None, until: datetime = None):
+    """NOT OK rates grouped by any of PART_DIMENSIONS, worst first."""
+    indexes = [PART_DIMENSIONS.index(d) for d in group_by]
+    groups = defaultdict(lambda: [0, 0])
+    with _lock:
+        _catch_up()
+        for bucket in _buckets_in_range(_part_counts, since, until):
+            for key, (ok, notok) in _part_counts[bucket].items():
+                if not ok and not notok:  # every take here was replaced by a retake
+                    continue
+                group = groups[tuple(key[i] for i in indexes)]
+                group[0] += ok
+                group[1] += notok
+
+    rows = []
+    for key, (ok, notok) in groups.items():
+        total = ok + notok
+        rows.append({
+            **dict(zip(group_by, key)),
+            "ok": ok,
+            "notok": notok,
+            "total": total,
+            "notok_rate": round(notok / total, 4) if total else 0.0,
+        })
+    rows.sort(key=lambda r: (r["notok_rate"], r["total"]), reverse=True)
+    return rows
+
+
+def query_workers(since: datetime = None, until: datetime = None):
+    """Per-worker throughput: parts checked, audits finished and audits per active hour."""
+    stats = defaultdict(lambda: {"parts_checked": 0, "parts_notok": 0, "audits_finished": 0,
+                                 "audits_ok": 0, "active_hours": set()})
+    worker_idx = PART_DIMENSIONS.index("worker")
+    verdict_idx = AUDIT_DIMENSIONS.index("verdict")
+    with _lock:
+        _catch_up()
+        for bucket in _buckets_in_range(_part_counts, since, until):
+            for key, (ok, notok) in _part_counts[bucket].items():
+                if not ok and not notok:
+                    continue
+                s = stats[key[worker_idx]]
+                s["parts_checked"] += ok + notok
+                s["parts_notok"] += notok
+                s["active_hours"].add(bucket)
+        for bucket in _buckets_in_range(_audit_counts, since, until):
+            for key, count in _audit_counts[bucket].items():
+                s = stats[key[0]]
+                s["audits_finished"] += count
+                if key[verdict_idx] == "OK":
+                    s["audits_ok"] += count
+                s["active_hours"].add(bucket)
+
+    rows = []
+    for worker, s in stats.items():
+        hours = len(s.pop("active_hours"))
+        rows.append({
+            "worker": worker,
+            **s,
+            "active_hours": hours,
+            "audits_per_hour": round(s["audits_finished"] / hours, 2) if hours else 0.0,
+        })
+    rows.sort(key=lambda r: r["audits_finished"], reverse=True)
+    return rows
+
+
+def parse_window(since: str = None, until: str = None, hours: int = None):
+    """Accept ISO dates/datetimes or a trailing window in hours."""
+    until_dt = datetime.fromisoformat(until) if until else None
+    if until_dt and len(until) == 10:
+        # Plain date -> include the whole day (and count a trailing window back from its end)
+        until_dt = until_dt.replace(hour=23, minute=59, second=59)
+    if hours:
+        since_dt = (until_dt or datetime.now()) - timedelta(hours=hours)
+    else:
+        since_dt = datetime.fromisoformat(since) if since else None
+    return since_dt, until_dt
+
+
+def load_events():
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    with _lock:
+        _load_snapshot()
+        _catch_up()
+
+
+def _before_fork():
+    _lock.acquire()  # never fork halfway through folding events into the counters
+
+
+def _after_fork_in_parent():
+    _lock.release()
+
+
+def _after_fork_in_child():
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork_in_child)
+
+load_events()
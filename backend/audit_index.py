@@ -0,0 +1,242 @@
+import os
+import sqlite3
+import threading
+
+# ✅ Searchable audit index (SQLite, stdlib). One row per audit run, written at
+# initialize and finalize time; every filter has an index so /audits stays fast
+# with hundreds of thousands of rows. Finished runs are history: results_store
+# keeps their folders, so their rows stay valid.
+# Planner statistics are gathered once, when the database is created; refresh them
+# (and drop rows of folders removed by hand) with the maintenance command at the end.
+AUDIT_INDEX_FILE = "data/AuditIndex.sqlite3"
+COUNT_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_conn = None
+_writes = 0  # commits made through this process' connection
+_count_cache = {}  # (where_sql, params) -> total, for the database version in _count_version
+_count_version = None
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    full_vin TEXT NOT NULL,
+    short_vin TEXT,
+    person_pno TEXT,
+    person_name TEXT,
+    case_spec TEXT,
+    variant TEXT,
+    engine_number TEXT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    verdict TEXT,
+    total_ok INTEGER,
+    total_notok INTEGER,
+    total_pending INTEGER,
+    folder TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audits_vin ON audits (full_vin);
+CREATE INDEX IF NOT EXISTS idx_audits_short_vin ON audits (short_vin);
+CREATE INDEX IF NOT EXISTS idx_audits_started ON audits (started_at);
+CREATE INDEX IF NOT EXISTS idx_audits_pno ON audits (person_pno, started_at);
+CREATE INDEX IF NOT EXISTS idx_audits_case_spec ON audits (case_spec, started_at);
+CREATE INDEX IF NOT EXISTS idx_audits_verdict ON audits (verdict, started_at);
+"""
+
+COLUMNS = (
+    "id", "full_vin", "short_vin", "person_pno", "person_name", "case_spec", "variant",
+    "engine_number", "started_at", "finished_at", "status", "verdict",
+    "total_ok", "total_notok", "total_pending", "folder",
+)
+
+
+def _connect():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(AUDIT_INDEX_FILE), exist_ok=True)
+        _conn = sqlite3.connect(AUDIT_INDEX_FILE, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(SCHEMA)
+        if not _conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+            # Planner statistics so combined filters (case spec + verdict) pick the selective index
+            _conn.execute("ANALYZE")
+    return _conn
+
+
+def _version(conn):
+    # data_version moves on commits from other connections (other workers), _writes on ours
+    return conn.execute("PRAGMA data_version").fetchone()[0], _writes
+
+
+def record_audit_started(full_vin: str, short_vin: str, person_pno: str, person_name: str,
+                         case_spec: str, variant: str, engine_number: str,
+                         started_at: str, folder: str):
+    """
+    Index a new audit run. An earlier unfinished run of the same VIN is replaced,
+    matching initialize_audit deleting its folder; finished runs are kept as history.
+    """
+    global _writes
+    with _lock:
+        conn = _connect()
+        _writes += 1
+        with conn:
+            conn.execute("DELETE FROM audits WHERE full_vin = ? AND status = 'Ongoing'", (full_vin,))
+            conn.execute(
+                "INSERT INTO audits (full_vin, short_vin, person_pno, person_name, case_spec, variant,"
+                " engine_number, started_at, status, folder) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Ongoing', ?)",
+                (full_vin, short_vin, person_pno, person_name, case_spec, variant,
+                 engine_number, started_at, folder),
+            )
+
+
+def record_audit_finished(full_vin: str, finished_at: str, verdict: str,
+                          total_ok: int, total_notok: int, total_pending: int, folder: str):
+    """Close the latest run for a VIN with its final verdict (OK / NOT OK / INCOMPLETE)."""
+    global _writes
+    with _lock:
+        conn = _connect()
+        _writes += 1
+        with conn:
+            conn.execute(
+                "UPDATE audits SET status = 'Done', finished_at = ?, verdict = ?, total_ok = ?,"
+                " total_notok = ?, total_pending = ?, folder = ?"
+                " WHERE id = (SELECT MAX(id) FROM audits WHERE full_vin = ?)",
+                (finished_at, verdict, total_ok, total_notok, total_pending, folder, full_vin),
+            )
+
+
+def search_audits(vin_prefix: str = None, person_pno: str = None, case_spec: str = None,
+                  verdict: str = None, status: str = None, date_from: str = None,
+                  date_to: str = None, page: int = 1, page_size: int = 50):
+    """
+    Filtered, newest-first page of audits plus the total match count.
+    vin_prefix matches the start of either the full VIN or the 6-character short VIN.
+    """
+    where, params = [], []
+    if vin_prefix:
+        # Range comparison instead of LIKE so the VIN indexes are used
+        prefix = vin_prefix.strip().upper()
+        where.append("((full_vin >= ? AND full_vin < ?) OR (short_vin >= ? AND short_vin < ?))")
+        params += [prefix, prefix + "\uffff", prefix, prefix + "\uffff"]
+    if person_pno:
+        where.append("person_pno = ?")
+        params.append(person_pno.strip())
+    if case_spec:
+        where.append("case_spec = ?")
+        params.append(case_spec.strip())
+    if verdict:
+        where.append("verdict = ?")
+        params.append(verdict.strip().upper())
+    if status:
+        where.append("status = ?")
+        params.append(status.strip().capitalize())
+    if date_from:
+        where.append("started_at >= ?")
+        params.append(date_from)
+    if date_to:
+        # Plain dates include the whole day
+        where.append("started_at <= ?")
+        params.append(date_to + " 23:59:59" if len(date_to) == 10 else date_to)
+
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    offset = (page - 1) * page_size
+
+    global _count_version
+    with _lock:
+        conn = _connect()
+        # Paging through one search counts its matches once, until the table changes
+        version = _version(conn)
+        if version != _count_version:
+            _count_cache.clear()
+            _count_version = version
+        count_key = (where_sql, tuple(params))
+        total = _count_cache.get(count_key)
+        if total is None:
+            total = conn.execute(f"SELECT COUNT(*) FROM audits {where_sql}", params).fetchone()[0]
+            if len(_count_cache) >= COUNT_CACHE_SIZE:
+                _count_cache.clear()
+            _count_cache[count_key] = total
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM audits {where_sql}"
+            " ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, offset],
+        ).fetchall()
+
+    return total, [dict(zip(COLUMNS, row)) for row in rows]
+
+
+def _after_fork_in_child():
+    # SQLite connections must not be shared across fork: reopen lazily in the child
+    global _conn, _lock, _count_version
+    _conn = None
+    _lock = threading.Lock()
+    _count_cache.clear()
+    _count_version = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+_connect()
+
+
+def backfill_from_results():
+    """Seed the index from the results index for audits recorded before it existed."""
+    from utils import results_store
+
+    global _writes
+    added = 0
+    with _lock:
+        conn = _connect()
+        _writes += 1
+        known = {row[0] for row in conn.execute("SELECT DISTINCT full_vin FROM audits")}
+        with conn:
+            for full_vin, entry in results_store.find_entries():
+                if full_vin in known:
+                    continue
+                conn.execute(
+                    "INSERT INTO audits (full_vin, short_vin, person_pno, case_spec, variant,"
+                    " started_at, finished_at, status, folder) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (full_vin, full_vin[-6:], entry.get("person_pno"), entry.get("case_spec"),
+                     entry.get("variant"), entry["started"], entry.get("finished"),
+                     entry["state"], f"{results_store.RESULTS_DIR}/{entry['path']}"),
+                )
+                added += 1
+    return added
+
+
+def prune_missing_folders():
+    """Drop rows whose audit folder no longer exists (removed by hand or by older releases)."""
+    global _writes
+    with _lock:
+        conn = _connect()
+        missing = [
+            (row_id,) for row_id, folder in conn.execute("SELECT id, folder FROM audits")
+            if folder and not os.path.isdir(folder)
+        ]
+        _writes += 1
+        with conn:
+            conn.executemany("DELETE FROM audits WHERE id = ?", missing)
+    return len(missing)
+
+
+def analyze():
+    """Refresh the planner statistics after the data has grown or changed shape."""
+    with _lock:
+        _connect().execute("ANALYZE")
+
+
+if __name__ == "__main__":
+    # python -m utils.audit_index [backfill|prune|analyze]  (default: all three)
+    import sys
+
+    commands = sys.argv[1:] or ["backfill", "prune", "analyze"]
+    if "backfill" in commands:
+        print(f"Backfilled {backfill_from_results()} audits")
+    if "prune" in commands:
+        print(f"Dropped {prune_missing_folders()} rows without a folder")
+    if "analyze" in commands:
+        analyze()
+        print("Planner statistics refreshed")
@@ -0,0 +1,45 @@
+import time
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+
+from utils.audit_index import search_audits
+
+router = APIRouter()
+
+
+@router.get("/audits")
+async def list_audits(
+    vin: str = Query(None, description="Prefix of the full or short VIN"),
+    pno: str = Query(None, description="Worker P.No"),
+    case_spec: str = Query(None),
+    verdict: str = Query(None, description="OK, NOT OK or INCOMPLETE"),
+    status: str = Query(None, description="Ongoing or Done"),
+    date_from: str = Query(None, description="YYYY-MM-DD[ HH:MM:SS], inclusive"),
+    date_to: str = Query(None, description="YYYY-MM-DD[ HH:MM:SS], inclusive"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500)
+):
+    try:
+        started = time.perf_counter()
+        total, audits = search_audits(
+            vin_prefix=vin,
+            person_pno=pno,
+            case_spec=case_spec,
+            verdict=verdict,
+            status=status,
+            date_from=date_from,
+            date_to=date_to,
+            page=page,
+            page_size=page_size
+        )
+        return JSONResponse({
+            "status": "success",
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "pages": (total + page_size - 1) // page_size,
+            "audits": audits,
+            "query_ms": round((time.perf_counter() - started) * 1000, 2)
+        })
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
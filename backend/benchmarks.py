@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import math
+import platform
+import argparse
+import tempfile
+import statistics
+
+# ✅ Micro-benchmarks for the per-photo hot path (pipeline_utils / yolo_utils / ocr_utils)
+# on synthetic camera images from 1 MP to 48 MP, compared against a baseline recorded on
+# the team benchmark box and committed as benchmark_baseline.json next to this file. None
+# is committed yet: until one is, a comparison run exits 2 so CI cannot pass silently.
+#
+#   python -m utils.benchmarks                    compare with the baseline, exit 1 on regressions
+#                                                 (2 without a baseline)
+#   python -m utils.benchmarks --save-baseline    record a new baseline (on the team benchmark box)
+#   python -m utils.benchmarks --only run_ocr,imdecode --sizes 1,12
+#
+# YOLO and OCR run on utils.standin_engines by default so the numbers measure our code
+# (decode, resize, crop, matching) and not model weights; --real uses ultralytics /
+# PaddleOCR with --yolo-model. Cases are compared on their fastest run (min of N), which
+# shrugs off scheduler noise far better than the median, against a tolerance widened per
+# case by the noise recorded with the baseline. Baselines are machine specific: on a box
+# whose CPU count, OpenCV or engines differ the comparison is shown but does not fail.
+# Re-record the baseline whenever a case is added or its code path changes on purpose.
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_SIZES_MP = (1, 4, 12, 24, 48)
+DEFAULT_TOLERANCE = 0.25
+NOISE_FACTOR = 3  # allowed slowdown is at least this many recorded stdevs
+
+# Realistic OCR output of a part label (40 lines) and the annotations a KSpec asks for
+OCR_TEXTS = [f"line {i} lot {1000 + i} rev c" for i in range(37)] + ["airbag", "srs warning", "made in india"]
+OCR_REQUIRED = ["airbag", "srs", "india"]
+PIPELINE_ANNOTATION = "Buckle, Webbing , anchor,SKIP, retractor,latch plate,  ,tongue"
+
+
+def _dimensions(megapixels: float):
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    return width, int(width * 3 / 4)
+
+
+def _camera_image(megapixels: float, seed: int = 0):
+    """Camera-like image of the given size; built from a small one so 48 MP stays cheap."""
+    import cv2
+    import numpy as np
+    from utils import standin_engines
+
+    width, height = _dimensions(megapixels)
+    img = cv2.resize(standin_engines.synthetic_image(400, 300, seed), (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = np.empty_like(img)
+    cv2.randu(noise, 0, 24)
+    return cv2.add(img, noise)
+
+
+def _time_case(fn, min_runs: int, max_seconds: float):
+    fn()  # warm-up (caches, lazy init)
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < min_runs or (time.perf_counter() < deadline and len(samples) < 200):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "stdev_ms": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+    }
+
+
+def build_cases(sizes, yolo_model: str):
+    """[(name, size label, fn)] for every benchmark; image-size dependent ones once per size."""
+    import cv2
+    import numpy as np
+    from utils import image_decode, ocr_utils, yolo_utils
+    from utils import pipeline_utils as pu
+
+    cases = [
+        ("parse_csv", "-", lambda: pu.parse_csv(PIPELINE_ANNOTATION)),
+        ("ocr_texts_match", "-", lambda: pu.ocr_texts_match(OCR_REQUIRED, OCR_TEXTS)),
+    ]
+    for mp in sizes:
+        label = f"{mp}MP"
+        img = _camera_image(mp)
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        jpeg = buf.tobytes()
+        h, w = img.shape[:2]
+        box = np.array([[[w * 0.2, h * 0.25], [w * 0.8, h * 0.2], [w * 0.85, h * 0.8], [w * 0.15, h * 0.75]]],
+                       dtype=np.float32)
+        cases += [
+            ("imdecode", label, lambda jpeg=jpeg: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)),
+            ("decode_for_ocr", label, lambda jpeg=jpeg: image_decode.decode(jpeg, ocr_utils.OCR_MAX_SIDE)),
+            ("run_yolo_obb", label, lambda img=img: yolo_utils.run_yolo_obb(yolo_model, img)),
+            ("crop_highest_conf_roi", label, lambda img=img, box=box: pu.crop_highest_conf_roi(img, [box])),
+            ("convert_to_bw", label, lambda img=img: pu.convert_to_bw(img)),
+            ("run_ocr", label, lambda jpeg=jpeg: ocr_utils.run_ocr(jpeg)),
+        ]
+    return cases
+
+
+def machine_info(engines: str):
+    import cv2
+    import numpy as np
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "engines": engines,
+    }
+
+
+def case_tolerance(base: dict, tolerance: float):
+    """Allowed slowdown for one case: the global tolerance, widened for cases that were noisy."""
+    if not base["min_ms"]:
+        return tolerance
+    return max(tolerance, NOISE_FACTOR * base.get("stdev_ms", 0.0) / base["median_ms"])
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Rows of (case, baseline min ms, current min ms, change, allowed, flag)."""
+    rows = []
+    for case, current in results.items():
+        base = baseline.get("results", {}).get(case)
+        if not base:
+            rows.append((case, None, current["min_ms"], None, None, "new"))
+            continue
+        allowed = case_tolerance(base, tolerance)
+        change = current["min_ms"] / base["min_ms"] - 1 if base["min_ms"] else 0.0
+        flag = "REGRESSION" if change > allowed else "faster" if change < -allowed else "ok"
+        rows.append((case, base["min_ms"], current["min_ms"], change, allowed, flag))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks with baseline comparison")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES_MP), help="megapixels, comma separated")
+    parser.add_argument("--only", help="comma separated benchmark names")
+    parser.add_argument("--min-runs", type=int, default=20)
+    parser.add_argument("--max-seconds", type=float, default=3.0, help="time budget per case")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--real", action="store_true", help="real ultralytics / PaddleOCR instead of stand-ins")
+    parser.add_argument("--yolo-model", help="model for run_yolo_obb with --real")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    args.baseline = os.path.abspath(args.baseline)  # before the chdir below
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}: record one on the benchmark box with --save-baseline and commit it")
+        return 2
+
+    # The route modules keep state in data/ and results/ relative to the cwd: import them in a scratch dir
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.chdir(tempfile.mkdtemp(prefix="kspec-bench-"))
+
+    from utils import standin_engines
+    engines = "real" if args.real else "standin"
+    if args.real:
+        if not args.yolo_model:
+            parser.error("--real needs --yolo-model")
+        yolo_model = os.path.abspath(args.yolo_model)
+    else:
+        standin_engines.install()
+        yolo_model = standin_engines.write_model("models/standin.pt", ["buckle"])
+
+    sizes = [float(s) if "." in s else int(s) for s in args.sizes.split(",")]
+    only = set(args.only.split(",")) if args.only else None
+    results = {}
+    for name, label, fn in build_cases(sizes, yolo_model):
+        if only and name not in only:
+            continue
+        case = f"{name}@{label}"
+        results[case] = _time_case(fn, args.min_runs, args.max_seconds)
+        print(f"  {case:<32}{results[case]['min_ms']:>12.3f} ms  (median {results[case]['median_ms']:.3f}, "
+              f"{results[case]['runs']} runs)")
+
+    info = machine_info(engines)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"machine": info, "results": results}, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {"machine": info, "recorded": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"📝 Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    comparable = True
+    for key in ("machine", "cpu_count", "opencv", "engines"):
+        if baseline.get("machine", {}).get(key) != info[key]:
+            print(f"⚠️ Baseline {key} differs ({baseline['machine'].get(key)} vs {info[key]}): timings are not comparable")
+            comparable = False
+
+    rows = compare(results, baseline, args.tolerance)
+    print(f"\n{'case':<32}{'baseline':>12}{'current':>12}{'change':>10}{'allowed':>10}   (min ms)")
+    for case, base, current, change, allowed, flag in rows:
+        base_text = f"{base:.3f}" if base is not None else "-"
+        change_text = f"{change:+.1%}" if change is not None else "-"
+        allowed_text = f"{allowed:.0%}" if allowed is not None else "-"
+        print(f"{case:<32}{base_text:>12}{current:>12.3f}{change_text:>10}{allowed_text:>10}   {flag}")
+    regressions = [row[0] for row in rows if row[5] == "REGRESSION"]
+    if regressions and not comparable:
+        print(f"\n⚠️ {len(regressions)} slower case(s), not failing: the baseline was recorded on another kind of box")
+        return 0
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import json
+import hashlib
+import os
+import threading
+from collections import deque
+
+from utils import image_decode
+from utils import kspec_registry
+from utils import ocr_utils
+from utils import runtime_profile
+
+# ✅ Capture profiles: the smallest photo each tablet screen needs to send for the
+# pipeline that runs on it, so the app scales and compresses before uploading instead of
+# sending a full-resolution quality-1 photo that the server decodes only to shrink it.
+# Derived from what the pipeline actually looks at:
+#   OCR (ocr_utils)          resizes to OCR_MAX_SIDE on the long side
+#   YOLO                     letterboxes to its input size (runtime profile, else 640)
+#   YOLO_SIMPLEDETECT        after YOLO_ROIDETECT it only sees the ROI crop, assumed to
+#                            span at least ROI_MIN_FRACTION of the photo's long side
+#                            (pipelineConfig "ROI_MIN_FRACTION" per component, else the
+#                            env default). The fractions actually detected are recorded
+#                            per component (record_roi, /metrics "capture_roi") to set it by.
+#   component photos         are also the audit evidence: EVIDENCE_MIN_SIDE at least
+# Screens: "vin", "person" (OCR only) and one per KSpec component. Served by
+# routes.capture_profile; uploads are recorded per screen (record_upload, /metrics).
+# The app sends X-Capture-Profile (the version it scaled for) and X-Capture-Original
+# (WxH before scaling) with its uploads.
+#
+#   KSPEC_ROI_MIN_FRACTION=0.5
+YOLO_INPUT_SIZE = 640
+ROI_MIN_FRACTION = float(os.getenv("KSPEC_ROI_MIN_FRACTION", "0.5"))
+ROI_SAMPLES = 1000  # detected ROI fractions kept per component
+EVIDENCE_MIN_SIDE = 1280
+OCR_JPEG_QUALITY = 90   # text edges survive, block artefacts don't turn into glyphs
+YOLO_JPEG_QUALITY = 85
+OVERSIZED_FACTOR = 1.25  # uploads this much above the profile count as not pre-scaled
+PROFILE_HEADER = "x-capture-profile"
+ORIGINAL_HEADER = "x-capture-original"
+
+_lock = threading.Lock()
+_stats = {}  # screen -> counters, see record_upload
+_roi = {}  # (case_code, component) -> {"configured": fraction, "samples": deque}
+
+
+def _yolo_input_size():
+    return runtime_profile.imgsz() or YOLO_INPUT_SIZE
+
+
+def _profile(needs: dict, jpeg_quality: int):
+    """needs: {reason: long side in px} -> the profile covering all of them."""
+    return {"max_side": max(needs.values()), "jpeg_quality": jpeg_quality, "needs": needs}
+
+
+def ocr_profile():
+    return _profile({"ocr": ocr_utils.OCR_MAX_SIDE}, OCR_JPEG_QUALITY)
+
+
+def roi_min_fraction(pipeline: dict):
+    """Smallest share of the photo's long side the ROI is expected to span, in (0, 1]."""
+    try:
+        fraction = float(pipeline.get("ROI_MIN_FRACTION", ROI_MIN_FRACTION))
+    except (TypeError, ValueError):
+        fraction = ROI_MIN_FRACTION
+    return min(1.0, max(0.05, fraction))
+
+
+def pipeline_profile(pipeline: dict):
+    """Capture profile for a component's pipelineConfig."""
+    size = _yolo_input_size()
+    needs = {"evidence": EVIDENCE_MIN_SIDE}
+    quality = YOLO_JPEG_QUALITY
+    if any(pipeline.get(stage, "SKIP") != "SKIP" for stage in ("YOLO_DONTDETECT", "YOLO_ROIDETECT", "YOLO_SIMPLEDETECT")):
+        needs["yolo"] = size
+    if pipeline.get("YOLO_SIMPLEDETECT", "SKIP") != "SKIP" and pipeline.get("YOLO_ROIDETECT", "SKIP") != "SKIP":
+        needs["yolo_roi"] = int(size / roi_min_fraction(pipeline))
+    if pipeline.get("OCR_DETECT", "SKIP") != "SKIP":
+        needs["ocr"] = ocr_utils.OCR_MAX_SIDE  # OCR reads the whole upload, not the ROI
+        quality = OCR_JPEG_QUALITY
+    return _profile(needs, quality)
+
+
+def _build_component_profiles(case_code: str, case_data: dict):
+    return {c["name"]: pipeline_profile(c.get("pipelineConfig", {})) for c in case_data.get("components", [])}
+
+
+# case_code -> {component: profile}, rebuilt with the KSpec that changes it
+kspec_registry.register_derived("capture_profiles", _build_component_profiles)
+
+
+def profiles(case_code: str = None):
+    """Profiles for the fixed screens, plus every component of case_code; None for an unknown case."""
+    result = {"vin": ocr_profile(), "person": ocr_profile()}
+    if case_code:
+        components = kspec_registry.get_derived("capture_profiles").get(case_code)
+        if components is None:
+            return None
+        result["components"] = components
+    version = hashlib.sha1(json.dumps(result, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    return {"version": version, **result}
+
+
+def needed_side(screen: str, case_code: str = None, component: str = None):
+    """Long side the pipeline needs for an upload from screen (component photos: of that component)."""
+    if screen != "component":
+        return ocr_profile()["max_side"]
+    components = kspec_registry.get_derived("capture_profiles").get(case_code) or {}
+    profile = components.get(component)
+    return profile["max_side"] if profile else None
+
+
+# ============================== #
+# ✅ Upload accounting
+# ============================== #
+def _parse_dimensions(value: str):
+    try:
+        width, height = (int(v) for v in value.lower().split("x", 1))
+        return (width, height) if width > 0 and height > 0 else None
+    except (ValueError, AttributeError):
+        return None
+
+
+def record_upload(headers, screen: str, data: bytes, case_code: str = None, component: str = None):
+    """Count an upload for screen: its size, whether the app pre-scaled it and what that saved."""
+    size = image_decode.image_size(data)
+    needed = needed_side(screen, case_code, component)
+    original = _parse_dimensions(headers.get(ORIGINAL_HEADER))
+    with _lock:
+        stats = _stats.setdefault(screen, {"uploads": 0, "prescaled": 0, "oversized": 0, "unreadable": 0,
+                                           "bytes_total": 0, "pixels_total": 0, "original_pixels_total": 0})
+        stats["uploads"] += 1
+        stats["bytes_total"] += len(data)
+        if headers.get(PROFILE_HEADER):
+            stats["prescaled"] += 1
+        if size is None:
+            stats["unreadable"] += 1
+            return None
+        stats["pixels_total"] += size[0] * size[1]
+        stats["original_pixels_total"] += original[0] * original[1] if original else size[0] * size[1]
+        if needed and max(size) > needed * OVERSIZED_FACTOR:
+            stats["oversized"] += 1
+    return size
+
+
+def stats():
+    with _lock:
+        screens = {}
+        for screen, s in sorted(_stats.items()):
+            n = s["uploads"]
+            screens[screen] = {
+                "uploads": n,
+                "prescaled": s["prescaled"],
+                "oversized": s["oversized"],
+                "unreadable": s["unreadable"],
+                "bytes_avg": round(s["bytes_total"] / n),
+                "megapixels_avg": round(s["pixels_total"] / max(1, n - s["unreadable"]) / 1e6, 2),
+                "pixels_saved_by_prescaling": s["original_pixels_total"] - s["pixels_total"],
+            }
+    return screens
+
+
+def record_roi(case_code: str, component: str, pipeline: dict, photo_shape, roi_shape):
+    """Record the share of the photo's long side a detected ROI spans (both shapes at one scale)."""
+    fraction = max(roi_shape[:2]) / max(1, max(photo_shape[:2]))
+    with _lock:
+        entry = _roi.setdefault((case_code, component), {"samples": deque(maxlen=ROI_SAMPLES)})
+        entry["configured"] = roi_min_fraction(pipeline)
+        entry["samples"].append(fraction)
+
+
+def roi_stats():
+    """Per component: configured ROI_MIN_FRACTION against the fractions detected recently."""
+    with _lock:
+        entries = {key: (e["configured"], sorted(e["samples"])) for key, e in _roi.items()}
+    result = {}
+    for (case_code, component), (configured, samples) in sorted(entries.items()):
+        n = len(samples)
+        result.setdefault(case_code, {})[component] = {
+            "configured": configured,
+            "samples": n,
+            "min": round(samples[0], 3),
+            "p05": round(samples[int(0.05 * (n - 1))], 3),
+            "median": round(samples[(n - 1) // 2], 3),
+            "below_configured": sum(1 for f in samples if f < configured),
+        }
+    return result
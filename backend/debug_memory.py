@@ -0,0 +1,92 @@
+import threading
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from utils import memory_accounting
+from utils.admin_auth import admin_denied
+
+router = APIRouter()
+
+# ✅ Memory debugging (admin only):
+#   POST /debug/memory/tracemalloc?enable=true&frames=1   turn allocation tracing on / off
+#   POST /debug/memory/snapshot                            keep a snapshot to diff against
+#   GET  /debug/memory/top?limit=25&group_by=lineno&diff=true
+# Per-endpoint / per-stage figures are on /metrics ("request_memory").
+# tracemalloc costs CPU and memory while on: enable it for the investigation only.
+UNTRACKED_PREFIXES = ("/data", "/health", "/ready", "/metrics", "/debug")
+GROUP_BY = ("lineno", "filename", "traceback")
+
+_baseline = None
+_baseline_lock = threading.Lock()
+
+
+@router.post("/debug/memory/tracemalloc")
+async def set_tracemalloc(request: Request, enable: bool = True, frames: int = 1):
+    global _baseline
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    if enable:
+        memory_accounting.start_tracing(min(max(frames, 1), 50))
+    else:
+        memory_accounting.stop_tracing()
+        with _baseline_lock:
+            _baseline = None
+    return JSONResponse({"status": "success", **memory_accounting.tracing_state()})
+
+
+@router.post("/debug/memory/snapshot")
+def take_baseline(request: Request):  # plain def: a snapshot of a large heap takes seconds
+    global _baseline
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    taken = memory_accounting.top_allocations(limit=0)
+    if taken is None:
+        return JSONResponse({"status": "error", "message": "tracemalloc is off, enable it first"}, status_code=409)
+    with _baseline_lock:
+        _baseline = taken[0]
+    return JSONResponse({"status": "success", **memory_accounting.tracing_state()})
+
+
+@router.get("/debug/memory/top")
+def top_allocations(request: Request, limit: int = 25, group_by: str = "lineno", diff: bool = False):
+    # Plain def: the snapshot and its statistics run in the threadpool, not on the event loop
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    if group_by not in GROUP_BY:
+        return JSONResponse({"status": "error", "message": f"group_by must be one of {', '.join(GROUP_BY)}"}, status_code=400)
+    with _baseline_lock:
+        baseline = _baseline
+    if diff and baseline is None:
+        return JSONResponse({"status": "error", "message": "No snapshot yet, POST /debug/memory/snapshot first"}, status_code=409)
+    taken = memory_accounting.top_allocations(min(max(limit, 1), 500), group_by, baseline if diff else None)
+    if taken is None:
+        return JSONResponse({"status": "error", "message": "tracemalloc is off, enable it first"}, status_code=409)
+    return JSONResponse({
+        "status": "success",
+        "group_by": group_by,
+        "diff": diff,
+        "tracemalloc": memory_accounting.tracing_state(),
+        "top": taken[1],
+    })
+
+
+class RequestMemoryMiddleware:
+    """Per-request RSS / tracemalloc accounting, recorded under the matched route path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACKED_PREFIXES):
+            return await self.app(scope, receive, send)
+        token = memory_accounting.begin()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # The router leaves the matched route in the scope; unmatched (404) paths are not recorded
+            route = scope.get("route")
+            memory_accounting.end(token, getattr(route, "path", None))
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.datastructures import Headers
+
+from utils import sampling_profiler
+from utils.admin_auth import admin_denied, is_admin
+
+router = APIRouter()
+
+# ✅ Where does the time go in production?
+#   GET /debug/profile?seconds=10&format=speedscope   sample every thread of this process
+#   X-Debug-Profile: collapsed|speedscope             on a /process_component request:
+#       profile just that request; the response carries X-Profile-Id and the profile
+#       is fetched with GET /debug/profile/<id>
+# Open the output in https://www.speedscope.app or feed collapsed stacks to flamegraph.pl.
+# Under prefork each worker is profiled on its own: a call samples the worker serving it.
+MAX_SECONDS = 60
+PROFILE_HEADER = "x-debug-profile"
+PROFILED_PATHS = {"/process_component"}
+
+_busy = threading.Lock()  # one whole-process profile at a time
+
+
+@router.get("/debug/profile")
+async def profile_process(request: Request, seconds: float = 5.0, format: str = "collapsed", interval_ms: float = 5.0):
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    if format not in sampling_profiler.FORMATS:
+        return JSONResponse({"status": "error", "message": f"format must be one of {', '.join(sampling_profiler.FORMATS)}"}, status_code=400)
+    if not 0 < seconds <= MAX_SECONDS or not 1 <= interval_ms <= 1000:
+        return JSONResponse({"status": "error", "message": f"seconds must be in (0, {MAX_SECONDS}], interval_ms in [1, 1000]"}, status_code=400)
+    if not _busy.acquire(blocking=False):
+        return JSONResponse({"status": "error", "message": "A profile is already running"}, status_code=409)
+    try:
+        # The event loop keeps serving while we sleep, so live requests are in the samples
+        with sampling_profiler.Sampler(interval=interval_ms / 1000) as sampler:
+            await asyncio.sleep(seconds)
+    finally:
+        _busy.release()
+    body, media_type = sampler.export(format, f"backend {seconds:g}s")
+    return Response(body, media_type=media_type, headers={"X-Profile-Samples": str(sampler.samples)})
+
+
+@router.get("/debug/profile/{profile_id}")
+async def get_saved_profile(request: Request, profile_id: str):
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    path, media_type = sampling_profiler.load(profile_id)
+    if not path:
+        return JSONResponse({"status": "error", "message": "Profile not found"}, status_code=404)
+    return FileResponse(path, media_type=media_type)
+
+
+class RequestProfileMiddleware:
+    """
+    Per-request mode: samples the event-loop thread, and the threadpool thread running
+    the pipeline (utils.admission), while an admin's request with the X-Debug-Profile
+    header runs. Other requests interleaved on the loop during that time can appear in
+    the profile too; profile on a quiet server for a clean picture.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in PROFILED_PATHS:
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        fmt = headers.get(PROFILE_HEADER, "").strip().lower()
+        client_host = scope["client"][0] if scope.get("client") else ""
+        if not fmt:
+            return await self.app(scope, receive, send)
+        if fmt not in sampling_profiler.FORMATS or not is_admin(headers, client_host):
+            return await self.app(scope, receive, send)  # never break a tablet over a debug header
+
+        sampler = sampling_profiler.Sampler(thread_ids=[threading.get_ident()])
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until the handler is done so the profile id can be added
+                start_message = message
+                return
+            if start_message is not None:
+                sampler.stop()
+                profile_id = sampling_profiler.save(sampler, fmt, f"{scope['method']} {scope['path']}")
+                start_message["headers"] = list(start_message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode()),
+                    (b"x-profile-url", f"/debug/profile/{profile_id}".encode()),
+                ]
+                await send(start_message)
+                start_message = None
+            await send(message)
+
+        token = sampling_profiler.bind(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampling_profiler.unbind(token)
+            if sampler.running:
+                sampler.stop()
@@ -0,0 +1,239 @@
+import gc
+import os
+import time
+import threading
+
+# ✅ Replicas of the inference engines (one per YOLO model path, plus "ocr") for the
+# elastic inference service. Neither engine is thread-safe, so a job checks out a
+# replica of its engine for the duration of the job; when every replica is busy and the
+# engine may grow (max_replicas, pool.allow_growth) a new one is loaded, otherwise the
+# job waits for one to come back. reap() retires replicas idle for idle_seconds and
+# releases their memory, except the warm spares kept for the hottest engines (by
+# decayed request rate), so the models the line is using right now never go cold.
+# Callers that order their own waiters (inference_server's fair slot line) use
+# try_checkout / load, which never block, instead of checkout.
+DEFAULT_IDLE_SECONDS = 300
+DEFAULT_HOT_ENGINES = 3
+RATE_HALF_LIFE = 600.0  # seconds; request rates decay with this half-life
+LOAD = "load"  # try_checkout: no replica free, the caller is to load a new one (load())
+
+
+class Replica:
+    def __init__(self, key: str, engine):
+        self.key = key
+        self.engine = engine
+        self.busy = False
+        self.last_used = time.monotonic()
+        self.jobs = 0
+
+
+class EnginePool:
+    def __init__(self, loader, max_replicas: int = 2, idle_seconds: float = DEFAULT_IDLE_SECONDS,
+                 hot_engines: int = DEFAULT_HOT_ENGINES, warm_spares: int = 1, always_warm=("ocr",)):
+        """loader(key) -> a freshly loaded engine for key (its own instance, not a cached one)."""
+        self.loader = loader
+        self.max_replicas = max(1, max_replicas)
+        self.idle_seconds = idle_seconds
+        self.hot_engines = hot_engines
+        self.warm_spares = warm_spares
+        self.always_warm = set(always_warm)
+        self.allow_growth = lambda key: True  # the autoscaler vetoes growth without CPU headroom
+        self._replicas = {}   # key -> [Replica]
+        self._loading = {}    # key -> replicas being loaded
+        self._waiting = {}    # key -> jobs waiting for a replica
+        self._rates = {}      # key -> (decayed request count, as of monotonic time)
+        self._cond = threading.Condition()
+        self.loaded_total = 0
+        self.retired_total = 0
+
+    # ------------------------------ jobs ------------------------------ #
+    def _bump_rate(self, key: str):
+        now = time.monotonic()
+        rate, since = self._rates.get(key, (0.0, now))
+        self._rates[key] = (rate * 0.5 ** ((now - since) / RATE_HALF_LIFE) + 1.0, now)
+
+    def _can_grow(self, key: str):
+        return len(self._replicas.get(key, [])) + self._loading.get(key, 0) < self.max_replicas
+
+    def checkout(self, key: str):
+        with self._cond:
+            self._bump_rate(key)
+            while True:
+                replica = next((r for r in self._replicas.get(key, []) if not r.busy), None)
+                if replica is not None:
+                    replica.busy = True
+                    return replica
+                have_any = bool(self._replicas.get(key)) or self._loading.get(key, 0)
+                if not have_any or (self._can_grow(key) and self.allow_growth(key)):
+                    self._loading[key] = self._loading.get(key, 0) + 1
+                    break
+                self._waiting[key] = self._waiting.get(key, 0) + 1
+                self._cond.wait()
+                self._waiting[key] -= 1
+        return self.load(key)
+
+    def try_checkout(self, key: str):
+        """A free replica of key (checked out), LOAD when one may be loaded for this job, or None."""
+        with self._cond:
+            replica = next((r for r in self._replicas.get(key, []) if not r.busy), None)
+            if replica is not None:
+                replica.busy = True
+                self._bump_rate(key)
+                return replica
+            have_any = bool(self._replicas.get(key)) or self._loading.get(key, 0)
+            if not have_any or (self._can_grow(key) and self.allow_growth(key)):
+                self._loading[key] = self._loading.get(key, 0) + 1
+                self._bump_rate(key)
+                return LOAD
+            return None
+
+    def load(self, key: str):
+        """Load the replica a LOAD (or a growing checkout) made room for; returned checked out."""
+        # Load outside the lock: other engines keep serving meanwhile
+        try:
+            replica = Replica(key, self.loader(key))
+        finally:
+            with self._cond:
+                self._loading[key] -= 1
+                self._cond.notify_all()
+        with self._cond:
+            replica.busy = True
+            self._replicas.setdefault(key, []).append(replica)
+            self.loaded_total += 1
+        return replica
+
+    def waiting_for(self, key: str, delta: int):
+        """Jobs queued outside the pool for a replica of key (stats "waiting")."""
+        with self._cond:
+            self._waiting[key] = self._waiting.get(key, 0) + delta
+
+    def checkin(self, replica: Replica):
+        with self._cond:
+            replica.busy = False
+            replica.jobs += 1
+            replica.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def run(self, key: str, fn):
+        """fn(engine) on a checked-out replica of key."""
+        replica = self.checkout(key)
+        try:
+            return fn(replica.engine)
+        finally:
+            self.checkin(replica)
+
+    # ------------------------------ sizing ------------------------------ #
+    def hot(self):
+        """Engines that keep warm spares: always_warm plus the hottest by request rate."""
+        now = time.monotonic()
+        rates = {key: rate * 0.5 ** ((now - since) / RATE_HALF_LIFE) for key, (rate, since) in self._rates.items()}
+        hottest = sorted(rates, key=rates.get, reverse=True)[:self.hot_engines]
+        return self.always_warm | set(hottest)
+
+    def preload(self, key: str):
+        """Load one replica of key up front (startup / warm spare)."""
+        with self._cond:
+            if not self._can_grow(key):
+                return False
+            self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            replica = Replica(key, self.loader(key))
+        finally:
+            with self._cond:
+                self._loading[key] -= 1
+        with self._cond:
+            self._replicas.setdefault(key, []).append(replica)
+            self.loaded_total += 1
+            self._cond.notify_all()
+        return True
+
+    def spare_needed(self):
+        """Hot engines whose every replica is busy and that may still grow: load a spare now."""
+        with self._cond:
+            hot = self.hot()
+            return [key for key in hot
+                    if self._replicas.get(key) and not self._loading.get(key)
+                    and all(r.busy for r in self._replicas[key]) and self._can_grow(key)]
+
+    def reap(self):
+        """Retire replicas idle longer than idle_seconds, keeping warm spares; returns the retired keys."""
+        now = time.monotonic()
+        retired = []
+        with self._cond:
+            hot = self.hot()
+            for key, replicas in list(self._replicas.items()):
+                keep = self.warm_spares if key in hot else 0
+                idle = sorted((r for r in replicas if not r.busy and now - r.last_used > self.idle_seconds),
+                              key=lambda r: r.last_used)
+                removable = max(0, len(replicas) - keep)
+                for replica in idle[:removable]:
+                    replicas.remove(replica)
+                    retired.append(key)
+                if not replicas:
+                    del self._replicas[key]
+            self.retired_total += len(retired)
+        if retired:
+            _release_memory()
+        return retired
+
+    def waiting(self):
+        with self._cond:
+            return sum(self._waiting.values())
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            hot = self.hot()
+            engines = {
+                key: {
+                    "replicas": len(replicas),
+                    "busy": sum(r.busy for r in replicas),
+                    "loading": self._loading.get(key, 0),
+                    "waiting": self._waiting.get(key, 0),
+                    "jobs": sum(r.jobs for r in replicas),
+                    "idle_s": round(min((now - r.last_used for r in replicas if not r.busy), default=0.0)),
+                    "hot": key in hot,
+                }
+                for key, replicas in sorted(self._replicas.items())
+            }
+        return {"max_replicas": self.max_replicas, "idle_seconds": self.idle_seconds,
+                "loaded_total": self.loaded_total, "retired_total": self.retired_total, "engines": engines}
+
+
+def _release_memory():
+    """Drop the retired engines now and hand freed heap back to the OS (glibc)."""
+    gc.collect()
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class CpuMonitor:
+    """Host CPU busy fraction between two samples (/proc/stat), load average elsewhere."""
+
+    def __init__(self):
+        self._last = self._times()
+
+    @staticmethod
+    def _times():
+        try:
+            with open("/proc/stat", "r") as f:
+                values = [int(v) for v in f.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        return idle, sum(values)
+
+    def busy(self):
+        current = self._times()
+        if current is None or self._last is None:
+            try:
+                return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+            except (OSError, AttributeError):
+                return 0.0
+        idle = current[0] - self._last[0]
+        total = current[1] - self._last[1]
+        self._last = current
+        return 1.0 - idle / total if total > 0 else 0.0
@@ -0,0 +1,123 @@
+import os
+import heapq
+import itertools
+import contextvars
+from collections import Counter
+
+# ✅ Who goes next for YOLO / OCR work, in the API workers (utils.admission) and in the
+# shared inference service (utils.inference_server).
+# Classes are served in strict priority order: an operator waiting on verify_person /
+# verify_vin to start an audit ("interactive") goes before mid-audit photos ("audit"),
+# and both go before re-evaluations and other bulk jobs ("batch").
+# Within a class, stations (tablets) share the slots by weighted fair queueing: each
+# queued job gets a virtual finish time of max(now, station's last finish) + 1/weight,
+# and the smallest goes first, so a tablet spamming retries only pushes back its own
+# jobs. Weights default to 1:  KSPEC_STATION_WEIGHTS="line1-tab3=2,qa-desk=0.5"
+# A station with nothing queued whose finish time the class has caught up with (or whose
+# class has nothing queued at all) is forgotten, as WFQ resets an idle flow: station ids
+# come from client headers, so only the stations with work in flight are kept.
+PRIORITY_CLASSES = ("interactive", "audit", "batch")
+DEFAULT_CLASS = "audit"
+
+# (priority class, station) of the work running in this context, forwarded by
+# inference_client so the inference service schedules it the same way
+current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def normalize_class(name):
+    name = (name or "").strip().lower()
+    return name if name in PRIORITY_CLASSES else DEFAULT_CLASS
+
+
+def rank(cls: str):
+    return PRIORITY_CLASSES.index(cls)
+
+
+def _weights_from_env():
+    weights = {}
+    for item in os.getenv("KSPEC_STATION_WEIGHTS", "").split(","):
+        station, _, weight = item.partition("=")
+        try:
+            if station.strip() and float(weight) > 0:
+                weights[station.strip()] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class FairQueue:
+    """Not thread-safe: callers hold their own lock (or stay on one event loop)."""
+
+    def __init__(self, classes=PRIORITY_CLASSES, weights=None):
+        self.classes = tuple(classes)
+        self.weights = _weights_from_env() if weights is None else weights
+        self._heaps = {c: [] for c in self.classes}
+        self._virtual_time = {c: 0.0 for c in self.classes}
+        self._last_finish = {}       # (class, station) -> virtual finish of its last queued job
+        self._queued = Counter()     # (class, station) -> live queued jobs
+        self._seq = itertools.count()
+
+    def push(self, item, cls: str, station: str):
+        """Queue item; returns a handle for discard()."""
+        key = (cls, station)
+        start = max(self._virtual_time[cls], self._last_finish.get(key, 0.0))
+        finish = start + 1.0 / self.weights.get(station, 1.0)
+        self._last_finish[key] = finish
+        entry = [finish, next(self._seq), start, cls, station, item, True]
+        heapq.heappush(self._heaps[cls], entry)
+        self._queued[key] += 1
+        return entry
+
+    def _dequeued(self, cls: str, station: str):
+        key = (cls, station)
+        self._queued[key] -= 1
+        if self._queued[key] <= 0:
+            del self._queued[key]
+        # Forget idle stations: their next job would start at the class's virtual time anyway
+        class_idle = not any(c == cls for c, _ in self._queued)
+        for idle in [k for k, finish in self._last_finish.items()
+                     if k[0] == cls and k not in self._queued and (class_idle or finish <= self._virtual_time[cls])]:
+            del self._last_finish[idle]
+
+    def discard(self, entry):
+        """Drop a queued job (timed out / cancelled). Its place in the station's order is kept."""
+        if entry[6]:
+            entry[6] = False
+            self._dequeued(entry[3], entry[4])
+
+    def pop(self, accept=None):
+        """
+        (item, class, station) of the next job, or None when empty. With accept, the next
+        job for which accept(item) is true; the ones it passes over keep their place.
+        """
+        for cls in self.classes:
+            heap = self._heaps[cls]
+            while heap and not heap[0][6]:
+                heapq.heappop(heap)
+            for entry in (heap[:1] if accept is None else sorted(heap)):
+                if not entry[6] or (accept is not None and not accept(entry[5])):
+                    continue
+                entry[6] = False  # taken; dropped from the heap once it reaches the top
+                _, _, start, _, station, item, _ = entry
+                self._virtual_time[cls] = max(self._virtual_time[cls], start)
+                self._dequeued(cls, station)
+                return item, cls, station
+        return None
+
+    def __len__(self):
+        return sum(self._queued.values())
+
+    def queued(self, cls: str = None, station: str = None):
+        return sum(n for (c, s), n in self._queued.items()
+                   if (cls is None or c == cls) and (station is None or s == station))
+
+    def queued_ahead(self, cls: str):
+        """Jobs a new cls job would wait behind: everything queued in its class or above."""
+        return sum(n for (c, _), n in self._queued.items() if rank(c) <= rank(cls))
+
+    def by_station(self):
+        stations = Counter()
+        for (_, station), n in self._queued.items():
+            if n:
+                stations[station] += n
+        return dict(stations)
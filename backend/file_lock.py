@@ -0,0 +1,35 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process serving only, the thread locks are enough
+    fcntl = None
+
+# ✅ Cross-process lock around read-modify-write of shared JSON files (results index,
+# KSpec manifest, blob refs) so several API worker processes can't lose each other's
+# updates. Re-entrant per thread, like the RLocks it is nested in.
+_held = threading.local()
+
+
+@contextmanager
+def locked(lock_path: str):
+    depth = getattr(_held, "depth", None)
+    if depth is None:
+        depth = _held.depth = {}
+    if fcntl is None or depth.get(lock_path):
+        depth[lock_path] = depth.get(lock_path, 0) + 1
+        try:
+            yield
+        finally:
+            depth[lock_path] -= 1
+        return
+
+    with open(lock_path, "a+") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        depth[lock_path] = 1
+        try:
+            yield
+        finally:
+            depth[lock_path] = 0
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+
+from utils import capture_profile
+
+router = APIRouter()
+
+
+@router.get("/capture_profile")
+async def get_capture_profile(
+    case_spec: str = Query(None, description="Also return a profile per component of this Case Specification")
+):
+    """
+    Resolution and JPEG quality each capture screen needs (utils.capture_profile):
+    {"version", "vin", "person", "components": {name: {"max_side", "jpeg_quality", "needs"}}}.
+    The app scales photos to max_side before uploading and sends the version back in
+    X-Capture-Profile.
+    """
+    try:
+        result = capture_profile.profiles(case_spec)
+        if result is None:
+            return JSONResponse(content={"status": "not_found"}, status_code=404)
+        return JSONResponse(content={"status": "success", **result}, headers={"Cache-Control": "no-cache"})
+    except Exception as e:
+        return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
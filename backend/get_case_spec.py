@@ -1,15 +1,34 @@
 import json
+import gzip
+import hashlib
 from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi import Request
 
+from utils import kspec_registry
+
 router = APIRouter()
 
-# ✅ Load JSON DB once at startup
-with open("data/CaseSpecifications.json", "r") as f:
-    CASE_SPECS_DB = json.load(f)
+# ✅ Responses are pre-serialized per case code with a base URL placeholder (rebuilt by
+# the KSpec registry with every snapshot), then rendered once per host into
+# (etag, json bytes, gzip bytes).
+BASE_URL_TOKEN = "__OXO_BASE_URL__"
+
+_rendered = {}  # (registry version, case_code, base_url, lite) -> (etag, body, gzipped body)
+
+
+def _variant_urls(variants: dict, base_url: str):
+    """{size: {format: path}} -> same shape with absolute URLs (None if the image has no variants)."""
+    if not variants:
+        return None
+    return {size: {fmt: f"{base_url}/{path}" for fmt, path in formats.items()} for size, formats in variants.items()}
+
 
-# ✅ Your server base URL (adjust later when deployed)
+def _display_url(path: str, variants: dict, base_url: str):
+    # Screen-sized JPEG renders everywhere; originals only for KSpecs without variants
+    if variants and "screen" in variants:
+        return f"{base_url}/{variants['screen']['jpeg']}"
+    return f"{base_url}/{path}"
 
 
 def convert_case_spec_for_frontend(case_spec_data: dict, base_url: str):
@@ -33,38 +52,117 @@ def convert_case_spec_for_frontend(case_spec_data: dict, base_url: str):
         # Collect parts & reference images
         parts = []
         refs = []
+        ref_variants = []
         for sub in subcomponents:
             if sub["component"] == comp_name:
                 parts.append(sub["name"])
-                refs.append(f"{base_url}/{sub['referenceImage']}")
+                refs.append(_display_url(sub["referenceImage"], sub.get("referenceImageVariants"), base_url))
+                ref_variants.append(_variant_urls(sub.get("referenceImageVariants"), base_url))
+
+        if comp.get("mainImage"):
+            image, image_variants = comp["mainImage"], comp.get("mainImageVariants")
+        else:
+            image, image_variants = case_spec_data["mainImagePath"], case_spec_data.get("mainImageVariants")
 
         grouped_configs[comp_type][comp_name] = {
             "name": comp_name,
-            "image": f"{base_url}/{comp.get('mainImage', case_spec_data['mainImagePath'])}",
+            "image": _display_url(image, image_variants, base_url),
+            "imageVariants": _variant_urls(image_variants, base_url),
+            "originalImage": f"{base_url}/{image}",
             "parts": parts,
-            "referenceImages": [f"{img}" for img in refs]
+            "referenceImages": [f"{img}" for img in refs],
+            "referenceImageVariants": ref_variants,
+            "originalReferenceImages": [f"{base_url}/{sub['referenceImage']}" for sub in subcomponents if sub["component"] == comp_name]
         }
 
     return grouped_configs
 
+def _build_templates(case_code: str, case_data: dict):
+    payload = {
+        "status": "success",
+        "caseSpec": case_code,
+        "modelName": case_data["modelName"],
+        "variantName": case_data["variantName"],
+        "mainImagePath": _display_url(case_data["mainImagePath"], case_data.get("mainImageVariants"), BASE_URL_TOKEN),
+        "mainImageVariants": _variant_urls(case_data.get("mainImageVariants"), BASE_URL_TOKEN),
+        "frontendConfig": convert_case_spec_for_frontend(case_data, BASE_URL_TOKEN),
+    }
+    lite = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    payload["fullData"] = case_data  # Full raw JSON for debugging or backend use
+    full = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {"full": full, "lite": lite}
+
+
+# case_code -> {"full": bytes, "lite": bytes}
+kspec_registry.register_derived("case_spec_payloads", _build_templates)
+
+
+def _render(case_code: str, base_url: str, lite: bool):
+    snap = kspec_registry.snapshot()
+    key = (snap.version, case_code, base_url, lite)
+    cached = _rendered.get(key)
+    if cached:
+        return cached
+
+    template = snap.derived["case_spec_payloads"].get(case_code)
+    if template is None:
+        return None
+    body = template["lite" if lite else "full"].replace(BASE_URL_TOKEN.encode(), base_url.encode())
+    etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+    rendered = (etag, body, gzip.compress(body, compresslevel=6))
+    if len(_rendered) > 1024:  # bound per-host variants and stale versions
+        _rendered.clear()
+    _rendered[key] = rendered
+    return rendered
+
+
+def _etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def _accepts_gzip(accept_encoding: str):
+    """Accept-Encoding allows gzip: listed (or "*") with a q-value above 0."""
+    qualities = {}
+    for item in (accept_encoding or "").lower().split(","):
+        coding, *params = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            qualities[coding] = q
+    q = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return q > 0
+
+
 @router.get("/get_case_spec")
-async def get_case_spec(request: Request,case_code: str = Query(..., description="Case Specification Code, e.g., KB121")):
+async def get_case_spec(
+    request: Request,
+    case_code: str = Query(..., description="Case Specification Code, e.g., KB121"),
+    lite: bool = Query(False, description="Leave out fullData (raw KSpec)")
+):
     try:
         BASE_URL = f"http://{request.url.hostname}:8000"
-        case_data = CASE_SPECS_DB.get(case_code)
-        if not case_data:
+        rendered = _render(case_code, BASE_URL, lite)
+        if not rendered:
             return JSONResponse(content={"status": "not_found"}, status_code=404)
 
-        frontend_config = convert_case_spec_for_frontend(case_data, BASE_URL)
-
-        return JSONResponse(content={
-            "status": "success",
-            "caseSpec": case_code,
-            "modelName": case_data["modelName"],
-            "variantName": case_data["variantName"],
-            "mainImagePath": f"{BASE_URL}/{case_data['mainImagePath']}",
-            "frontendConfig": frontend_config,
-            "fullData": case_data  # Full raw JSON for debugging or backend use
-        })
+        etag, body, gzipped = rendered
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        if _accepts_gzip(request.headers.get("accept-encoding")):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=gzipped, media_type="application/json", headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
     except Exception as e:
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
+
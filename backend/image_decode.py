@@ -0,0 +1,185 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+from fastapi.responses import JSONResponse
+
+# ✅ Decoding of uploaded photos (process_component, verify_vin / verify_person, OCR).
+# The request body of those routes is bounded before it is received: UploadLimitMiddleware
+# answers 413 to a Content-Length over the limit and stops a streamed body once it goes
+# over (Starlette spools the whole multipart body before the route runs, so the route
+# itself cannot). Every upload is then checked against the byte and a pixel limit from
+# its header alone, before anything is decoded, so a decompression bomb or a 100 MP photo
+# is turned away with a 413 instead of allocating its full bitmap. JPEGs are then decoded straight at the
+# smallest DCT scale (1/2, 1/4, 1/8: IMREAD_REDUCED_COLOR_*) whose long side still
+# covers what the next stage looks at, several times cheaper in time and memory than
+# a full decode followed by a resize. The upload bytes themselves are never touched:
+# process_component archives them as the evidence photo.
+#
+#   KSPEC_MAX_UPLOAD_BYTES=41943040   KSPEC_MAX_UPLOAD_PIXELS=60000000
+MAX_UPLOAD_BYTES = int(os.getenv("KSPEC_MAX_UPLOAD_BYTES", str(40 * 1024 * 1024)))
+MAX_UPLOAD_PIXELS = int(os.getenv("KSPEC_MAX_UPLOAD_PIXELS", "60000000"))
+UPLOAD_PATHS = ("/process_component", "/verify_vin", "/verify_person")
+MULTIPART_OVERHEAD = 64 * 1024  # form fields and boundaries around the image
+REDUCED_DECODES = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class ImageRejected(Exception):
+    def __init__(self, message: str, reason: str, status_code: int):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = status_code
+
+
+def _too_many_bytes():
+    return ImageRejected(f"Image is larger than {MAX_UPLOAD_BYTES / (1024 * 1024):g} MB", "too_many_bytes", 413)
+
+
+def rejected_response(e: ImageRejected):
+    return JSONResponse({"status": "error", "message": str(e), "reason": e.reason}, status_code=e.status_code)
+
+
+def image_info(data: bytes):
+    """(format, width, height) from a JPEG / PNG header without decoding, or None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return "png", width, height
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # no length
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):  # start of frame
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return "jpeg", width, height
+        i += 2 + length
+    return None
+
+
+def image_size(data: bytes):
+    """(width, height) from a JPEG / PNG header, or None."""
+    info = image_info(data)
+    return info[1:] if info else None
+
+
+def check(data: bytes):
+    """(format, width, height) of an acceptable upload; raises ImageRejected otherwise."""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise _too_many_bytes()
+    info = image_info(data)
+    if info is None:
+        # Only formats we can size up before decoding: anything else could be a bomb
+        raise ImageRejected("Unsupported or corrupt image, send a JPEG or PNG", "unsupported_format", 415)
+    _, width, height = info
+    if width * height > MAX_UPLOAD_PIXELS:
+        raise ImageRejected(f"Image is {width}x{height}, more than {MAX_UPLOAD_PIXELS / 1e6:g} MP", "too_many_pixels", 413)
+    if not width or not height:
+        raise ImageRejected("Image has no pixels", "unsupported_format", 400)
+    return info
+
+
+async def read_upload(file):
+    """
+    Bytes of an uploaded image (UploadFile) within the limits; raises ImageRejected for
+    anything check() refuses. The file is already spooled by then: reading at most
+    MAX_UPLOAD_BYTES + 1 bounds memory, UploadLimitMiddleware bounds what is received.
+    """
+    from utils import tracing
+
+    data = await file.read(MAX_UPLOAD_BYTES + 1)
+    try:
+        check(data)
+    except ImageRejected as e:
+        tracing.event("upload_rejected", level="warning", reason=e.reason, upload_bytes=len(data), message=str(e))
+        raise
+    return data
+
+
+def reduction_for(width: int, height: int, min_side: int):
+    """Largest DCT scale factor whose decoded long side is still >= min_side (1 = full size)."""
+    longest = max(width, height)
+    for factor, _ in REDUCED_DECODES:
+        if -(-longest // factor) >= min_side:
+            return factor
+    return 1
+
+
+def decode(data: bytes, min_side: int = None):
+    """
+    BGR image of an upload with a long side of at least min_side where the original
+    allows it (None: full size). Returns (image, scale factor it was decoded at).
+    """
+    fmt, width, height = check(data)
+    factor, flag = 1, cv2.IMREAD_COLOR
+    if fmt == "jpeg" and min_side is not None:  # only JPEG decodes at a reduced scale natively
+        factor = reduction_for(width, height, min_side)
+        flag = dict(REDUCED_DECODES).get(factor, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        raise ImageRejected("Image could not be decoded", "corrupt", 400)
+    return img, factor
+
+
+class UploadLimitMiddleware:
+    """413 for an image upload route whose body is over MAX_UPLOAD_BYTES (+ form overhead)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in UPLOAD_PATHS:
+            return await self.app(scope, receive, send)
+        limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            return await self._reject(scope, receive, send, int(length))
+
+        # No (or a false) Content-Length: count the body as it streams in and stop it there.
+        # Form parsing turns the error into its own 400, which is answered with the 413.
+        received = 0
+        over = started = False
+
+        async def limited_receive():
+            nonlocal received, over
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    over = True
+                    raise _too_many_bytes()
+            return message
+
+        async def limited_send(message):
+            nonlocal started
+            if over:
+                if not started:
+                    started = True
+                    await self._reject(scope, receive, send, received)
+                return
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except ImageRejected:
+            if started:
+                raise
+            started = True
+            await self._reject(scope, receive, send, received)
+
+    async def _reject(self, scope, receive, send, upload_bytes: int):
+        from utils import tracing
+
+        e = _too_many_bytes()
+        tracing.event("upload_rejected", level="warning", reason=e.reason, upload_bytes=upload_bytes, message=str(e))
+        await rejected_response(e)(scope, receive, send)
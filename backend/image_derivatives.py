@@ -0,0 +1,159 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote, quote
+
+import cv2
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, Response
+
+router = APIRouter()
+
+# ✅ Resized JPEG/WebP derivatives of stored audit images, generated once and kept in
+# an on-disk LRU cache capped at DERIVATIVE_CACHE_MAX_MB.
+DERIVATIVE_CACHE_DIR = os.path.join("cache", "derivatives")
+DERIVATIVE_CACHE_MAX_BYTES = int(os.getenv("DERIVATIVE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+ALLOWED_ROOTS = ("results", "data")
+FORMATS = {"jpeg": (".jpg", "image/jpeg"), "webp": (".webp", "image/webp")}
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, max-age=60"
+
+_lock = threading.Lock()
+_lru = OrderedDict()  # cache file name -> size in bytes, oldest first
+_lru_bytes = 0
+
+
+def _load_cache_index():
+    global _lru_bytes
+    os.makedirs(DERIVATIVE_CACHE_DIR, exist_ok=True)
+    entries = []
+    for name in os.listdir(DERIVATIVE_CACHE_DIR):
+        if name.endswith(".tmp"):
+            continue
+        st = os.stat(os.path.join(DERIVATIVE_CACHE_DIR, name))
+        entries.append((st.st_mtime, name, st.st_size))
+    for _, name, size in sorted(entries):
+        _lru[name] = size
+        _lru_bytes += size
+
+
+def _touch(name: str):
+    """Mark as most recently used (mtime doubles as last-use time across restarts)."""
+    with _lock:
+        if name in _lru:
+            _lru.move_to_end(name)
+    try:
+        os.utime(os.path.join(DERIVATIVE_CACHE_DIR, name))
+    except OSError:
+        pass
+
+
+def _add(name: str, size: int):
+    global _lru_bytes
+    evicted = []
+    with _lock:
+        _lru_bytes += size - _lru.pop(name, 0)
+        _lru[name] = size
+        while _lru_bytes > DERIVATIVE_CACHE_MAX_BYTES and len(_lru) > 1:
+            old_name, old_size = _lru.popitem(last=False)
+            _lru_bytes -= old_size
+            evicted.append(old_name)
+    for old_name in evicted:
+        try:
+            os.remove(os.path.join(DERIVATIVE_CACHE_DIR, old_name))
+        except OSError:
+            pass
+
+
+def resolve_source(path: str):
+    """Accept a saved_image URL or a relative path; only files under results/ or data/ are served."""
+    rel_path = unquote(urlparse(path).path).lstrip("/")
+    rel_path = os.path.normpath(rel_path).replace("\\", "/")
+    if rel_path.startswith("..") or rel_path.split("/", 1)[0] not in ALLOWED_ROOTS:
+        return None
+    abs_path = os.path.realpath(rel_path)
+    root = os.path.realpath(rel_path.split("/", 1)[0])
+    if not abs_path.startswith(root + os.sep) or not os.path.isfile(abs_path):
+        return None
+    return rel_path
+
+
+def derivative_url(base_url: str, rel_path: str, width: int, fmt: str = "webp", quality: int = 80):
+    """Versioned derivative URL (v = source mtime) that may be cached as immutable."""
+    version = os.stat(rel_path).st_mtime_ns
+    return (f"{base_url}/image_derivative?path={quote(rel_path.replace(os.sep, '/'))}"
+            f"&width={width}&quality={quality}&format={fmt}&v={version}")
+
+
+def _build_derivative(src_path: str, dst_path: str, width: int, quality: int, fmt: str):
+    img = cv2.imread(src_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Source is not a readable image")
+
+    h, w = img.shape[:2]
+    if width < w:  # never upscale
+        img = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+    ext, _ = FORMATS[fmt]
+    params = [cv2.IMWRITE_WEBP_QUALITY, quality] if fmt == "webp" else [cv2.IMWRITE_JPEG_QUALITY, quality]
+    ok, buf = cv2.imencode(ext, img, params)
+    if not ok:
+        raise ValueError(f"Could not encode {fmt}")
+
+    tmp_path = f"{dst_path}.{threading.get_ident()}.tmp"
+    data = buf.tobytes()
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, dst_path)
+    return data
+
+
+@router.get("/image_derivative")
+def image_derivative(
+    request: Request,
+    path: str = Query(..., description="Image path under results/ or data/, or its saved_image URL"),
+    width: int = Query(480, ge=16, le=4096),
+    quality: int = Query(80, ge=10, le=100),
+    format: str = Query("webp", description="jpeg or webp"),
+    v: str = Query(None, description="Source version from derivative_url; enables immutable caching")
+):
+    try:
+        fmt = format.lower().replace("jpg", "jpeg")
+        if fmt not in FORMATS:
+            return JSONResponse({"status": "error", "message": "format must be jpeg or webp"}, status_code=400)
+
+        rel_path = resolve_source(path)
+        if not rel_path:
+            return JSONResponse({"status": "not_found", "message": "Image not found"}, status_code=404)
+
+        st = os.stat(rel_path)
+        key = hashlib.sha1(f"{rel_path}|{st.st_mtime_ns}|{st.st_size}|{width}|{quality}|{fmt}".encode()).hexdigest()
+        ext, media_type = FORMATS[fmt]
+        name = f"{key}{ext}"
+        etag = f'"{key}"'
+        cache_control = IMMUTABLE_CACHE if v == str(st.st_mtime_ns) else REVALIDATE_CACHE
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+
+        # Read the cached file in one go: another request may evict it at any moment,
+        # so a miss (or an eviction since the last request) just rebuilds it
+        dst_path = os.path.join(DERIVATIVE_CACHE_DIR, name)
+        try:
+            with open(dst_path, "rb") as f:
+                data = f.read()
+            _touch(name)
+        except FileNotFoundError:
+            data = _build_derivative(rel_path, dst_path, width, quality, fmt)
+            _add(name, len(data))
+
+        return Response(content=data, media_type=media_type, headers=headers)
+
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+_load_cache_index()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from utils import asset_store
+from utils import tracing
+
+# ✅ Screen-sized variants of every KSpec image, generated once at ingest:
+#   data/variants/<sha256>/<size>.<webp|jpg>
+# Keyed by the content hash of the source, so a variant URL never changes meaning and
+# can be served with immutable cache headers.
+VARIANTS_DIR = os.path.join("data", "variants")
+VARIANT_WIDTHS = {"thumb": 320, "screen": 1080}
+VARIANT_FORMATS = {
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, 80),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, 82),
+}
+MAX_WORKERS = min(8, os.cpu_count() or 2)
+
+# KSpec image field -> field that receives its variants
+VARIANT_FIELDS = {
+    "mainImagePath": "mainImageVariants",
+    "mainImage": "mainImageVariants",
+    "referenceImage": "referenceImageVariants",
+}
+
+
+def _content_key(image_path: str):
+    if asset_store.is_blob(image_path):
+        return os.path.splitext(os.path.basename(image_path))[0]
+    return asset_store.file_sha256(image_path)
+
+
+def variant_dir(sha256: str):
+    return os.path.join(VARIANTS_DIR, sha256)
+
+
+def generate_variants(image_path: str):
+    """Build (or reuse) every size/format of one image. Returns {size: {format: relative url}}."""
+    key = _content_key(image_path)
+    out_dir = variant_dir(key)
+    variants = {
+        size: {fmt: f"{out_dir}/{size}{ext}".replace("\\", "/") for fmt, (ext, _, _) in VARIANT_FORMATS.items()}
+        for size in VARIANT_WIDTHS
+    }
+    if all(os.path.exists(p) for sizes in variants.values() for p in sizes.values()):
+        return variants
+
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Not a readable image: {image_path}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    h, w = img.shape[:2]
+    for size, width in VARIANT_WIDTHS.items():
+        resized = img
+        if width < w:  # never upscale
+            resized = cv2.resize(img, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+        for fmt, (ext, quality_flag, quality) in VARIANT_FORMATS.items():
+            target = variants[size][fmt]
+            if os.path.exists(target):
+                continue
+            ok, buf = cv2.imencode(ext, resized, [quality_flag, quality])
+            if not ok:
+                raise ValueError(f"Could not encode {fmt} for {image_path}")
+            tmp_path = f"{target}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buf.tobytes())
+            os.replace(tmp_path, target)
+    return variants
+
+
+def _image_fields(kspec: dict):
+    for container, key, kind in asset_store.iter_asset_fields(kspec):
+        if kind == "image" and key in VARIANT_FIELDS:
+            yield container, key
+
+
+def attach_variants(kspec: dict):
+    """
+    Generate variants for all images of a KSpec in parallel and store them next to
+    each image field (mainImageVariants / referenceImageVariants). Returns the number
+    of distinct images processed; unreadable images are reported and skipped.
+    """
+    fields = [(c, k) for c, k in _image_fields(kspec) if os.path.isfile(c[k])]
+    unique_paths = sorted({c[k] for c, k in fields})
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {path: pool.submit(generate_variants, path) for path in unique_paths}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                tracing.event("image_variants_skipped", level="warning", source=path,
+                              error=f"{type(e).__name__}: {e}")
+
+    for container, key in fields:
+        if container[key] in results:
+            container[VARIANT_FIELDS[key]] = results[container[key]]
+    return len(results)
+
+
+def delete_variants(sha256: str):
+    """Called when the source blob is freed."""
+    path = variant_dir(sha256)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def backfill_kspecs():
+    """Generate variants for KSpecs ingested before variants existed."""
+    from utils import kspec_store
+
+    updated = 0
+    manifest = kspec_store.read_manifest()
+    for model_code in manifest:
+        kspec = kspec_store.load_kspec(model_code, manifest)
+        if attach_variants(kspec):
+            kspec_store.save_kspec(model_code, kspec)
+            updated += 1
+    return updated
+
+
+if __name__ == "__main__":
+    # python -m utils.image_variants  -> build variants for every stored KSpec
+    print(f"Variants attached to {backfill_kspecs()} KSpecs")
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import socket
+import struct
+import threading
+
+import numpy as np
+
+from utils import fair_queue
+
+# ✅ Client side of the local inference service (utils.inference_server).
+# INFERENCE_SERVER selects it: "unix:/run/kspec-inference.sock" or "127.0.0.1:8765".
+# Unset -> YOLO / OCR run in-process as before. One persistent connection per thread.
+INFERENCE_SERVER = os.getenv("INFERENCE_SERVER", "").strip()
+TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "60"))
+
+# Frame: 4-byte header length | JSON header | payload (header["payload_bytes"] long)
+_LEN = struct.Struct("!I")
+
+_local = threading.local()
+
+
+class InferenceError(RuntimeError):
+    pass
+
+
+def enabled():
+    return bool(INFERENCE_SERVER)
+
+
+def parse_address(address: str):
+    """Returns (family, address) for socket.connect / server bind."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _recv_exact(sock, n: int):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        read = sock.recv_into(view[got:], n - got)
+        if not read:
+            raise ConnectionError("Inference connection closed")
+        got += read
+    return bytes(buf)
+
+
+def send_frame(sock, header: dict, payload: bytes = b""):
+    header = {**header, "payload_bytes": len(payload)}
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(_LEN.pack(len(raw)) + raw)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_frame(sock):
+    (length,) = _LEN.unpack(_recv_exact(sock, _LEN.size))
+    header = json.loads(_recv_exact(sock, length))
+    payload = _recv_exact(sock, header["payload_bytes"]) if header.get("payload_bytes") else b""
+    return header, payload
+
+
+def _closed_by_peer(sock):
+    """True if a kept-alive connection can't be reused: the service closed it (restart)."""
+    sock.setblocking(False)
+    try:
+        sock.recv(1, socket.MSG_PEEK)  # b"" (closed) or unexpected bytes: either way unusable
+        return True
+    except BlockingIOError:
+        return False  # nothing to read: still open
+    except OSError:
+        return True
+    finally:
+        sock.settimeout(TIMEOUT_SECONDS)
+
+
+def _connection():
+    sock = getattr(_local, "sock", None)
+    if sock is not None and _closed_by_peer(sock):
+        _drop_connection()
+        sock = None
+    if sock is None:
+        family, address = parse_address(INFERENCE_SERVER)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(TIMEOUT_SECONDS)
+        sock.connect(address)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _local.sock = sock
+    return sock
+
+
+def _drop_connection():
+    sock = getattr(_local, "sock", None)
+    _local.sock = None
+    if sock is not None:
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+def _job_header():
+    # Priority class / station of the request this work is for, so the service's own line is fair too
+    job = fair_queue.current_job.get()
+    return {"priority": job[0], "station": job[1]} if job else {}
+
+
+def call(op: str, header: dict = None, payload: bytes = b""):
+    """
+    One request/response; reconnects once if the service restarted in between.
+    Only a failure before the request was fully sent is retried: once it is out the
+    service may already be running the job (a timeout, a crash mid-job), and sending
+    it again would run it twice.
+    """
+    for attempt in (1, 2):
+        sent = False
+        try:
+            sock = _connection()
+            send_frame(sock, {"op": op, **_job_header(), **(header or {})}, payload)
+            sent = True
+            response, data = recv_frame(sock)
+            break
+        except OSError:  # includes ConnectionError and socket timeouts
+            _drop_connection()
+            if sent or attempt == 2:
+                raise
+    if response.get("status") != "success":
+        raise InferenceError(response.get("message", f"Inference op {op} failed"))
+    return response, data
+
+
+def run_yolo_obb(model_path: str, img: np.ndarray):
+    img = np.ascontiguousarray(img)
+    response, _ = call("yolo", {"model_path": model_path, "shape": img.shape, "dtype": str(img.dtype)}, img.tobytes())
+    boxes = [np.asarray(b, dtype=np.float32) for b in response["boxes"]]
+    return response["detections"], boxes
+
+
+def run_ocr(image_bytes: bytes):
+    response, _ = call("ocr", payload=image_bytes)
+    return response["texts"]
+
+
+def stats():
+    response, _ = call("stats")
+    return response
+
+
+def wait_until_ready(timeout: float = 300.0):
+    """Block until the service answers and has finished its preload (used by /ready)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if stats().get("ready"):
+                return
+        except (ConnectionError, OSError, InferenceError):
+            _drop_connection()
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Inference service at {INFERENCE_SERVER} not ready after {timeout:.0f}s")
+        time.sleep(0.5)
@@ -0,0 +1,362 @@
+import os
+import time
+import socket
+import argparse
+import threading
+import socketserver
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils import engine_pool
+from utils import fair_queue
+from utils import inference_client
+from utils import ocr_utils
+from utils import runtime_profile
+from utils import yolo_utils
+
+# ✅ Standalone inference service: holds the YOLO models and PaddleOCR for any number of
+# stateless API workers (uvicorn --workers N, INFERENCE_SERVER pointing here), so they
+# share them instead of loading their own.
+#
+#   python -m utils.inference_server --socket /run/kspec-inference.sock
+#   python -m utils.inference_server --port 8765          (127.0.0.1 only)
+#
+# Each connection is served by its own thread. Jobs execute on an elastic pool of
+# --min-workers..--max-workers slots: the autoscaler adds a slot while jobs queue up
+# longer than GROW_AFTER_WAIT_S (queue depth x observed service time) and the host has
+# CPU headroom (below --cpu-high), and retires one once the pool hasn't been full for
+# --shrink-after seconds (gracefully: a busy slot retires when its job ends).
+# Engines are not thread-safe, so each job borrows a replica of its model / OCR from
+# utils.engine_pool; replicas idle for --idle-seconds are unloaded, except warm spares
+# for the hottest models, and a spare is loaded ahead of time when a hot model is busy.
+# Jobs waiting for a slot are ordered by utils.fair_queue with the priority class and
+# station the API worker sent along, so every worker's operators share it fairly. A job
+# is handed a slot together with a replica of its engine (or the room to load one): the
+# next job in that order whose engine is available goes first, and nobody holds a slot
+# or a replica while waiting for the other.
+# Threads per engine and the default --max-workers come from utils.runtime_profile.
+DEFAULT_MAX_WORKERS = os.cpu_count() or 2
+AUTOSCALE_INTERVAL = 1.0
+GROW_AFTER_WAIT_S = 0.25
+CPU_CRITICAL = 0.97  # above this, extra slots only thrash: shrink even with a queue
+SERVICE_EWMA_ALPHA = 0.2
+
+
+class _Slots:
+    """Resizable slots with a fair, engine-aware line; resize() never interrupts a running job."""
+
+    def __init__(self, size: int, pool: engine_pool.EnginePool):
+        self.size = size
+        self.free = size
+        self.retiring = 0      # slots to drop as soon as their jobs finish
+        self.service_s = None  # EWMA of how long a job holds a slot
+        self.lock = threading.Lock()
+        self.queue = fair_queue.FairQueue()
+        self.pool = pool
+
+    @contextmanager
+    def slot(self, header: dict, key: str):
+        """A slot and a checked-out replica of engine key for the job; yields the engine."""
+        with self.lock:
+            grant = self.pool.try_checkout(key) if self.free else None
+            if grant is not None:
+                self.free -= 1
+            else:
+                turn = [threading.Event(), key, None]  # granted: [2] = replica or engine_pool.LOAD
+                self.queue.push(turn, fair_queue.normalize_class(header.get("priority")), str(header.get("station", "")))
+                self.pool.waiting_for(key, 1)
+        if grant is None:
+            turn[0].wait()  # a finishing job hands its slot over, with a replica for key
+            grant = turn[2]
+        replica = None
+        started = time.perf_counter()
+        try:
+            replica = self.pool.load(key) if grant is engine_pool.LOAD else grant
+            yield replica.engine
+        finally:
+            if replica is not None:
+                self.pool.checkin(replica)
+            held = time.perf_counter() - started
+            with self.lock:
+                self.service_s = held if self.service_s is None else \
+                    SERVICE_EWMA_ALPHA * held + (1 - SERVICE_EWMA_ALPHA) * self.service_s
+                if self.retiring:
+                    self.retiring -= 1
+                else:
+                    self.free += 1
+                self._hand_over()
+
+    def _grant(self, turn):
+        turn[2] = self.pool.try_checkout(turn[1])
+        return turn[2] is not None
+
+    def _hand_over(self):
+        """Free slots to queued jobs, in fair order; jobs whose engine has no replica to
+        spare keep their place until the next hand-over (a job ending frees one)."""
+        while self.free:
+            job = self.queue.pop(self._grant)
+            if job is None:
+                return
+            self.free -= 1
+            self.pool.waiting_for(job[0][1], -1)
+            job[0][0].set()
+
+    def resize(self, size: int):
+        with self.lock:
+            delta, self.size = size - self.size, size
+            while delta > 0:
+                delta -= 1
+                if self.retiring:
+                    self.retiring -= 1  # cancel a pending retirement instead
+                else:
+                    self.free += 1
+            self._hand_over()
+            if delta < 0:
+                take = min(self.free, -delta)
+                self.free -= take
+                self.retiring += -delta - take
+
+    def running(self):
+        with self.lock:
+            return self.size + self.retiring - self.free
+
+    def queued(self):
+        with self.lock:
+            return {cls: self.queue.queued(cls=cls) for cls in self.queue.classes}
+
+    def queued_total(self):
+        with self.lock:
+            return len(self.queue)
+
+
+def _load_engine(key: str):
+    return ocr_utils.new_ocr() if key == "ocr" else yolo_utils.new_yolo_obb(key)
+
+
+_pool = engine_pool.EnginePool(_load_engine)
+_slots = _Slots(DEFAULT_MAX_WORKERS, _pool)
+_autoscaler = None
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {"count": 0, "errors": 0, "total_ms": 0.0})
+_ready = threading.Event()
+_started = time.time()
+
+
+class _Autoscaler(threading.Thread):
+    def __init__(self, min_workers: int, max_workers: int, cpu_high: float, shrink_after: float):
+        super().__init__(name="inference-autoscaler", daemon=True)
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.cpu_high = cpu_high
+        self.shrink_after = shrink_after
+        self.cpu = engine_pool.CpuMonitor()
+        self.cpu_busy = 0.0
+        self.last_full = time.monotonic()
+        self.events = deque(maxlen=20)
+        _pool.allow_growth = lambda key: self.cpu_busy < self.cpu_high
+
+    def _scale(self, size: int, reason: str):
+        old = _slots.size
+        _slots.resize(size)
+        self.events.append({"at": time.strftime("%H:%M:%S"), "from": old, "to": size, "reason": reason})
+        print(f"⚖️ Inference pool {old} -> {size} ({reason})")
+
+    def tick(self):
+        now = time.monotonic()
+        self.cpu_busy = self.cpu.busy()
+        size, queued = _slots.size, _slots.queued_total()
+        if _slots.running() >= size:
+            self.last_full = now
+        expected_wait = queued * (_slots.service_s or 0.0) / size
+
+        if queued and expected_wait > GROW_AFTER_WAIT_S and self.cpu_busy < self.cpu_high and size < self.max_workers:
+            self._scale(size + 1, f"{queued} queued, ~{expected_wait:.1f}s wait, cpu {self.cpu_busy:.0%}")
+        elif size > self.min_workers and self.cpu_busy > max(CPU_CRITICAL, self.cpu_high):
+            self._scale(size - 1, f"cpu {self.cpu_busy:.0%}, oversubscribed")
+        elif size > self.min_workers and now - self.last_full > self.shrink_after:
+            self._scale(size - 1, f"not full for {self.shrink_after:.0f}s")
+            self.last_full = now  # one step per shrink_after
+
+        if self.cpu_busy < self.cpu_high:
+            for key in _pool.spare_needed():
+                threading.Thread(target=_pool.preload, args=(key,), name="inference-spare", daemon=True).start()
+        _pool.reap()
+
+    def run(self):
+        while True:
+            time.sleep(AUTOSCALE_INTERVAL)
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"⚠️ Inference autoscaler: {e}")
+
+    def stats(self):
+        return {"min_workers": self.min_workers, "max_workers": self.max_workers, "cpu_high": self.cpu_high,
+                "cpu_busy": round(self.cpu_busy, 3), "events": list(self.events)}
+
+
+def _record(op: str, started: float, ok: bool, cls: str):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _stats_lock:
+        # per op, and per op and priority class ("ocr/interactive") for the class latencies
+        for key in (op, f"{op}/{cls}"):
+            entry = _stats[key]
+            entry["count"] += 1
+            entry["errors"] += 0 if ok else 1
+            entry["total_ms"] += elapsed_ms
+
+
+def _run_on_replica(header: dict, key: str, fn):
+    """fn(engine) on a replica of key, inside a slot (both granted together, see _Slots)."""
+    with _slots.slot(header, key) as engine:
+        return fn(engine)
+
+
+def _run_yolo(header: dict, payload: bytes):
+    img = np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+    detections, boxes = _run_on_replica(header, header["model_path"], lambda model: yolo_utils.predict_obb(model, img))
+    return {"detections": detections, "boxes": [b.tolist() for b in boxes]}
+
+
+def _run_ocr(header: dict, payload: bytes):
+    return {"texts": _run_on_replica(header, "ocr", lambda ocr: ocr_utils.ocr_image(ocr, payload))}
+
+
+def _stats_response(header: dict, payload: bytes):
+    with _stats_lock:
+        ops = {
+            op: {**s, "avg_ms": round(s["total_ms"] / s["count"], 1) if s["count"] else 0.0}
+            for op, s in _stats.items()
+        }
+    return {
+        "ready": _ready.is_set(),
+        "uptime_s": round(time.time() - _started),
+        "concurrency": _slots.size,
+        "running": _slots.running(),
+        "queued": _slots.queued(),
+        "service_ms": round(_slots.service_s * 1000, 1) if _slots.service_s is not None else None,
+        "autoscaler": _autoscaler.stats() if _autoscaler else None,
+        "engines": _pool.stats(),
+        "ops": ops,
+    }
+
+
+OPS = {"yolo": _run_yolo, "ocr": _run_ocr, "stats": _stats_response}
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        if sock.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                header, payload = inference_client.recv_frame(sock)
+            except (ConnectionError, OSError):
+                return  # client went away
+
+            op = header.get("op")
+            started = time.perf_counter()
+            try:
+                if op not in OPS:
+                    raise ValueError(f"Unknown op: {op}")
+                response = {"status": "success", **OPS[op](header, payload)}
+                ok = True
+            except Exception as e:
+                response = {"status": "error", "message": str(e)}
+                ok = False
+            if op != "stats":
+                _record(op, started, ok, fair_queue.normalize_class(header.get("priority")))
+            try:
+                inference_client.send_frame(sock, response)
+            except OSError:
+                return
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def preload(load_models: bool = True):
+    started = time.perf_counter()
+    _pool.preload("ocr")
+    models = 0
+    if load_models:
+        for path in yolo_utils.kspec_model_paths():
+            try:
+                models += _pool.preload(path)
+            except Exception as e:
+                print(f"⚠️ Could not preload {path}: {e}")
+    _ready.set()
+    print(f"✅ Inference service ready in {time.perf_counter() - started:.1f}s ({models} models, OCR loaded)")
+
+
+def serve(address: str, min_workers: int = 1, max_workers: int = DEFAULT_MAX_WORKERS, load_models: bool = True,
+          cpu_high: float = 0.85, shrink_after: float = 60.0, max_replicas: int = 2,
+          idle_seconds: float = engine_pool.DEFAULT_IDLE_SECONDS, hot_models: int = engine_pool.DEFAULT_HOT_ENGINES):
+    global _slots, _pool, _autoscaler
+    min_workers = max(1, min_workers)
+    max_workers = max(min_workers, max_workers)
+    _pool = engine_pool.EnginePool(_load_engine, max_replicas=max_replicas, idle_seconds=idle_seconds,
+                                   hot_engines=hot_models)
+    _slots = _Slots(min_workers, _pool)
+    _autoscaler = _Autoscaler(min_workers, max_workers, cpu_high, shrink_after)
+
+    family, bind_address = inference_client.parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind_address):
+            os.remove(bind_address)  # stale socket from a previous run
+        server = ThreadingUnixServer(bind_address, _Handler)
+    else:
+        server = ThreadingTCPServer(bind_address, _Handler)
+
+    # Accept connections right away; stats reports ready=False until preload is done
+    threading.Thread(target=preload, args=(load_models,), name="inference-preload", daemon=True).start()
+    _autoscaler.start()
+    print(f"🧠 Inference service listening on {address} ({min_workers}..{max_workers} workers)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.remove(bind_address)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared YOLO / OCR inference service for the API workers")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--socket", help="Unix socket path")
+    where.add_argument("--port", type=int, help="TCP port on 127.0.0.1")
+    parser.add_argument("--min-workers", type=int, default=1, help="jobs executing at once, lower bound")
+    parser.add_argument("--max-workers", type=int,
+                        help="upper bound (default: the runtime profile's pipelines, else cores)")
+    parser.add_argument("--cpu-high", type=float, default=0.85, help="no growth above this host CPU busy fraction")
+    parser.add_argument("--shrink-after", type=float, default=60.0, help="seconds the pool must be below full to shrink")
+    parser.add_argument("--max-replicas", type=int, default=2, help="loaded copies per model / OCR at most")
+    parser.add_argument("--idle-seconds", type=float, default=engine_pool.DEFAULT_IDLE_SECONDS,
+                        help="unload replicas idle this long (warm spares stay)")
+    parser.add_argument("--hot-models", type=int, default=engine_pool.DEFAULT_HOT_ENGINES,
+                        help="hottest models that keep a warm replica")
+    parser.add_argument("--no-preload-models", action="store_true", help="load KSpec models on first use only")
+    args = parser.parse_args()
+
+    runtime = runtime_profile.apply()
+    if args.max_workers is None:
+        args.max_workers = runtime["concurrency"] if runtime["source"] != "default" else DEFAULT_MAX_WORKERS
+    print(f"⚙️ Runtime: {runtime['threads']} thread(s) per engine ({runtime['source']})")
+
+    if os.getenv("KSPEC_STANDIN_ENGINES"):
+        from utils import standin_engines
+        standin_engines.install()
+
+    address = f"unix:{args.socket}" if args.socket else f"127.0.0.1:{args.port}"
+    serve(address, args.min_workers, args.max_workers, load_models=not args.no_preload_models,
+          cpu_high=args.cpu_high, shrink_after=args.shrink_after, max_replicas=args.max_replicas,
+          idle_seconds=args.idle_seconds, hot_models=args.hot_models)
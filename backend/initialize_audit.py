@@ -1,16 +1,16 @@
 import os
 import json
-import shutil
 import csv
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
 from datetime import datetime
 
+from utils import results_store
+from utils import audit_index
+
 router = APIRouter()
 
-RESULTS_DIR = "results"
 WHO_DATA_PATH = "data/WhoData.csv"
-os.makedirs(RESULTS_DIR, exist_ok=True)
 
 @router.post("/initialize_audit")
 async def initialize_audit(
@@ -25,22 +25,18 @@ async def initialize_audit(
     components: str = Form(...)  # JSON string of {interior:[], exterior:[], loose:[]}
 ):
     try:
-        # ✅ 1. Remove existing folders if they match VIN
-        for folder_name in os.listdir(RESULTS_DIR):
-            folder_path_check = os.path.join(RESULTS_DIR, folder_name)
-            if os.path.isdir(folder_path_check):
-                if folder_name.startswith(full_vin) and (' (Ongoing)' in folder_name or ' (Done)' in folder_name):
-                    print(f"Deleting existing folder: {folder_name}")
-                    shutil.rmtree(folder_path_check)
-
-        # ✅ 2. Create Results Folder
-        folder_name = f"{full_vin} (Ongoing)"
-        folder_path = os.path.join(RESULTS_DIR, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
-
-        # ✅ 3. Write InfoBeforeScan.txt
+        # ✅ 1 + 2. Start a new run for this VIN (its earlier runs are replaced) in an (Ongoing) folder
         comps = json.loads(components)
         current_time = datetime.now()
+        folder_path = results_store.create_audit_folder(
+            full_vin,
+            when=current_time,
+            person_pno=person_pno,
+            case_spec=case_spec,
+            variant=variant,
+        )
+
+        # ✅ 3. Write InfoBeforeScan.txt
         timestamp = current_time.strftime("%Y-%m-%d %H:%M:%S")
         day_name = current_time.strftime("%A")
 
@@ -68,6 +64,11 @@ async def initialize_audit(
         with open(info_path, "w", encoding="utf-8") as f:
             f.write("\n".join(lines))
 
+        audit_index.record_audit_started(
+            full_vin, short_vin, person_pno, person_name, case_spec, variant,
+            engine_number, timestamp, folder_path.replace(os.sep, "/")
+        )
+
         # ✅ 4. Update WhoData.csv
         updated = False
         rows = []
@@ -0,0 +1,162 @@
+import os
+import time
+import threading
+
+from utils import kspec_store
+
+# ✅ Single in-memory copy of the KSpecs shared by every route.
+# A watcher thread polls the KSpec manifest and, when it changes, builds a new immutable
+# snapshot off-thread; a writer calls refresh() to rebuild in its own thread right after
+# its write. Only KSpecs whose manifest rev changed are re-read and re-derived. The
+# snapshot is swapped in with one reference assignment, so readers never take a lock
+# and never see a half-built state.
+POLL_INTERVAL = float(os.getenv("KSPEC_POLL_SECONDS", "2"))
+
+
+class Snapshot:
+    __slots__ = ("specs", "manifest", "version", "mtime_ns", "loaded_at", "derived")
+
+    def __init__(self, specs: dict, manifest: dict, version: int, mtime_ns, derived: dict):
+        self.specs = specs
+        self.manifest = manifest
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.loaded_at = time.time()
+        self.derived = derived
+
+
+_snapshot = Snapshot({}, {}, 0, None, {})
+_builders = {}  # name -> fn(case_code, spec) -> derived value, kept per KSpec
+_build_lock = threading.Lock()
+_wakeup = threading.Event()
+_watcher = None
+
+
+def snapshot():
+    """Current snapshot. Treat specs/manifest/derived as read-only."""
+    return _snapshot
+
+
+def get_spec(case_code: str):
+    return _snapshot.specs.get(case_code)
+
+
+def all_specs():
+    return _snapshot.specs
+
+
+def manifest():
+    return _snapshot.manifest
+
+
+def version():
+    return _snapshot.version
+
+
+def get_derived(name: str):
+    return _snapshot.derived.get(name)
+
+
+def register_derived(name: str, build_one):
+    """
+    Precompute something per KSpec (e.g. frontend payloads) with every rebuild, so it
+    is swapped together with the spec it was built from. Only changed KSpecs are rebuilt.
+    """
+    global _snapshot
+    with _build_lock:
+        _builders[name] = build_one
+        current = _snapshot
+        if name not in current.derived:
+            # Published snapshots are never mutated: the new table goes into the next one
+            derived = {**current.derived, name: {code: build_one(code, spec) for code, spec in current.specs.items()}}
+            _snapshot = Snapshot(current.specs, current.manifest, current.version + 1, current.mtime_ns, derived)
+
+
+def _rebuild(force: bool = False):
+    global _snapshot
+    with _build_lock:
+        mtime = kspec_store.manifest_mtime()
+        current = _snapshot
+        if not force and current.version and mtime == current.mtime_ns:
+            return current
+
+        new_manifest = kspec_store.read_manifest()
+        specs, changed = {}, set()
+        for code, entry in new_manifest.items():
+            old_entry = current.manifest.get(code)
+            if old_entry and old_entry.get("rev") == entry.get("rev") and code in current.specs:
+                specs[code] = current.specs[code]
+            else:
+                specs[code] = kspec_store.load_kspec(code, new_manifest)
+                changed.add(code)
+
+        derived = {}
+        for name, build_one in _builders.items():
+            previous = current.derived.get(name, {})
+            derived[name] = {
+                code: previous[code] if code in previous and code not in changed else build_one(code, spec)
+                for code, spec in specs.items()
+            }
+
+        _snapshot = Snapshot(specs, new_manifest, current.version + 1, mtime, derived)
+        removed = len(current.specs.keys() - specs.keys())
+        print(f"KSpec registry v{_snapshot.version}: {len(specs)} KSpecs ({len(changed)} reloaded, {removed} removed)")
+        return _snapshot
+
+
+def refresh(wait: bool = True):
+    """
+    Pick up a write to the KSpec store. With wait=True the snapshot is rebuilt in the
+    calling thread, from a manifest read after the write, so the writer reads its own
+    change on return (blocking: call it from a worker thread, not the event loop).
+    With wait=False the watcher is just woken up.
+    """
+    if not wait:
+        _wakeup.set()
+        return _snapshot
+    return _rebuild(force=True)
+
+
+def _watch_loop():
+    while True:
+        forced = _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            _rebuild(force=forced)
+        except Exception:
+            # Keep serving the last good snapshot
+            import traceback
+            traceback.print_exc()
+
+
+def start_watcher():
+    global _watcher
+    if _watcher is None or not _watcher.is_alive():
+        _watcher = threading.Thread(target=_watch_loop, name="kspec-registry", daemon=True)
+        _watcher.start()
+
+
+def _before_fork():
+    _build_lock.acquire()  # never fork mid-rebuild
+
+
+def _after_fork_in_parent():
+    _build_lock.release()
+
+
+def _after_fork_in_child():
+    # The watcher thread does not survive fork; the child gets its own
+    global _build_lock, _wakeup, _watcher
+    _build_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _watcher = None
+    start_watcher()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork_in_child)
+
+kspec_store.ensure_store()
+_rebuild(force=True)
+start_watcher()
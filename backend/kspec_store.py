@@ -0,0 +1,156 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime
+
+from utils import file_lock
+
+# ✅ One JSON file per KSpec plus a small manifest used for listing and change detection:
+#   data/kspecs/<code>-<hash>.json  (code sanitised for the file system, hash of the raw code)
+#   data/kspecs/manifest.json  {code: {modelName, variantName, file, rev, updated}}
+# Uploads and deletes only touch the affected KSpec file and the manifest.
+KSPECS_DIR = "data/kspecs"
+MANIFEST_FILE = os.path.join(KSPECS_DIR, "manifest.json")
+MANIFEST_LOCK_FILE = os.path.join(KSPECS_DIR, "manifest.lock")
+LEGACY_CASE_SPECS_FILE = "data/CaseSpecifications.json"
+
+_lock = threading.Lock()
+
+
+def _manifest_lock():
+    """Thread + cross-process lock for manifest read-modify-write."""
+    os.makedirs(KSPECS_DIR, exist_ok=True)
+    return file_lock.locked(MANIFEST_LOCK_FILE)
+
+
+def _atomic_write_json(path: str, obj, indent=None):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _file_name(model_code: str):
+    # Sanitising alone maps "A/B" and "A_B" (and "ab"/"AB" on Windows) to one file
+    digest = hashlib.sha1(model_code.encode("utf-8")).hexdigest()[:8]
+    return f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_code)}-{digest}.json"
+
+
+def read_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_mtime():
+    try:
+        return os.stat(MANIFEST_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_kspec(model_code: str, manifest: dict = None):
+    manifest = manifest if manifest is not None else read_manifest()
+    entry = manifest.get(model_code)
+    if not entry:
+        return None
+    with open(os.path.join(KSPECS_DIR, entry["file"]), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_kspec(manifest: dict, model_code: str, kspec: dict):
+    """Write the KSpec file and its manifest entry; returns the file it replaces, if any."""
+    file_name = _file_name(model_code)
+    _atomic_write_json(os.path.join(KSPECS_DIR, file_name), kspec, indent=2)
+    old_entry = manifest.get(model_code)
+
+    manifest[model_code] = {
+        "modelName": kspec.get("modelName", ""),
+        "variantName": kspec.get("variantName", "Unknown"),
+        "file": file_name,
+        "rev": time.time_ns(),  # unique per write, also across delete + re-upload
+        "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return old_entry["file"] if old_entry and old_entry["file"] != file_name else None
+
+
+def _remove_files(manifest: dict, names):
+    # Under the old naming scheme two codes could share a file: keep one still referenced
+    referenced = {entry["file"] for entry in manifest.values()}
+    for name in names:
+        if name and name not in referenced:
+            try:
+                os.remove(os.path.join(KSPECS_DIR, name))
+            except FileNotFoundError:
+                pass
+
+
+def save_kspec(model_code: str, kspec: dict):
+    """Write one KSpec atomically, then bump its manifest entry. Returns the manifest."""
+    with _lock, _manifest_lock():
+        manifest = read_manifest()
+        replaced = _write_kspec(manifest, model_code, kspec)
+        _atomic_write_json(MANIFEST_FILE, manifest)
+        _remove_files(manifest, [replaced])  # a file written under the old naming scheme
+        return manifest
+
+
+def delete_kspec(model_code: str):
+    """Drop a KSpec from the manifest, then remove its file. Returns False if unknown."""
+    with _lock, _manifest_lock():
+        manifest = read_manifest()
+        entry = manifest.pop(model_code, None)
+        if not entry:
+            return False
+        _atomic_write_json(MANIFEST_FILE, manifest)
+        try:
+            os.remove(os.path.join(KSPECS_DIR, entry["file"]))
+        except FileNotFoundError:
+            pass
+        return True
+
+
+def import_legacy(path: str = LEGACY_CASE_SPECS_FILE):
+    """Split a monolithic CaseSpecifications.json into per-KSpec files. Returns the count imported."""
+    if not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        specs = json.load(f)
+    with _lock, _manifest_lock():
+        manifest = read_manifest()
+        replaced = [_write_kspec(manifest, model_code, kspec) for model_code, kspec in specs.items()]
+        _atomic_write_json(MANIFEST_FILE, manifest)
+        _remove_files(manifest, replaced)
+    return len(specs)
+
+
+def ensure_store():
+    """First start on the sharded layout: import the legacy file once."""
+    if os.path.exists(MANIFEST_FILE):
+        return
+    os.makedirs(KSPECS_DIR, exist_ok=True)
+    imported = import_legacy()
+    if not imported:
+        _atomic_write_json(MANIFEST_FILE, {})
+    print(f"KSpec store initialized: {imported} KSpecs imported from {LEGACY_CASE_SPECS_FILE}")
+
+
+def _after_fork_in_child():
+    # A lock held by a parent thread at fork would stay held forever in the child
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+if __name__ == "__main__":
+    # python -m utils.kspec_store  -> (re)import data/CaseSpecifications.json
+    print(f"Imported {import_legacy()} KSpecs into {KSPECS_DIR}")
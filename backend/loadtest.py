@@ -0,0 +1,409 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import threading
+from collections import defaultdict
+
+# ✅ Tablet-fleet load test: N simulated tablets run the real audit flow
+#   verify_person -> verify_vin -> get_case_spec -> initialize_audit
+#   -> process_component (every part) -> finalize_audit
+# with think times between steps, then report throughput and p50/p95/p99 latency per
+# endpoint and per stage.
+#
+# Offline (stand-in YOLO / OCR in a throwaway sandbox, any Linux box):
+#   python -m utils.loadtest serve --dir /tmp/kspec-loadtest --port 8000 [--prefork 4]
+#   python -m utils.loadtest run --url http://127.0.0.1:8000 --tablets 20 --duration 300
+#
+# `run` also works against a real deployment, but the synthetic photos only pass
+# verify_person / verify_vin on a stand-in server; the flow carries on either way.
+LOADTEST_CASE_SPEC = "LT1"
+STAGES = ("verify_person", "verify_vin", "get_case_spec", "initialize_audit", "process_component", "finalize_audit")
+
+# (component, type, pipeline steps, parts); pipelines cover every step of process_component
+SANDBOX_COMPONENTS = [
+    ("Seat Belt", "Interior", ("ROI", "SIMPLE"), ["Buckle", "Webbing", "Anchor", "Retractor"]),
+    ("Dashboard", "Interior", ("DONT", "SIMPLE"), ["Cluster", "Vents", "Glovebox"]),
+    ("Airbag Label", "Interior", ("ROI", "BW", "OCR"), ["Label"]),
+    ("Front Bumper", "Exterior", ("ROI", "SIMPLE"), ["Grille", "Fog Lamp L", "Fog Lamp R"]),
+    ("Wheels", "Exterior", ("SIMPLE",), ["Front L", "Front R", "Rear L", "Rear R"]),
+    ("Toolkit", "Loose", ("SIMPLE",), ["Jack", "Wrench"]),
+]
+
+
+# ============================== #
+# ✅ SANDBOX SERVER
+# ============================== #
+def _pipeline(steps, component: str, yolo_work: int):
+    from utils import standin_engines
+
+    slug = component.lower().replace(" ", "_")
+    config = {
+        "YOLO_DONTDETECT": "SKIP", "YOLO_DONTDETECTANNOTATION": "SKIP",
+        "YOLO_ROIDETECT": "SKIP",
+        "YOLO_SIMPLEDETECT": "SKIP", "YOLO_SIMPLEDETECTANNOTATION": "SKIP",
+        "YOLO_CONVERTTOBW": "NO",
+        "OCR_DETECT": "SKIP", "OCR_DETECTANNOTATION": "SKIP",
+    }
+    if "DONT" in steps:
+        config["YOLO_DONTDETECT"] = standin_engines.write_model(f"data/models/{slug}_dont.pt", ["ok"], yolo_work)
+        config["YOLO_DONTDETECTANNOTATION"] = "damage"
+    if "ROI" in steps:
+        config["YOLO_ROIDETECT"] = standin_engines.write_model(f"data/models/{slug}_roi.pt", ["roi"], yolo_work)
+    if "BW" in steps:
+        config["YOLO_CONVERTTOBW"] = "YES"
+    if "SIMPLE" in steps:
+        config["YOLO_SIMPLEDETECT"] = standin_engines.write_model(f"data/models/{slug}_simple.pt", [slug], yolo_work)
+        config["YOLO_SIMPLEDETECTANNOTATION"] = slug
+    if "OCR" in steps:
+        config["OCR_DETECT"] = "PaddleOCR"
+        config["OCR_DETECTANNOTATION"] = "airbag"
+    return config
+
+
+def _vin(i: int):
+    # Must match verify_vin's r"\bS[A-Z0-9]{16}\b"; short VIN keeps a letter so pandas reads it as text
+    return f"SALLOADTESTL{i:05d}"
+
+
+def prepare_sandbox(root: str, vins: int = 2000, workers: int = 50, yolo_work: int = None):
+    """Write CSVs, a KSpec with stand-in models and reference images into root/data."""
+    import cv2
+    from utils import standin_engines, kspec_store
+
+    yolo_work = yolo_work or standin_engines.DEFAULT_YOLO_WORK
+    os.makedirs(os.path.join(root, "data", "images"), exist_ok=True)
+    os.chdir(root)
+
+    cv2.imwrite("data/images/main.jpg", standin_engines.synthetic_image(1280, 960, seed=1))
+    components, subcomponents = [], []
+    for index, (name, comp_type, steps, parts) in enumerate(SANDBOX_COMPONENTS):
+        image = f"data/images/component_{index}.jpg"
+        cv2.imwrite(image, standin_engines.synthetic_image(1280, 960, seed=10 + index))
+        components.append({
+            "name": name,
+            "type": comp_type,
+            "mainImage": image,
+            "pipelineConfig": _pipeline(steps, name, yolo_work),
+        })
+        subcomponents.extend({"component": name, "name": part, "referenceImage": image} for part in parts)
+
+    kspec = {
+        "modelName": "Load Test",
+        "variantName": "Stand-in",
+        "totalInterior": sum(1 for c in components if c["type"] == "Interior"),
+        "totalExterior": sum(1 for c in components if c["type"] == "Exterior"),
+        "totalLoose": sum(1 for c in components if c["type"] == "Loose"),
+        "mainImagePath": "data/images/main.jpg",
+        "components": components,
+        "subComponents": subcomponents,
+    }
+    kspec_store.save_kspec(LOADTEST_CASE_SPEC, kspec)
+
+    with open("data/VINSpecification.csv", "w", encoding="utf-8") as f:
+        f.write("VIN_NUMBER,CASE SPECIFICATION,ENGINE_NUMBER,FULL_VIN_NUMBER\n")
+        for i in range(vins):
+            f.write(f"{_vin(i)[-6:]},{LOADTEST_CASE_SPEC},ENG{i:05d},{_vin(i)}\n")
+    with open("data/CalLineWorkerSheet.csv", "w", encoding="utf-8") as f:
+        f.write("P.No,Name,Department\n")
+        for i in range(workers):
+            f.write(f"{100000 + i},Tablet Worker {i},Load Test\n")
+    if not os.path.exists("data/WhoData.csv"):
+        with open("data/WhoData.csv", "w", encoding="utf-8") as f:
+            f.write("FullVIN,ShortVIN,PNo,Name,Status,AuditDate\n")
+            f.write(f"{_vin(0)},{_vin(0)[-6:]},100000,Tablet Worker 0,Pending,-\n")
+    print(f"🧪 Sandbox ready in {root}: {len(components)} components, {len(subcomponents)} parts, {vins} VINs")
+
+
+def serve(args):
+    import uvicorn
+
+    backend_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, backend_root)
+    os.environ["KSPEC_STANDIN_ENGINES"] = "1"
+    prepare_sandbox(os.path.abspath(args.dir), vins=args.vins, yolo_work=args.yolo_work)
+
+    if args.prefork:
+        from utils import prefork
+        prefork.main(["--workers", str(args.prefork), "--host", args.host, "--port", str(args.port),
+                      "--log-level", "warning"])
+    else:
+        from app import app
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+# ============================== #
+# ✅ TABLET SIMULATION
+# ============================== #
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(list)  # endpoint -> [seconds]
+        self.stages = defaultdict(list)     # stage -> [seconds], request time only
+        self.errors = defaultdict(int)
+        self.busy = defaultdict(int)        # endpoint -> 503s answered with Retry-After
+        self.audits = 0
+        self.requests = 0
+        self.measuring = False
+
+    def request(self, endpoint: str, seconds: float, ok: bool):
+        with self.lock:
+            if not self.measuring:
+                return
+            self.requests += 1
+            self.endpoints[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def rejected(self, endpoint: str):
+        with self.lock:
+            if self.measuring:
+                self.busy[endpoint] += 1
+
+    def stage(self, stage: str, seconds: float):
+        with self.lock:
+            if self.measuring:
+                self.stages[stage].append(seconds)
+
+    def audit_done(self):
+        with self.lock:
+            if self.measuring:
+                self.audits += 1
+
+
+def percentile(sorted_values: list, pct: float):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def _summary(samples: list):
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 1) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(values[-1] * 1000, 1) if values else 0.0,
+    }
+
+
+class Tablet(threading.Thread):
+    def __init__(self, index: int, args, recorder: Recorder, vin_pool, stop: threading.Event):
+        super().__init__(name=f"tablet-{index}", daemon=True)
+        import requests
+        from utils import standin_engines
+
+        self.index = index
+        self.args = args
+        self.recorder = recorder
+        self.vin_pool = vin_pool
+        self.stop_event = stop
+        self.session = requests.Session()
+        self.session.headers["X-Station-ID"] = f"tablet-{index}"  # fair share per tablet (utils.fair_queue)
+        self.rng = random.Random(args.seed + index)
+        width, height = args.image_size
+        self.photo = standin_engines.synthetic_jpeg(width, height, seed=args.seed + index)
+        self.embed = standin_engines.embed_ocr_text
+        self.pno = str(100000 + index % args.workers)
+
+    def _think(self, mean: float):
+        if mean > 0:
+            self.stop_event.wait(self.rng.uniform(0.5 * mean, 1.5 * mean))
+
+    def _call(self, endpoint: str, method: str, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        body = {}
+        try:
+            for attempt in range(self.args.busy_retries + 1):
+                response = self.session.request(method, f"{self.args.url}/{endpoint}", timeout=self.args.timeout, **kwargs)
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                if response.status_code != 503 or "Retry-After" not in response.headers:
+                    break
+                # Admission control turned us away: back off as told, like the tablet app
+                self.recorder.rejected(endpoint)
+                if attempt < self.args.busy_retries:
+                    self.stop_event.wait(float(response.headers["Retry-After"]))
+            ok = response.status_code < 400 and body.get("status") != "error"
+        except Exception as e:
+            body = {"status": "error", "message": str(e)}
+        elapsed = time.perf_counter() - started
+        self.recorder.request(endpoint, elapsed, ok)
+        return body, elapsed
+
+    def run_audit(self, vin_number: int):
+        full_vin = _vin(vin_number)
+
+        person, t = self._call("verify_person", "POST", files={
+            "file": ("person.jpg", self.embed(self.photo, [f"P.No {self.pno}", "Ticket"]), "image/jpeg")})
+        self.recorder.stage("verify_person", t)
+        self._think(self.args.think)
+
+        vin, t = self._call("verify_vin", "POST", files={
+            "file": ("vin.jpg", self.embed(self.photo, [full_vin]), "image/jpeg")})
+        self.recorder.stage("verify_vin", t)
+        case_spec = vin.get("case_spec") or self.args.case_spec
+        self._think(self.args.think)
+
+        spec, t = self._call("get_case_spec", "GET", params={"case_code": case_spec, "lite": 1})
+        self.recorder.stage("get_case_spec", t)
+        config = spec.get("frontendConfig") or {}
+        components = {section: list(items) for section, items in config.items()}
+        self._think(self.args.think)
+
+        _, t = self._call("initialize_audit", "POST", data={
+            "full_vin": full_vin, "short_vin": full_vin[-6:], "case_spec": case_spec,
+            "variant": spec.get("variantName", ""), "engine_number": vin.get("engine_number", ""),
+            "person_name": person.get("name", "Load Test"), "person_pno": person.get("pno", self.pno),
+            "person_department": person.get("department", "Load Test"), "components": json.dumps(components)})
+        self.recorder.stage("initialize_audit", t)
+
+        counts = {"ok": 0, "notok": 0}
+        statuses = defaultdict(dict)
+        stage_time = 0.0
+        for section, items in config.items():
+            for comp_name, comp in items.items():
+                comp_ok = True
+                for part in comp.get("parts", []):
+                    if self.stop_event.is_set() and not self.args.finish_audits:
+                        return
+                    self._think(self.args.part_think)
+                    result, t = self._call("process_component", "POST", data={
+                        "case_spec": case_spec, "component": comp_name, "part_name": part, "full_vin": full_vin},
+                        files={"file": ("part.jpg", self.embed(self.photo, ["airbag"]), "image/jpeg")})
+                    stage_time += t
+                    verdict = result.get("verdict", "notok")
+                    counts["ok" if verdict == "ok" else "notok"] += 1
+                    comp_ok = comp_ok and verdict == "ok"
+                statuses[section][comp_name] = "ok" if comp_ok else "notok"
+        self.recorder.stage("process_component", stage_time)
+        self._think(self.args.think)
+
+        _, t = self._call("finalize_audit", "POST", data={
+            "full_vin": full_vin, "total_ok": counts["ok"], "total_notok": counts["notok"],
+            "total_pending": 0, "component_statuses": json.dumps(statuses)})
+        self.recorder.stage("finalize_audit", t)
+        self.recorder.audit_done()
+
+    def run(self):
+        # Stagger starts so tablets don't move in lockstep
+        self.stop_event.wait(self.rng.uniform(0, self.args.ramp_up))
+        audits = 0
+        while not self.stop_event.is_set() and (not self.args.audits or audits < self.args.audits):
+            self.run_audit(next(self.vin_pool))
+            audits += 1
+            self._think(self.args.think)
+
+
+def run(args):
+    recorder = Recorder()
+    stop = threading.Event()
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    class _VinPool:
+        def __next__(self):
+            with lock:
+                return next(counter) % args.vins
+
+    tablets = [Tablet(i, args, recorder, _VinPool(), stop) for i in range(args.tablets)]
+    print(f"📱 {args.tablets} tablets against {args.url} "
+          f"(think {args.think}s, part think {args.part_think}s, warm-up {args.warmup}s)")
+    for tablet in tablets:
+        tablet.start()
+
+    stop.wait(args.warmup)
+    with recorder.lock:
+        recorder.measuring = True
+    measure_start = time.perf_counter()
+    deadline = measure_start + args.duration if args.duration else None
+    while any(t.is_alive() for t in tablets):
+        if deadline and time.perf_counter() >= deadline:
+            stop.set()
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - measure_start
+
+    report = {
+        "url": args.url,
+        "tablets": args.tablets,
+        "elapsed_s": round(elapsed, 1),
+        "audits": recorder.audits,
+        "audits_per_min": round(recorder.audits / elapsed * 60, 2) if elapsed else 0.0,
+        "requests": recorder.requests,
+        "requests_per_s": round(recorder.requests / elapsed, 2) if elapsed else 0.0,
+        "errors": dict(recorder.errors),
+        "busy": dict(recorder.busy),
+        "endpoints": {name: _summary(v) for name, v in sorted(recorder.endpoints.items())},
+        "stages": {name: _summary(recorder.stages[name]) for name in STAGES if recorder.stages.get(name)},
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.json}")
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n=== {report['tablets']} tablets, {report['elapsed_s']}s measured ===")
+    print(f"Audits: {report['audits']} ({report['audits_per_min']}/min)   "
+          f"Requests: {report['requests']} ({report['requests_per_s']}/s)   Errors: {sum(report['errors'].values())}   "
+          f"Busy (503): {sum(report['busy'].values())}")
+    for title, rows in (("Endpoint", report["endpoints"]), ("Stage", report["stages"])):
+        print(f"\n{title:<20}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}   (ms)")
+        for name, s in rows.items():
+            print(f"{name:<20}{s['count']:>8}{s['mean_ms']:>10}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def _size(value: str):
+    width, _, height = value.lower().partition("x")
+    return int(width), int(height)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tablet-fleet load test for the audit backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = sub.add_parser("serve", help="run a sandbox backend with stand-in YOLO / OCR")
+    p_serve.add_argument("--dir", default="/tmp/kspec-loadtest")
+    p_serve.add_argument("--host", default="127.0.0.1")
+    p_serve.add_argument("--port", type=int, default=8000)
+    p_serve.add_argument("--prefork", type=int, default=0, help="serve with utils.prefork and N workers")
+    p_serve.add_argument("--vins", type=int, default=2000)
+    p_serve.add_argument("--yolo-work", type=int, default=None, help="cost of one stand-in inference")
+
+    p_run = sub.add_parser("run", help="simulate tablets against a running backend")
+    p_run.add_argument("--url", default="http://127.0.0.1:8000")
+    p_run.add_argument("--tablets", type=int, default=10)
+    p_run.add_argument("--duration", type=float, default=120.0, help="measured seconds (0 = until --audits done)")
+    p_run.add_argument("--audits", type=int, default=0, help="audits per tablet (0 = unlimited)")
+    p_run.add_argument("--warmup", type=float, default=10.0, help="seconds excluded from the stats")
+    p_run.add_argument("--ramp-up", type=float, default=5.0, help="tablet starts spread over this many seconds")
+    p_run.add_argument("--think", type=float, default=2.0, help="mean seconds between flow steps")
+    p_run.add_argument("--part-think", type=float, default=3.0, help="mean seconds between part photos")
+    p_run.add_argument("--finish-audits", action="store_true", help="let running audits finish after --duration")
+    p_run.add_argument("--image-size", type=_size, default=(1920, 1440))
+    p_run.add_argument("--case-spec", default=LOADTEST_CASE_SPEC, help="used when verify_vin finds nothing")
+    p_run.add_argument("--vins", type=int, default=2000, help="VIN pool size (match serve --vins)")
+    p_run.add_argument("--workers", type=int, default=50, help="worker P.No pool size")
+    p_run.add_argument("--timeout", type=float, default=60.0)
+    p_run.add_argument("--busy-retries", type=int, default=3, help="retries after a 503 with Retry-After")
+    p_run.add_argument("--seed", type=int, default=1)
+    p_run.add_argument("--json", help="also write the report to this file")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    else:
+        run(args)
@@ -1,6 +1,5 @@
 
 import os
-import pandas as pd
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -16,6 +15,7 @@ class VINSpec(BaseModel):
 @router.post("/upload_vin_spec")
 async def upload_vin(payload: VINSpec):
     try:
+        import pandas as pd  # lazy: keeps pandas off the startup path
         full_vin = payload.vin.strip()
         short_vin = full_vin[-6:].strip()
         engine_number = payload.engineNumber.strip()
@@ -42,6 +42,7 @@ async def upload_vin(payload: VINSpec):
 @router.get("/list_all_vins")
 async def list_all_vins():
     try:
+        import pandas as pd
         df = pd.read_csv(VIN_FILE)
         df = df.fillna("").astype(str)
         records = df.to_dict(orient="records")
@@ -52,6 +53,7 @@ async def list_all_vins():
 @router.delete("/remove_all_vins")
 async def remove_all_vins():
     try:
+        import pandas as pd
         if os.path.exists(VIN_FILE):
             # Overwrite with just the headers
             df = pd.DataFrame(columns=["VIN_NUMBER", "CASE SPECIFICATION", "ENGINE_NUMBER", "FULL_VIN_NUMBER"])
@@ -65,6 +67,7 @@ async def remove_all_vins():
 @router.delete("/remove_vin/{short_vin}")  # <- match frontend
 async def delete_vin(short_vin: str):
     try:
+        import pandas as pd
         if not os.path.exists(VIN_FILE):
             return JSONResponse({"status": "error", "message": "VIN file not found"}, status_code=404)
 
@@ -78,6 +81,7 @@ async def delete_vin(short_vin: str):
 @router.get("/vins")
 async def list_short_vins():
     try:
+        import pandas as pd
         if not os.path.exists(VIN_FILE):
             return JSONResponse({"vins": []})
         
@@ -1,5 +1,4 @@
 import os
-import pandas as pd
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
@@ -15,6 +14,7 @@ class Worker(BaseModel):
 @router.post("/upload_cal_worker")
 async def upload_worker(worker: Worker):
     try:
+        import pandas as pd  # lazy: keeps pandas off the startup path
         if os.path.exists(WORKER_FILE):
             df = pd.read_csv(WORKER_FILE)
 
@@ -49,6 +49,7 @@ async def upload_worker(worker: Worker):
 @router.get("/workers")
 async def get_all_workers():
     try:
+        import pandas as pd
         if not os.path.exists(WORKER_FILE):
             return JSONResponse({"workers": []})
 
@@ -67,6 +68,7 @@ async def get_all_workers():
 @router.delete("/remove_worker/{pno}")
 async def delete_worker(pno: str):
     try:
+        import pandas as pd
         if not os.path.exists(WORKER_FILE):
             return JSONResponse({"status": "error", "message": "Worker file not found"}, status_code=404)
 
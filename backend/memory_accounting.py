@@ -0,0 +1,235 @@
+import os
+import threading
+import contextvars
+import tracemalloc
+
+# ✅ Per-request memory accounting, for finding what pushes RSS up at shift peaks.
+# Every request gets a RequestMemory (set by routes.debug_memory's middleware): RSS at
+# the start, at every checkpoint(stage) the handler marks and at the end. With
+# tracemalloc on (KSPEC_TRACEMALLOC=<frames> at startup or POST /debug/memory/tracemalloc)
+# each stage also records the peak of Python + numpy allocations since the previous
+# checkpoint (cv2 images are numpy arrays, so decode / copy / warp buffers are counted).
+# tracemalloc has a single process-wide peak, so a stage's peak is only recorded when
+# its request had the process to itself from the stage's start to its end; a stage that
+# overlapped another request (KSPEC_INFERENCE_CONCURRENCY > 1, or a request arriving
+# meanwhile) reports traced_peak None instead of a figure mixed with someone else's.
+TRACEMALLOC_ENV = "KSPEC_TRACEMALLOC"
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_current = contextvars.ContextVar("request_memory", default=None)
+_lock = threading.Lock()
+_stats = {}  # endpoint -> aggregate, see _record
+_active = 0  # tracked requests in flight
+_begins = 0  # tracked requests started so far: a change means a stage was overlapped
+
+
+def current_rss():
+    """Resident set size of this process in bytes; cheap enough to call per stage."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        from utils import process_memory
+        return process_memory.rss()
+
+
+def high_water_rss():
+    """Peak RSS of this process since it started (VmHWM), or None."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# ============================== #
+# ✅ tracemalloc control
+# ============================== #
+def start_tracing(frames: int = 1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(max(1, frames))
+
+
+def stop_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def start_from_env():
+    frames = os.getenv(TRACEMALLOC_ENV)
+    if frames:
+        start_tracing(int(frames) if frames.isdigit() else 1)
+
+
+def tracing_state():
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    return {"tracing": True, "frames": tracemalloc.get_traceback_limit(), "traced_bytes": current,
+            "traced_peak_bytes": peak, "overhead_bytes": tracemalloc.get_tracemalloc_memory()}
+
+
+def _stage_start():
+    """
+    (traced bytes, _begins) at the start of a stage that has the process to itself, with
+    the peak reset; None if another tracked request is running (or tracing is off).
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    with _lock:
+        if _active != 1:
+            return None  # resetting the peak now would corrupt the other request's stage
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return current, _begins
+
+
+def _stage_peak(start):
+    """Traced peak above the stage's start, or None if another request ran meanwhile."""
+    if start is None or not tracemalloc.is_tracing():
+        return None
+    with _lock:
+        if _begins != start[1]:
+            return None
+        _, peak = tracemalloc.get_traced_memory()
+    return max(0, peak - start[0])
+
+
+# ============================== #
+# ✅ Per-request tracking
+# ============================== #
+class RequestMemory:
+    def __init__(self):
+        self.rss_start = self._rss_last = self.rss_max = current_rss()
+        self._stage = _stage_start()
+        self.traced_start = self._stage[0] if self._stage else None
+        self.traced_peak = None
+        self.traced_exclusive = self._stage is not None  # every stage measured alone
+        self.stages = []  # [{"stage", "rss_delta", "traced_peak"}]
+
+    def checkpoint(self, stage: str):
+        rss = current_rss()
+        traced_peak = _stage_peak(self._stage)
+        entry = {"stage": stage, "rss_delta": rss - self._rss_last, "traced_peak": traced_peak}
+        self.stages.append(entry)
+        self.rss_max = max(self.rss_max, rss)
+        self._rss_last = rss
+        if traced_peak is None:
+            self.traced_exclusive = False
+        elif self.traced_start is not None:
+            self.traced_peak = max(self.traced_peak or 0, traced_peak + self._stage[0] - self.traced_start)
+        self._stage = _stage_start()
+        return entry
+
+    def finish(self):
+        self.checkpoint("response")
+        return {
+            "rss_start": self.rss_start,
+            "rss_end": self._rss_last,
+            "rss_growth": self.rss_max - self.rss_start,
+            # Only meaningful if no stage was shared with another request
+            "traced_peak": self.traced_peak if self.traced_exclusive else None,
+            "stages": self.stages,
+        }
+
+
+def begin():
+    """Start accounting for the current request; returns the token for end()."""
+    global _active, _begins
+    with _lock:
+        _active += 1
+        _begins += 1
+    return _current.set(RequestMemory())
+
+
+def end(token, endpoint: str = None):
+    """Finish the current request's accounting; recorded under endpoint unless it is None."""
+    global _active
+    request = _current.get()
+    _current.reset(token)
+    if request is None:
+        return None
+    result = request.finish()
+    with _lock:
+        _active -= 1
+    if endpoint:
+        _record(endpoint, result)
+    return result
+
+
+def checkpoint(stage: str):
+    """
+    Mark the end of a stage of the current request; returns its {"rss_delta", "traced_peak"}
+    (None outside a tracked request).
+    """
+    request = _current.get()
+    if request is not None:
+        return request.checkpoint(stage)
+    return None
+
+
+def _record(endpoint: str, result: dict):
+    with _lock:
+        stats = _stats.setdefault(endpoint, {"requests": 0, "rss_growth_total": 0, "rss_growth_max": 0,
+                                             "traced_peak_max": None, "stages": {}})
+        stats["requests"] += 1
+        stats["rss_growth_total"] += result["rss_growth"]
+        stats["rss_growth_max"] = max(stats["rss_growth_max"], result["rss_growth"])
+        if result["traced_peak"] is not None:
+            stats["traced_peak_max"] = max(stats["traced_peak_max"] or 0, result["traced_peak"])
+        stats["last"] = result
+        for s in result["stages"]:
+            stage = stats["stages"].setdefault(s["stage"], {"count": 0, "rss_delta_total": 0, "rss_delta_max": 0,
+                                                            "traced_peak_max": None})
+            stage["count"] += 1
+            stage["rss_delta_total"] += s["rss_delta"]
+            stage["rss_delta_max"] = max(stage["rss_delta_max"], s["rss_delta"])
+            if s["traced_peak"] is not None:
+                stage["traced_peak_max"] = max(stage["traced_peak_max"] or 0, s["traced_peak"])
+
+
+def report():
+    """Per-endpoint and per-stage memory figures of this process, bytes."""
+    with _lock:
+        endpoints = {}
+        for endpoint, stats in sorted(_stats.items()):
+            n = stats["requests"]
+            endpoints[endpoint] = {
+                "requests": n,
+                "rss_growth_avg": round(stats["rss_growth_total"] / n),
+                "rss_growth_max": stats["rss_growth_max"],
+                "traced_peak_max": stats["traced_peak_max"],
+                "stages": {name: {"count": s["count"],
+                                  "rss_delta_avg": round(s["rss_delta_total"] / s["count"]),
+                                  "rss_delta_max": s["rss_delta_max"],
+                                  "traced_peak_max": s["traced_peak_max"]}
+                           for name, s in stats["stages"].items()},
+                "last": stats["last"],
+            }
+    return {"rss": current_rss(), "rss_high_water": high_water_rss(), "tracemalloc": tracing_state(),
+            "endpoints": endpoints}
+
+
+def top_allocations(limit: int = 25, group_by: str = "lineno", compare_to=None):
+    """Top allocation sites of a fresh snapshot (optionally as growth since compare_to)."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    if compare_to is not None:
+        stats = snapshot.compare_to(compare_to, group_by)
+        rows = [{"site": _site(s.traceback), "size": s.size, "size_diff": s.size_diff,
+                 "count": s.count, "count_diff": s.count_diff} for s in stats[:limit]]
+    else:
+        stats = snapshot.statistics(group_by)
+        rows = [{"site": _site(s.traceback), "size": s.size, "count": s.count} for s in stats[:limit]]
+    return snapshot, rows
+
+
+def _site(traceback):
+    return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from utils import admission, capture_profile, memory_accounting, process_memory, runtime_profile, tracing
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Server process metrics: per-process and total memory (RSS / PSS), and per-endpoint /
+    per-stage request memory of the process answering (one worker under prefork).
+    """
+    return JSONResponse({
+        "status": "success",
+        "memory": process_memory.report(),
+        "request_memory": memory_accounting.report(),
+        "tracing": tracing.stats(),
+        "admission": admission.stats(),
+        "runtime_profile": runtime_profile.state(),
+        "capture": capture_profile.stats(),
+        "capture_roi": capture_profile.roi_stats(),
+    })
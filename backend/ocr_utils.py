@@ -1,26 +1,58 @@
-from paddleocr import PaddleOCR
+import threading
 import cv2
-import numpy as np
 
-# ✅ Initialize PaddleOCR globally (loaded only once)
-ocr = PaddleOCR(
-    use_angle_cls=False,
-    lang='en',
-    ocr_version='PP-OCRv3'
-)
+from utils import image_decode
+from utils import inference_client
+from utils import runtime_profile
+from utils import tracing
+
+# ✅ PaddleOCR is loaded once, on first use or by the startup warm-up (get_ocr),
+# so importing this module no longer blocks server startup. With INFERENCE_SERVER set,
+# run_ocr forwards to the shared inference service instead.
+OCR_MAX_SIDE = 960  # long side OCR runs at (utils.capture_profile asks the app for no more)
+_ocr = None
+_ocr_lock = threading.Lock()
+
+
+def new_ocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(
+        use_angle_cls=False,
+        lang='en',
+        ocr_version='PP-OCRv3',
+        cpu_threads=runtime_profile.threads(),  # its default (8) oversubscribes small boxes
+    )
+
+
+def get_ocr():
+    global _ocr
+    if _ocr is None:
+        with _ocr_lock:
+            if _ocr is None:
+                _ocr = new_ocr()
+    return _ocr
 
 def run_ocr(image_bytes: bytes):
     """
     Takes raw image bytes, runs OCR, and returns all detected texts (list of strings).
     """
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    remote = inference_client.enabled()
+    with tracing.span("ocr", remote=remote, image_bytes=len(image_bytes)) as span:
+        texts = inference_client.run_ocr(image_bytes) if remote else run_ocr_local(image_bytes)
+        span["attrs"]["texts"] = len(texts)
+    return texts
+
+def run_ocr_local(image_bytes: bytes):
+    return ocr_image(get_ocr(), image_bytes)
+
+def ocr_image(ocr, image_bytes: bytes):
+    """OCR with a given engine instance (the inference service runs several replicas)."""
+    img, _ = image_decode.decode(image_bytes, OCR_MAX_SIDE)  # DCT-scaled JPEG decode, still >= OCR_MAX_SIDE
 
     # ✅ Resize for faster inference (optional)
-    max_size = 960
     h, w = img.shape[:2]
-    if max(h, w) > max_size:
-        scale = max_size / max(h, w)
+    if max(h, w) > OCR_MAX_SIDE:
+        scale = OCR_MAX_SIDE / max(h, w)
         img = cv2.resize(img, (int(w * scale), int(h * scale)))
 
     results = ocr.predict(img)
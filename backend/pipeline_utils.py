@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+from fuzzywuzzy import fuzz
+
+# ✅ Image and text helpers of the component pipeline (routes.process_component), kept
+# out of the route module so utils (benchmarks, tooling) can use them without importing
+# a router.
+
+
+def crop_highest_conf_roi(img: np.ndarray, boxes: list, scale=(1.0, 1.0)):
+    """
+    Crop highest confidence rotated box ROI and return perspective-transformed ROI.
+    scale: (x, y) from the image the boxes were detected on to img.
+    """
+    if not boxes:
+        return img  # No cropping if no ROI
+
+    # Take first highest-conf box (already highest conf from YOLO ordering)
+    points = boxes[0].reshape(4, 2).astype(np.float32) * np.float32(scale)
+
+    # Order points for perspective transform
+    rect = np.zeros((4, 2), dtype="float32")
+    s = points.sum(axis=1)
+    rect[0] = points[np.argmin(s)]      # top-left
+    rect[2] = points[np.argmax(s)]      # bottom-right
+    diff = np.diff(points, axis=1)
+    rect[1] = points[np.argmin(diff)]   # top-right
+    rect[3] = points[np.argmax(diff)]   # bottom-left
+
+    (tl, tr, br, bl) = rect
+    widthA = np.linalg.norm(br - bl)
+    widthB = np.linalg.norm(tr - tl)
+    heightA = np.linalg.norm(tr - br)
+    heightB = np.linalg.norm(tl - bl)
+    maxWidth = int(max(widthA, widthB))
+    maxHeight = int(max(heightA, heightB))
+
+    dst = np.array([
+        [0, 0],
+        [maxWidth - 1, 0],
+        [maxWidth - 1, maxHeight - 1],
+        [0, maxHeight - 1]
+    ], dtype="float32")
+
+    M = cv2.getPerspectiveTransform(rect, dst)
+    warped = cv2.warpPerspective(img, M, (maxWidth, maxHeight))
+    return warped
+
+
+def convert_to_bw(img: np.ndarray):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.merge([gray, gray, gray])  # keep 3 channels
+
+
+def parse_csv(val: str):
+    return [v.strip().lower() for v in val.split(",") if v.strip() and v.lower() != "skip"]
+
+
+def ocr_texts_match(required: list, texts: list):
+    """Every required annotation must fuzzily appear in at least one OCR text."""
+    return all(any(fuzz.partial_ratio(req, text) > 70 for text in texts) for req in required)
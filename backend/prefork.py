@@ -0,0 +1,163 @@
+import gc
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+
+# ✅ Preload-then-fork serving (Linux/macOS):
+#
+#   python -m utils.prefork --workers 4 --port 8000
+#
+# The master imports the app, loads PaddleOCR, every KSpec YOLO model and the lookup
+# tables, freezes the gc and forks N uvicorn workers that share one listening socket.
+# Model weights stay shared copy-on-write: gc.freeze() moves everything loaded so far
+# out of the collector's reach, so collections in the workers don't dirty those pages.
+# Each worker sizes its own OpenMP / torch / OpenCV thread pools from the host's runtime
+# profile (utils.runtime_profile), else to cores / workers.
+# A worker that dies is re-forked from the (still warm) master.
+# The master still runs background threads (KSpec watcher, report worker, trace writer),
+# so every module with a module-level lock or thread registers os.register_at_fork
+# hooks that give the child fresh locks (and wait for data-guarding ones to be free).
+RESPAWN_BACKOFF_SECONDS = 1.0
+
+
+def _preload(load_models: bool):
+    from utils import startup
+    from utils import inference_client
+
+    if not inference_client.enabled():
+        from utils import ocr_utils, yolo_utils
+        with startup.timed("prefork:ocr"):
+            ocr_utils.get_ocr()
+        if load_models:
+            with startup.timed("prefork:yolo_models"):
+                for path in yolo_utils.kspec_model_paths():
+                    try:
+                        yolo_utils.load_yolo_obb(path)
+                    except Exception as e:
+                        print(f"⚠️ Could not preload {path}: {e}")
+                print(f"🤖 Preloaded {len(yolo_utils.MODEL_CACHE)} YOLO models")
+
+    from routes.verify_vin import get_vin_map
+    from routes.verify_person import get_worker_df
+    with startup.timed("prefork:lookup_tables"):
+        get_vin_map()
+        get_worker_df()
+
+
+def _init_worker_runtime(threads: int):
+    """Thread pools are per process and don't survive fork: size them for this worker."""
+    import cv2
+    cv2.setNumThreads(threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def _run_worker(app, sock: socket.socket, args, threads: int):
+    import uvicorn
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+    _init_worker_runtime(threads)
+
+    config = uvicorn.Config(app, host=args.host, port=args.port, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(app, sock, args, threads: int):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock, args, threads)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"👷 Worker {pid} started")
+    return pid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preload models once, then fork API workers that share them")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-preload-models", action="store_true", help="load KSpec models on first use only")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        sys.exit("Prefork mode needs os.fork(); run uvicorn directly on this platform")
+
+    # Keep the collector off while the shared heap is built, then freeze it
+    gc.disable()
+    from utils import runtime_profile
+    threads = runtime_profile.apply(processes=args.workers)["threads"]
+    os.environ["KSPEC_PREFORK_MASTER"] = str(os.getpid())  # see utils.process_memory
+
+    started = time.perf_counter()
+    from utils import startup
+    with startup.timed("import app"):
+        from app import app
+    _preload(load_models=not args.no_preload_models)
+
+    from utils import report_worker
+    if not report_worker.wait_idle():
+        print("⚠️ Reports still pending at fork, they finish in the master")
+
+    startup.print_timeline()
+    print(f"✅ Master ready in {time.perf_counter() - started:.1f}s, forking {args.workers} workers "
+          f"({threads} threads each)")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    gc.collect()
+    gc.freeze()
+
+    workers = {}  # pid -> start time
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for _ in range(args.workers):
+        workers[_spawn(app, sock, args, threads)] = time.monotonic()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started_at = workers.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f"❌ Worker {pid} exited (status {status}), restarting")
+        if time.monotonic() - started_at < RESPAWN_BACKOFF_SECONDS:
+            time.sleep(RESPAWN_BACKOFF_SECONDS)  # don't spin on a worker that dies at startup
+        workers[_spawn(app, sock, args, threads)] = time.monotonic()
+
+    sock.close()
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,30 @@
 import os
 import cv2
-import numpy as np
-from fastapi import APIRouter, File, Form, UploadFile
+from fastapi import APIRouter, File, Form, Request, UploadFile
 from fastapi.responses import JSONResponse
-from ultralytics import YOLO
-from fuzzywuzzy import fuzz
-import json
 
 from utils.ocr_utils import run_ocr  # ✅ Your existing OCR utility
+from utils.yolo_utils import run_yolo_obb
+from utils.pipeline_utils import crop_highest_conf_roi, convert_to_bw, parse_csv, ocr_texts_match
+from utils import results_store
+from utils import kspec_registry
+from utils import tracing
+from utils import admission
+from utils import capture_profile
+from utils import image_decode
+from utils.audit_analytics import record_part_result
+from routes.image_derivatives import derivative_url
 
 router = APIRouter()
 
-# ✅ Load Case Specs DB
-with open("data/CaseSpecifications.json", "r") as f:
-    CASE_SPECS_DB = json.load(f)
-
 BASE_URL = "http://172.20.10.2:8000"
-RESULTS_DIR = "results"
-os.makedirs(RESULTS_DIR, exist_ok=True)
-
-MODEL_CACHE = {}
-
-# ============================== #
-# ✅ UTILS
-# ============================== #
-def load_yolo_obb(model_path: str):
-    if model_path not in MODEL_CACHE:
-        MODEL_CACHE[model_path] = YOLO(model_path)
-    return MODEL_CACHE[model_path]
-
-def run_yolo_obb(model_path: str, img: np.ndarray):
-    model = load_yolo_obb(model_path)
-    results = model.predict(img, verbose=False)
-    detections = []
-    boxes = []
-    for r in results:
-        names = r.names
-        for obb in r.obb:
-            cls_id = int(obb.cls[0].item())
-            conf = float(obb.conf[0].item())
-            detections.append({"class": names[cls_id].lower(), "confidence": conf})
-            boxes.append(obb.xyxyxyxy.cpu().numpy())  # 4-point rotated bbox
-    return detections, boxes
-
-def crop_highest_conf_roi(img: np.ndarray, boxes: list):
-    """
-    Crop highest confidence rotated box ROI and return perspective-transformed ROI.
-    """
-    if not boxes:
-        return img  # No cropping if no ROI
-
-    # Take first highest-conf box (already highest conf from YOLO ordering)
-    points = boxes[0].reshape(4, 2).astype(np.float32)
-
-    # Order points for perspective transform
-    rect = np.zeros((4, 2), dtype="float32")
-    s = points.sum(axis=1)
-    rect[0] = points[np.argmin(s)]      # top-left
-    rect[2] = points[np.argmax(s)]      # bottom-right
-    diff = np.diff(points, axis=1)
-    rect[1] = points[np.argmin(diff)]   # top-right
-    rect[3] = points[np.argmax(diff)]   # bottom-left
-
-    (tl, tr, br, bl) = rect
-    widthA = np.linalg.norm(br - bl)
-    widthB = np.linalg.norm(tr - tl)
-    heightA = np.linalg.norm(tr - br)
-    heightB = np.linalg.norm(tl - bl)
-    maxWidth = int(max(widthA, widthB))
-    maxHeight = int(max(heightA, heightB))
-
-    dst = np.array([
-        [0, 0],
-        [maxWidth - 1, 0],
-        [maxWidth - 1, maxHeight - 1],
-        [0, maxHeight - 1]
-    ], dtype="float32")
-
-    M = cv2.getPerspectiveTransform(rect, dst)
-    warped = cv2.warpPerspective(img, M, (maxWidth, maxHeight))
-    return warped
-
-def convert_to_bw(img: np.ndarray):
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    return cv2.merge([gray, gray, gray])  # keep 3 channels
-
-def parse_csv(val: str):
-    return [v.strip().lower() for v in val.split(",") if v.strip() and v.lower() != "skip"]
 
 # ============================== #
 # ✅ MAIN PIPELINE
 # ============================== #
 @router.post("/process_component")
 async def process_component(
+    request: Request,
     file: UploadFile = File(...),
     case_spec: str = Form(...),
     component: str = Form(...),
@@ -100,24 +32,53 @@ async def process_component(
     full_vin: str = Form(...)
 ):
     try:
-        # ✅ Load image
-        img_bytes = await file.read()
-        img_arr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(img_arr, cv2.IMREAD_COLOR)
-        
-        # ✅ Store original image copy for final saving
-        img_copy = img.copy()
+        img_bytes = await image_decode.read_upload(file)
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
+    capture_profile.record_upload(request.headers, "component", img_bytes, case_spec, component)
+    # ✅ The pipeline runs in the threadpool behind the inference gate (503 + Retry-After when saturated)
+    return await admission.run_inference(request, "audit", _process_component, img_bytes,
+                                         case_spec, component, part_name, full_vin)
+
 
+def _crop_roi_for_detect(img_bytes: bytes, img, scale: int, boxes: list, roi, pipeline: dict, needs: dict):
+    """
+    The ROI YOLO_SIMPLEDETECT sees, and the scale it was cropped at: when the reduced
+    decode left the crop smaller than the YOLO input, decode again at the scale that
+    covers it and crop the box, mapped to that decode's pixels, from there.
+    """
+    size = needs.get("yolo", 0)
+    if pipeline["YOLO_SIMPLEDETECT"] == "SKIP" or scale == 1 or max(roi.shape[:2]) >= size:
+        return roi, scale
+    min_side = -(-size * max(img.shape[:2]) // max(1, max(roi.shape[:2])))
+    larger, larger_scale = image_decode.decode(img_bytes, min_side)
+    if larger_scale >= scale:
+        return roi, scale
+    return crop_highest_conf_roi(larger, boxes, (larger.shape[1] / img.shape[1], larger.shape[0] / img.shape[0])), larger_scale
+
+
+def _process_component(img_bytes: bytes, case_spec: str, component: str, part_name: str, full_vin: str):
+    try:
         # ✅ Get pipeline config
+        case_data = kspec_registry.get_spec(case_spec)
+        if not case_data:
+            return JSONResponse({"status": "error", "message": f"Case spec {case_spec} not found"}, status_code=400)
         comp_config = next(
-            (c for c in CASE_SPECS_DB[case_spec]["components"] if c["name"] == component),
+            (c for c in case_data["components"] if c["name"] == component),
             None
         )
         if not comp_config:
             return JSONResponse({"status": "error", "message": "Component config not found"}, status_code=400)
 
         pipeline = comp_config["pipelineConfig"]
-        processed_img = img.copy()
+
+        # ✅ Load image, at the smallest JPEG scale the YOLO stages still see in full
+        # (the upload bytes are kept as they are for the saved evidence photo)
+        needs = capture_profile.pipeline_profile(pipeline)["needs"]
+        img, scale = image_decode.decode(img_bytes, needs.get("yolo", 0))
+        tracing.stage("decode", scale=scale, width=img.shape[1], height=img.shape[0])
+
+        processed_img = img
         verdict = "ok"
         debug_step = ""
         debug_info = {}
@@ -130,6 +91,7 @@ async def process_component(
             debug_info["dont_detected"] = detected_classes
             if any(cls in blocked for cls in detected_classes):
                 verdict, debug_step = "notok", "YOLO_DONTDETECT"
+            tracing.stage("yolo_dontdetect")
 
         # === YOLO_ROIDETECT ===
         if verdict == "ok" and pipeline["YOLO_ROIDETECT"] != "SKIP":
@@ -137,12 +99,17 @@ async def process_component(
             debug_info["roi_detected"] = [d["class"] for d in detections]
             if detections:
                 processed_img = crop_highest_conf_roi(processed_img, boxes)
+                capture_profile.record_roi(case_spec, component, pipeline, img.shape, processed_img.shape)
+                processed_img, roi_scale = _crop_roi_for_detect(img_bytes, img, scale, boxes, processed_img, pipeline, needs)
+                tracing.stage("yolo_roidetect", roi_scale=roi_scale, width=processed_img.shape[1], height=processed_img.shape[0])
             else:
                 verdict, debug_step = "notok", "YOLO_ROIDETECT"
+                tracing.stage("yolo_roidetect")
 
         # === YOLO_CONVERTTOBW ===
         if verdict == "ok" and pipeline["YOLO_CONVERTTOBW"] == "YES":
             processed_img = convert_to_bw(processed_img)
+            tracing.stage("convert_to_bw")
 
         # === YOLO_SIMPLEDETECT ===
         if verdict == "ok" and pipeline["YOLO_SIMPLEDETECT"] != "SKIP":
@@ -159,33 +126,54 @@ async def process_component(
                 # Normal behavior - check if all required classes are detected
                 if not all(req in detected_classes for req in required):
                     verdict, debug_step = "notok", "YOLO_SIMPLEDETECT"
+            tracing.stage("yolo_simpledetect")
 
         # === OCR_DETECT ===
         if verdict == "ok" and pipeline["OCR_DETECT"] != "SKIP":
             texts = [t.lower() for t in run_ocr(img_bytes)]
             required = parse_csv(pipeline["OCR_DETECTANNOTATION"])
             debug_info["ocr_texts"] = texts
-            matched = all(any(fuzz.partial_ratio(req, text) > 70 for text in texts) for req in required)
-            if not matched:
+            if not ocr_texts_match(required, texts):
                 verdict, debug_step = "notok", "OCR_DETECT"
+            tracing.stage("ocr")
 
         # ✅ Save Results (only original image with verdict-based naming)
-        save_dir = os.path.join(RESULTS_DIR, f"{full_vin} (Ongoing)", component)
+        save_dir = os.path.join(results_store.ensure_ongoing_folder(full_vin), component)
         os.makedirs(save_dir, exist_ok=True)
         safe_name = part_name.replace(" ", "_")
 
         result_path = os.path.join(save_dir, f"{verdict.upper()}-{safe_name}.jpg")
-        cv2.imwrite(result_path, img_copy)
+        if image_decode.image_info(img_bytes)[0] == "jpeg":
+            with open(result_path, "wb") as f:
+                f.write(img_bytes)  # the original upload, untouched
+        else:
+            cv2.imwrite(result_path, image_decode.decode(img_bytes)[0])
+        tracing.stage("save")
+
+        # ✅ Count outcome for /analytics
+        audit_entry = results_store.get_entry(full_vin) or {}
+        record_part_result(
+            case_spec,
+            case_data.get("modelName", ""),
+            case_data.get("variantName", ""),
+            component,
+            part_name,
+            audit_entry.get("person_pno", ""),
+            verdict,
+            full_vin=full_vin
+        )
 
         return JSONResponse({
             "status": "success",
             "verdict": verdict,
             "debug_step": debug_step,
             "debug_info": debug_info,
-            "saved_image": f"{BASE_URL}/{result_path.replace(os.sep, '/')}"
+            "saved_image": f"{BASE_URL}/{result_path.replace(os.sep, '/')}",
+            "thumbnail": derivative_url(BASE_URL, result_path, width=320)
         })
 
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        tracing.exception("process_component_failed", e, case_spec=case_spec, component=component, part_name=part_name)
         return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
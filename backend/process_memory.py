@@ -0,0 +1,89 @@
+import os
+
+# ✅ Memory of this server's processes, for /metrics.
+# RSS counts pages shared copy-on-write with the prefork master in every process, so
+# the sum of RSS overstates real usage; PSS splits shared pages between their users
+# and its sum is the actual footprint. Linux (/proc) only, elsewhere RSS via resource.
+PREFORK_MASTER_ENV = "KSPEC_PREFORK_MASTER"
+
+_SMAPS_FIELDS = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared_clean",
+                 "Shared_Dirty": "shared_dirty", "Private_Clean": "private_clean",
+                 "Private_Dirty": "private_dirty"}
+
+
+def _from_smaps_rollup(pid: int):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in _SMAPS_FIELDS:
+                values[_SMAPS_FIELDS[key]] = int(rest.split()[0]) * 1024
+    return values
+
+
+def _from_status(pid: int):
+    with open(f"/proc/{pid}/status", "r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return {"rss": int(line.split()[1]) * 1024}
+    return {}
+
+
+def memory(pid: int = None):
+    """{"rss": bytes, "pss": bytes, ...} for one process; only rss where smaps is unavailable."""
+    pid = pid or os.getpid()
+    for reader in (_from_smaps_rollup, _from_status):
+        try:
+            return reader(pid)
+        except (OSError, ValueError):
+            continue
+    if pid == os.getpid():
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"rss_peak": peak if sys.platform == "darwin" else peak * 1024}
+    return {}
+
+
+def rss(pid: int = None):
+    return memory(pid).get("rss", 0)
+
+
+def _children(parent_pid: int):
+    pids = []
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return pids
+    for name in entries:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "r") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # pid (comm) state ppid ... - comm may contain spaces, split after the last ')'
+        if int(stat.rsplit(")", 1)[1].split()[1]) == parent_pid:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def server_processes():
+    """[(role, pid)]: the prefork master and its workers, or just this process."""
+    master = os.getenv(PREFORK_MASTER_ENV)
+    if not master:
+        return [("server", os.getpid())]
+    master_pid = int(master)
+    return [("master", master_pid)] + [("worker", pid) for pid in _children(master_pid)]
+
+
+def report():
+    processes = []
+    totals = {"rss": 0, "pss": 0}
+    for role, pid in server_processes():
+        mem = memory(pid)
+        processes.append({"role": role, "pid": pid, "current": pid == os.getpid(), **mem})
+        for key in totals:
+            totals[key] += mem.get(key, 0)
+    return {"processes": processes, "total": totals}
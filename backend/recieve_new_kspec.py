@@ -1,18 +1,19 @@
 import os
 import json
-import shutil
 import uuid
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
 
+from utils import kspec_registry
+from utils import kspec_store
+from utils import asset_store
+from utils import image_variants
+from utils import tracing
+
 router = APIRouter()
 
 # Base paths
 BASE_DATA_DIR = "data"  # Relative to project root
-REFERENCE_DIR = os.path.join(BASE_DATA_DIR, "reference_images")
-MODELS_DIR = os.path.join(BASE_DATA_DIR, "models")
-MAIN_IMAGES_DIR = os.path.join(BASE_DATA_DIR, "main_images")
-CASE_SPECS_FILE = os.path.join(BASE_DATA_DIR, "CaseSpecifications.json")
 
 
 def to_relative_url(abs_path: str):
@@ -38,134 +39,107 @@ def _sub_key(sub: dict):
 
 
 @router.post("/recievenewkspec")
-async def recieve_new_kspec(kspec_metadata: str = Form(...)):
+def recieve_new_kspec(kspec_metadata: str = Form(...)):
+    # Plain def: hashing, blob copies, variant encoding and the registry rebuild all
+    # block, so the whole ingest runs in the threadpool, never on the event loop.
+    # Only the final store + refs step holds asset_store.ingest_lock (_commit_kspec).
     try:
-        kspec_data = json.loads(kspec_metadata)
-        model_code = kspec_data.get("modelCode", f"MODEL_{uuid.uuid4().hex[:6]}")
-
-        # === Ensure folders exist ===
-        os.makedirs(REFERENCE_DIR, exist_ok=True)
-        os.makedirs(MODELS_DIR, exist_ok=True)
-        os.makedirs(MAIN_IMAGES_DIR, exist_ok=True)
-
-        # === Copy Main Image ===
-        if kspec_data.get("mainImagePath") and os.path.exists(kspec_data["mainImagePath"]):
-            target_dir = os.path.join(MAIN_IMAGES_DIR, model_code)
-            os.makedirs(target_dir, exist_ok=True)
-
-            source_path = kspec_data["mainImagePath"]
-            file_ext = os.path.splitext(source_path)[1]
-            new_filename = f"car_main{file_ext}"
-            target_path = os.path.join(target_dir, new_filename)
-
-            print(f"📸 Copying main image: {source_path} → {target_path}")
-            shutil.copy2(source_path, target_path)
-            kspec_data["mainImagePath"] = to_relative_url(target_path)
-            print(f"📸 Main image URL: {kspec_data['mainImagePath']}")
+        return _ingest_kspec(kspec_metadata)
+    except Exception as e:
+        tracing.exception("kspec_ingest_failed", e)
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+
+
+def _store_asset(source_path: str, kind: str, sources: dict):
+    """
+    Hash an asset into the content-addressed store; identical files across variants share one blob.
+    sources: blob -> the file it was stored from, to store it again if it is freed before _commit_kspec.
+    """
+    if asset_store.is_blob(source_path):
+        url = source_path  # already uploaded via /assets/upload
+    else:
+        url = to_relative_url(asset_store.put_file(source_path))
+        sources[url] = source_path
+    tracing.event("asset_stored", kind=kind, source=source_path, url=url)
+    return url
+
+
+def _asset_missing(kind: str, path):
+    tracing.event("asset_missing", level="warning", kind=kind, source=path)
+
+
+def _commit_kspec(model_code: str, kspec_entry: dict, sources: dict):
+    """
+    Save the KSpec and point its refs at its blobs, under ingest_lock. A delete or GC
+    that ran while the ingest hashed and encoded may have freed a blob it reuses: that
+    one is stored again from its source (with its variants), or the ingest fails.
+    """
+    with asset_store.ingest_lock():
+        missing = asset_store.missing_blobs(kspec_entry)
+        for blob in missing:
+            source = sources.get(blob)
+            if not source or not os.path.exists(source) or to_relative_url(asset_store.put_file(source)) != blob:
+                raise RuntimeError(f"Asset {blob} was deleted during the upload, upload the KSpec again")
+            tracing.event("asset_restored", source=source, url=blob)
+        if missing:
+            image_variants.attach_variants(kspec_entry)
+        manifest = kspec_store.save_kspec(model_code, kspec_entry)
+        freed = asset_store.set_refs(model_code, kspec_entry)
+    return manifest, freed
+
+
+def _ingest_kspec(kspec_metadata: str):
+    kspec_data = json.loads(kspec_metadata)
+    model_code = kspec_data.get("modelCode", f"MODEL_{uuid.uuid4().hex[:6]}")
+    sources = {}
+
+    # === Store Main Image ===
+    if kspec_data.get("mainImagePath") and os.path.exists(kspec_data["mainImagePath"]):
+        kspec_data["mainImagePath"] = _store_asset(kspec_data["mainImagePath"], "main_image", sources)
+    else:
+        _asset_missing("main_image", kspec_data.get("mainImagePath"))
+
+    # === Handle Components ===
+    all_subcomponents = []
+
+    components = kspec_data.get("components", [])
+    # count nested subcomponents
+    nested_count = sum(len(c.get("subComponents", [])) for c in components)
+    # root-level list from payload
+    root_subcomponents = kspec_data.get("subComponents", [])
+
+    # 🔒 If any nested subs exist, ignore the root list to prevent double counting
+    if nested_count > 0:
+        root_subcomponents = []
+
+    seen = set()  # for de-duplication across all sources
+
+    for comp in components:
+        comp_name_raw = comp["name"]
+
+        # --- Store Component Main Image ---
+        if comp.get("mainImage") and os.path.exists(comp["mainImage"]):
+            comp["mainImage"] = _store_asset(comp["mainImage"], "component_image", sources)
         else:
-            print(f"⚠️ Main image not found or not specified: {kspec_data.get('mainImagePath')}")
-
-        # === Handle Components ===
-        all_subcomponents = []
-
-        components = kspec_data.get("components", [])
-        # count nested subcomponents
-        nested_count = sum(len(c.get("subComponents", [])) for c in components)
-        # root-level list from payload
-        root_subcomponents = kspec_data.get("subComponents", [])
-
-        # 🔒 If any nested subs exist, ignore the root list to prevent double counting
-        if nested_count > 0:
-            root_subcomponents = []
-
-        seen = set()  # for de-duplication across all sources
-
-        for comp in components:
-            comp_name_raw = comp["name"]
-            comp_dir_name = comp_name_raw.replace(" ", "")
-            ref_dir = os.path.join(REFERENCE_DIR, model_code, comp_dir_name)
-            model_dir = os.path.join(MODELS_DIR, model_code, comp_dir_name)
-            os.makedirs(ref_dir, exist_ok=True)
-            os.makedirs(model_dir, exist_ok=True)
-
-            # --- Copy Component Main Image ---
-            if comp.get("mainImage") and os.path.exists(comp["mainImage"]):
-                source_path = comp["mainImage"]
-                file_ext = os.path.splitext(source_path)[1]
-                new_filename = f"{comp_dir_name}_main{file_ext}"
-                target_path = os.path.join(ref_dir, new_filename)
-
-                print(f"🖼️ Copying component image: {source_path} → {target_path}")
-                shutil.copy2(source_path, target_path)
-                comp["mainImage"] = to_relative_url(target_path)
-                print(f"🖼️ Component image URL: {comp['mainImage']}")
-            else:
-                print(f"⚠️ Component main image not found: {comp.get('mainImage')}")
-
-            # --- Copy Model Files ---
-            pipeline = comp.get("pipelineConfig", {})
-            model_name_mapping = {
-                "YOLO_DONTDETECT": "dontdetect",
-                "YOLO_ROIDETECT": "roi_detect",
-                "YOLO_SIMPLEDETECT": "simple_detect",
-            }
-
-            for model_key in ["YOLO_DONTDETECT", "YOLO_ROIDETECT", "YOLO_SIMPLEDETECT"]:
-                model_path = pipeline.get(model_key)
-                if model_path and model_path != "SKIP" and os.path.exists(model_path):
-                    source_path = model_path
-                    file_ext = os.path.splitext(source_path)[1]
-                    model_type = model_name_mapping[model_key]
-                    new_filename = f"{comp_dir_name}_{model_type}{file_ext}"
-                    target_path = os.path.join(model_dir, new_filename)
-
-                    print(f"🤖 Copying model {model_key}: {source_path} → {target_path}")
-                    shutil.copy2(source_path, target_path)
-                    pipeline[model_key] = os.path.relpath(target_path).replace("\\", "/")
-                    print(f"🤖 Model path updated: {pipeline[model_key]}")
-                elif model_path and model_path != "SKIP":
-                    print(f"⚠️ Model file not found: {model_path}")
-
-            # --- Copy Subcomponents from individual components (if any) ---
-            for sub_idx, sub in enumerate(comp.get("subComponents", [])):
-                # ensure component field is set for consistent keys
-                sub.setdefault("component", comp_name_raw)
-
-                if sub.get("referenceImage") and os.path.exists(sub["referenceImage"]):
-                    source_path = sub["referenceImage"]
-                    file_ext = os.path.splitext(source_path)[1]
-                    sub_name_slug = sub.get("name", f"subcomp_{sub_idx}").replace(" ", "_").lower()
-                    new_filename = f"{comp_dir_name}_{sub_name_slug}{file_ext}"
-                    target_path = os.path.join(ref_dir, new_filename)
-
-                    print(f"📎 Copying reference image: {source_path} → {target_path}")
-                    shutil.copy2(source_path, target_path)
-                    sub["referenceImage"] = to_relative_url(target_path)
-                    print(f"📎 Reference image URL: {sub['referenceImage']}")
-
-                # dedupe guard
-                k = _sub_key(sub)
-                if k not in seen:
-                    seen.add(k)
-                    all_subcomponents.append(sub)
-
-        # --- Copy Subcomponents from root level (only if we didn't ignore them) ---
-        for sub_idx, sub in enumerate(root_subcomponents):
-            comp_dir_name = sub.get("component", "Unknown").replace(" ", "")
-            ref_dir = os.path.join(REFERENCE_DIR, model_code, comp_dir_name)
-            os.makedirs(ref_dir, exist_ok=True)
+            _asset_missing("component_image", comp.get("mainImage"))
 
-            if sub.get("referenceImage") and os.path.exists(sub["referenceImage"]):
-                source_path = sub["referenceImage"]
-                file_ext = os.path.splitext(source_path)[1]
-                sub_name_slug = sub.get("name", f"subcomp_{sub_idx}").replace(" ", "_").lower()
-                new_filename = f"{comp_dir_name}_{sub_name_slug}{file_ext}"
-                target_path = os.path.join(ref_dir, new_filename)
+        # --- Store Model Files ---
+        pipeline = comp.get("pipelineConfig", {})
+
+        for model_key in asset_store.MODEL_KEYS:
+            model_path = pipeline.get(model_key)
+            if model_path and model_path != "SKIP" and os.path.exists(model_path):
+                pipeline[model_key] = _store_asset(model_path, model_key, sources)
+            elif model_path and model_path != "SKIP":
+                _asset_missing(model_key, model_path)
 
-                print(f"📎 Copying root subcomponent reference image: {source_path} → {target_path}")
-                shutil.copy2(source_path, target_path)
-                sub["referenceImage"] = to_relative_url(target_path)
-                print(f"📎 Root subcomponent reference image URL: {sub['referenceImage']}")
+        # --- Copy Subcomponents from individual components (if any) ---
+        for sub_idx, sub in enumerate(comp.get("subComponents", [])):
+            # ensure component field is set for consistent keys
+            sub.setdefault("component", comp_name_raw)
+
+            if sub.get("referenceImage") and os.path.exists(sub["referenceImage"]):
+                sub["referenceImage"] = _store_asset(sub["referenceImage"], "reference_image", sources)
 
             # dedupe guard
             k = _sub_key(sub)
@@ -173,49 +147,56 @@ async def recieve_new_kspec(kspec_metadata: str = Form(...)):
                 seen.add(k)
                 all_subcomponents.append(sub)
 
-        # --- Rebuild each component's subComponents from deduped flat list (keeps counts in sync) ---
-        by_comp = {}
-        for s in all_subcomponents:
-            by_comp.setdefault(s.get("component"), []).append(s)
-
-        for c in components:
-            c_name = c["name"]
-            c["subComponents"] = by_comp.get(c_name, [])
-            c["totalSubComponents"] = len(c["subComponents"])
-
-        # === Load existing CaseSpecifications.json ===
-        if os.path.exists(CASE_SPECS_FILE):
-            with open(CASE_SPECS_FILE, "r", encoding="utf-8") as f:
-                case_specs = json.load(f)
-        else:
-            case_specs = {}
-
-        # === Append or Update Model ===
-        case_specs[model_code] = {
-            "modelName": kspec_data["modelName"],
-            "variantName": kspec_data["variantName"],
-            "totalInterior": kspec_data["totalInterior"],
-            "totalExterior": kspec_data["totalExterior"],
-            "totalLoose": kspec_data["totalLoose"],
-            "mainImagePath": kspec_data["mainImagePath"],
-            "components": components,                  # use synced components
-            "subComponents": all_subcomponents,        # deduped canonical flat list
-        }
-
-        # === Save back to CaseSpecifications.json ===
-        with open(CASE_SPECS_FILE, "w", encoding="utf-8") as f:
-            json.dump(case_specs, f, indent=2, ensure_ascii=False)
-
-        return JSONResponse({
-            "success": True,
-            "message": "KSpec uploaded and appended to CaseSpecifications.json successfully",
-            "model_code": model_code,
-            "components_count": len(components),
-            "total_models": len(case_specs),
-            "case_specs_file": CASE_SPECS_FILE.replace("\\", "/"),
-        })
-
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    # --- Copy Subcomponents from root level (only if we didn't ignore them) ---
+    for sub in root_subcomponents:
+        if sub.get("referenceImage") and os.path.exists(sub["referenceImage"]):
+            sub["referenceImage"] = _store_asset(sub["referenceImage"], "root_reference_image", sources)
+
+        # dedupe guard
+        k = _sub_key(sub)
+        if k not in seen:
+            seen.add(k)
+            all_subcomponents.append(sub)
+
+    # --- Rebuild each component's subComponents from deduped flat list (keeps counts in sync) ---
+    by_comp = {}
+    for s in all_subcomponents:
+        by_comp.setdefault(s.get("component"), []).append(s)
+
+    for c in components:
+        c_name = c["name"]
+        c["subComponents"] = by_comp.get(c_name, [])
+        c["totalSubComponents"] = len(c["subComponents"])
+
+    # === Append or Update Model (only this KSpec's file + the manifest are written) ===
+    kspec_entry = {
+        "modelName": kspec_data["modelName"],
+        "variantName": kspec_data["variantName"],
+        "totalInterior": kspec_data["totalInterior"],
+        "totalExterior": kspec_data["totalExterior"],
+        "totalLoose": kspec_data["totalLoose"],
+        "mainImagePath": kspec_data["mainImagePath"],
+        "components": components,                  # use synced components
+        "subComponents": all_subcomponents,        # deduped canonical flat list
+    }
+
+    # === Screen-sized WebP/JPEG variants of every image (parallel, reused by content hash) ===
+    with tracing.span("image_variants") as span:
+        variant_count = image_variants.attach_variants(kspec_entry)
+        span["attrs"]["images"] = variant_count
+
+    with tracing.span("save_kspec", model_code=model_code):
+        manifest, freed = _commit_kspec(model_code, kspec_entry, sources)
+        kspec_registry.refresh()
+
+    return JSONResponse({
+        "success": True,
+        "message": "KSpec uploaded and saved to the KSpec store successfully",
+        "model_code": model_code,
+        "components_count": len(components),
+        "total_models": len(manifest),
+        "case_specs_file": os.path.join(kspec_store.KSPECS_DIR, manifest[model_code]["file"]).replace("\\", "/"),
+        "assets_referenced": len(asset_store.kspec_blobs(kspec_entry)),
+        "assets_freed": len(freed),
+        "image_variants": variant_count,
+    })
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process serving only
+    fcntl = None
+
+from utils import results_store
+
+# ✅ FinalSummary.txt / FinalAuditReport.xlsx are built here, off the request path.
+# Report state lives in the results index ("report": queued/ready/error) so it
+# survives restarts; the job spec is kept in ReportJob.json until done. The entry
+# also names the process that builds it (report_owner): every process holds a lock
+# on results/report_owners/<owner>.lock for its lifetime, and at startup a process
+# only takes over reports whose owner no longer holds its lock, so several workers
+# starting together never build the same report twice.
+JOB_FILE = "ReportJob.json"
+SUMMARY_FILE = "FinalSummary.txt"
+EXCEL_FILE = "FinalAuditReport.xlsx"
+OWNERS_DIR = os.path.join(results_store.RESULTS_DIR, "report_owners")
+
+_jobs = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_running = None  # full_vin of the report this process is building
+_owner = None
+_owner_file = None
+
+
+def _owner_path(owner: str):
+    return os.path.join(OWNERS_DIR, f"{owner}.lock")
+
+
+def _owner_token():
+    """This process' owner name, locking its file on first use."""
+    global _owner, _owner_file
+    with _worker_lock:
+        if _owner is None:
+            os.makedirs(OWNERS_DIR, exist_ok=True)
+            owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            f = open(_owner_path(owner), "a+")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            _owner, _owner_file = owner, f
+        return _owner
+
+
+def _owner_alive(owner: str):
+    if owner == _owner:
+        return True
+    path = _owner_path(owner)
+    if fcntl is None or not os.path.exists(path):
+        return False
+    with open(path, "a+") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def submit_report(full_vin: str, done_folder: str, job: dict):
+    """Persist the job next to the audit, mark it queued and hand it to the worker."""
+    job = {**job, "full_vin": full_vin, "done_folder": done_folder}
+    with open(os.path.join(done_folder, JOB_FILE), "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False)
+    results_store.update_entry(full_vin, report="queued", report_owner=_owner_token(), report_error=None)
+    _ensure_worker()
+    _jobs.put(job)
+
+
+def get_report_status(full_vin: str):
+    entry = results_store.get_entry(full_vin)
+    if not entry:
+        return None
+
+    state = entry.get("report")
+    if state == "queued" and _running == full_vin:
+        state = "running"  # only known to the building process, not worth an index write
+    folder = results_store.get_audit_folder(full_vin)
+    if state is None and entry["state"] == "Done" and folder:
+        # Audits finalized before the worker existed wrote their reports inline
+        state = "ready" if os.path.exists(os.path.join(folder, EXCEL_FILE)) else "missing"
+
+    status = {"full_vin": full_vin, "report": state or "not_started"}
+    if state == "ready" and folder:
+        status["files"] = [
+            os.path.join(folder, name).replace(os.sep, "/") for name in (SUMMARY_FILE, EXCEL_FILE)
+        ]
+    if entry.get("report_error"):
+        status["error"] = entry["report_error"]
+    return status
+
+
+# ============================== #
+# ✅ REPORT BUILDERS
+# ============================== #
+def _write_summary(job: dict):
+    summary_lines = [
+        "Final Audit Summary",
+        "===================",
+        f"Audit Completed: {job['timestamp']}",
+        f"Day: {job['day_name']}",
+        "",
+        f"Full VIN: {job['full_vin']}",
+        f"Total OK: {job['total_ok']}",
+        f"Total NOT OK: {job['total_notok']}",
+        f"Total Pending: {job['total_pending']}",
+        f"Final Verdict: {job['final_verdict']}",
+        "",
+        "Detailed Component Status:",
+        "========================="
+    ]
+
+    for category, components in job["component_data"].items():
+        summary_lines.append(f"\n[{category.upper()}]")
+        for component_name, status in components.items():
+            summary_lines.append(f"  - {component_name}: {status.upper()}")
+
+    with open(os.path.join(job["done_folder"], SUMMARY_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(summary_lines))
+
+
+def _write_excel(job: dict):
+    # openpyxl is only needed by the worker, keep it off the import path of the routes
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+
+    header_font = Font(bold=True, size=12)
+    bold_font = Font(bold=True)
+    section_font = Font(bold=True, size=11)
+    center_align = Alignment(horizontal="center")
+
+    # Rows as (value, font, alignment) tuples so widths can be computed before streaming
+    rows = [[("Field", header_font, center_align), ("Value", header_font, center_align)]]
+    excel_data = [
+        ["Audit Completed", job["timestamp"]],
+        ["Day", job["day_name"]],
+        ["Full VIN", job["full_vin"]],
+        ["Person Name", job["person_name"]],
+        ["Person ID", job["person_pno"]],
+        ["Total OK", job["total_ok"]],
+        ["Total NOT OK", job["total_notok"]],
+        ["Total Pending", job["total_pending"]],
+        ["Final Verdict", job["final_verdict"]]
+    ]
+    for field, value in excel_data:
+        rows.append([(field, bold_font, None), (value, None, None)])
+
+    rows.append([])
+    rows.append([("Component Details", section_font, None)])
+    for category, components in job["component_data"].items():
+        rows.append([(f"[{category.upper()}]", bold_font, None)])
+        for component_name, status in components.items():
+            rows.append([(f"  {component_name}", None, None), (status.upper(), None, None)])
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Audit Summary")
+
+    # Column widths must be set before the first row is written in write-only mode
+    for col_idx, column_letter in enumerate(("A", "B")):
+        max_length = max(
+            (len(str(row[col_idx][0])) for row in rows if len(row) > col_idx),
+            default=0
+        )
+        ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
+
+    for row in rows:
+        cells = []
+        for value, font, alignment in row:
+            cell = WriteOnlyCell(ws, value=value)
+            if font:
+                cell.font = font
+            if alignment:
+                cell.alignment = alignment
+            cells.append(cell)
+        ws.append(cells)
+
+    wb.save(os.path.join(job["done_folder"], EXCEL_FILE))
+
+
+def _run_job(job: dict):
+    global _running
+    full_vin = job["full_vin"]
+    _running = full_vin
+    try:
+        _write_summary(job)
+        _write_excel(job)
+        job_path = os.path.join(job["done_folder"], JOB_FILE)
+        if os.path.exists(job_path):
+            os.remove(job_path)
+        results_store.update_entry(full_vin, report="ready")
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        results_store.update_entry(full_vin, report="error", report_error=str(e))
+    finally:
+        _running = None
+
+
+def _worker_loop():
+    while True:
+        job = _jobs.get()
+        try:
+            _run_job(job)
+        finally:
+            _jobs.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name="report-worker", daemon=True)
+            _worker.start()
+
+
+def resume_pending_reports():
+    """Re-queue reports left behind by a process that has stopped (queued or mid-build)."""
+    resumed = 0
+    for state in ("queued", "running"):  # "running" is only found in older indexes
+        for full_vin, entry in results_store.find_entries(report=state):
+            owner = entry.get("report_owner")
+            if owner and _owner_alive(owner):
+                continue
+            # Several processes may start at once: exactly one wins each report
+            if not results_store.claim_entry(full_vin, {"report": state, "report_owner": owner},
+                                             report="queued", report_owner=_owner_token()):
+                continue
+            folder = results_store.get_audit_folder(full_vin, state="Done")
+            job_path = os.path.join(folder, JOB_FILE) if folder else None
+            if not job_path or not os.path.exists(job_path):
+                results_store.update_entry(full_vin, report="error", report_error="Report job lost")
+                continue
+            with open(job_path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+            job["done_folder"] = folder
+            _ensure_worker()
+            _jobs.put(job)
+            resumed += 1
+    return resumed
+
+
+def wait_idle(timeout: float = 60.0):
+    """Block until every queued report is written. Returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    while _jobs.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.1)
+    return not _jobs.unfinished_tasks
+
+
+def _after_fork_in_child():
+    # Reports resumed at import belong to the parent (which keeps holding their owner
+    # lock); a forked child starts empty and takes its own owner name on first use
+    global _jobs, _worker, _worker_lock, _running, _owner, _owner_file
+    _jobs = queue.Queue()
+    _worker = None
+    _worker_lock = threading.Lock()
+    _running = None
+    if _owner_file is not None:
+        _owner_file.close()  # the parent's descriptor still holds the lock
+    _owner, _owner_file = None, None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+resume_pending_reports()
@@ -0,0 +1,395 @@
+import os
+import re
+import json
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils import file_lock
+
+# ✅ Results are sharded as results/<YYYY-MM-DD>/<VIN prefix>/<FULL_VIN> (Ongoing|Done)
+# and looked up through a persistent VIN -> folder index instead of listing results/.
+# The index is a snapshot (index.json) plus an append-only journal (index.journal, one
+# changed entry per line): a write appends one line, and every COMPACT_AFTER lines the
+# journal is folded into a new snapshot. Other processes replay just the new lines.
+# Starting a new audit of a VIN deletes its earlier runs, (Ongoing) and (Done), as
+# initialize_audit always has. KSPEC_KEEP_DONE_RUNS=1 keeps finished runs instead
+# (disk use then grows with every re-audit). Runs left on disk (kept, or beside a late
+# upload) are listed in the entry's previous_runs; a second finished run in the same
+# shard is numbered "<VIN> #2 (Done)".
+# The index is built from disk (and legacy flat folders moved) by load_index() from the
+# app lifespan, or by python -m utils.results_store; never as an import side effect.
+RESULTS_DIR = "results"
+INDEX_FILE = os.path.join(RESULTS_DIR, "index.json")
+JOURNAL_FILE = os.path.join(RESULTS_DIR, "index.journal")
+INDEX_LOCK_FILE = os.path.join(RESULTS_DIR, "index.lock")
+COMPACT_AFTER = 1000
+KEEP_DONE_RUNS = os.getenv("KSPEC_KEEP_DONE_RUNS") == "1"
+
+FOLDER_RE = re.compile(r"^(?P<vin>.+?)(?: #(?P<run>\d+))? \((?P<state>Ongoing|Done)\)$")
+DATE_DIR_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_lock = threading.Lock()
+_index = {}
+_index_signature = None  # (inode, mtime_ns) of the snapshot _index was loaded from
+_journal_offset = 0      # bytes of the journal already applied to _index
+_journal_records = 0
+
+
+def vin_prefix(full_vin: str):
+    """
+    Shard key for a VIN. The leading characters (WMI / model code) are the same for
+    every car on the line, so the first three characters of the serial (last 6) are used.
+    """
+    vin = full_vin.strip().upper()
+    return (vin[-6:-3] if len(vin) >= 6 else vin[:3]) or "_"
+
+
+def _shard_dir(full_vin: str, when: datetime):
+    return os.path.join(RESULTS_DIR, when.strftime("%Y-%m-%d"), vin_prefix(full_vin))
+
+
+def _to_rel(path: str):
+    return os.path.relpath(path, RESULTS_DIR).replace("\\", "/")
+
+
+def _to_abs(rel_path: str):
+    return os.path.join(RESULTS_DIR, *rel_path.split("/"))
+
+
+def _file_signature():
+    try:
+        st = os.stat(INDEX_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+def _replay_journal():
+    """Apply the journal lines written since the last call (by any process)."""
+    global _journal_offset, _journal_records
+    try:
+        with open(JOURNAL_FILE, "rb") as f:
+            f.seek(_journal_offset)
+            data = f.read()
+    except FileNotFoundError:
+        return
+    complete = data.rfind(b"\n") + 1  # a line still being appended waits for the next call
+    for line in data[:complete].splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record["entry"] is None:
+            _index.pop(record["vin"], None)
+        else:
+            _index[record["vin"]] = record["entry"]
+        _journal_records += 1
+    _journal_offset += complete
+
+
+def _reload_if_changed():
+    """Pick up index writes made by other worker processes."""
+    global _index, _index_signature, _journal_offset, _journal_records
+    signature = _file_signature()
+    if signature != _index_signature:
+        # New snapshot (compaction): start over from it and replay the whole journal
+        _index = {}
+        if signature is not None:
+            with open(INDEX_FILE, "r", encoding="utf-8") as f:
+                _index = json.load(f)
+        _index_signature = signature
+        _journal_offset = _journal_records = 0
+    _replay_journal()
+
+
+@contextmanager
+def _locked(write: bool = False):
+    # Writers also hold the cross-process lock and re-read the index inside it
+    with _lock:
+        if write:
+            with file_lock.locked(INDEX_LOCK_FILE):
+                _reload_if_changed()
+                yield
+        else:
+            _reload_if_changed()
+            yield
+
+
+def _save_index():
+    """Write the whole index as a new snapshot and empty the journal (under the write lock)."""
+    global _index_signature, _journal_offset, _journal_records
+    tmp_path = f"{INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_index, f, ensure_ascii=False)
+    os.replace(tmp_path, INDEX_FILE)
+    _index_signature = _file_signature()
+    # Readers that already see the new snapshot may replay the old lines once more:
+    # they only repeat changes the snapshot already holds
+    with open(JOURNAL_FILE, "wb"):
+        pass
+    _journal_offset = _journal_records = 0
+
+
+def _journal(full_vin: str):
+    """Persist one changed entry (under the write lock): O(1) instead of rewriting the index."""
+    global _journal_offset, _journal_records
+    line = json.dumps({"vin": full_vin, "entry": _index.get(full_vin)}, ensure_ascii=False).encode("utf-8") + b"\n"
+    fd = os.open(JOURNAL_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+    _journal_offset += len(line)
+    _journal_records += 1
+    if _journal_records >= COMPACT_AFTER:
+        _save_index()
+
+
+def get_entry(full_vin: str):
+    """Return a copy of the index entry for a VIN (path, state, started, ...) or None."""
+    with _locked():
+        entry = _index.get(full_vin)
+        return dict(entry) if entry else None
+
+
+def update_entry(full_vin: str, **fields):
+    """Merge extra fields into a VIN's index entry (e.g. report state). Returns False if unknown."""
+    with _locked(write=True):
+        entry = _index.get(full_vin)
+        if not entry:
+            return False
+        entry.update(fields)
+        _journal(full_vin)
+    return True
+
+
+def claim_entry(full_vin: str, expect: dict, **fields):
+    """
+    Compare-and-set: merge fields into a VIN's entry only if it still has the expected
+    values. Of several processes claiming the same entry exactly one gets True.
+    """
+    with _locked(write=True):
+        entry = _index.get(full_vin)
+        if not entry or any(entry.get(k) != v for k, v in expect.items()):
+            return False
+        entry.update(fields)
+        _journal(full_vin)
+    return True
+
+
+def find_entries(**fields):
+    """All (full_vin, entry) pairs whose entry matches the given field values."""
+    with _locked():
+        return [
+            (vin, dict(entry)) for vin, entry in _index.items()
+            if all(entry.get(k) == v for k, v in fields.items())
+        ]
+
+
+def get_audit_folder(full_vin: str, state: str = None):
+    """O(1) lookup of the audit folder for a VIN, optionally requiring a state ("Ongoing"/"Done")."""
+    with _locked():
+        entry = _index.get(full_vin)
+    if not entry or (state and entry["state"] != state):
+        return None
+    return _to_abs(entry["path"])
+
+
+def _run_name(full_vin: str, state: str, run: int):
+    return f"{full_vin} ({state})" if run <= 1 else f"{full_vin} #{run} ({state})"
+
+
+def create_audit_folder(full_vin: str, when: datetime = None, replace_existing: bool = True, **meta):
+    """
+    Start a fresh audit for a VIN in today's shard and record it in the index.
+    replace_existing deletes the VIN's earlier runs, (Ongoing) and (Done) (with
+    KEEP_DONE_RUNS only the unfinished one); runs left on disk go to previous_runs.
+    Extra keyword arguments (person_pno, case_spec, ...) are stored with the entry.
+    """
+    when = when or datetime.now()
+    with _locked(write=True):
+        old = _index.get(full_vin)
+        runs = (list(old.get("previous_runs", [])) + [old["path"]]) if old else []
+        previous = []
+        for rel_path in runs:
+            path = _to_abs(rel_path)
+            if not os.path.isdir(path):
+                continue
+            match = FOLDER_RE.match(os.path.basename(path))
+            finished = bool(match) and match.group("state") == "Done"
+            if replace_existing and not (finished and KEEP_DONE_RUNS):
+                print(f"Deleting existing folder: {path}")
+                shutil.rmtree(path)
+            else:
+                previous.append(rel_path)
+
+        folder_path = os.path.join(_shard_dir(full_vin, when), f"{full_vin} (Ongoing)")
+        os.makedirs(folder_path, exist_ok=True)
+        _index[full_vin] = {
+            "path": _to_rel(folder_path),
+            "state": "Ongoing",
+            "started": when.strftime("%Y-%m-%d %H:%M:%S"),
+            **({"previous_runs": previous} if previous else {}),
+            **meta,
+        }
+        _journal(full_vin)
+    return folder_path
+
+
+def ensure_ongoing_folder(full_vin: str):
+    """Folder for component uploads; creates and indexes one if the audit was never initialized."""
+    folder_path = get_audit_folder(full_vin, state="Ongoing")
+    if folder_path:
+        os.makedirs(folder_path, exist_ok=True)
+        return folder_path
+    # Never delete a finished audit because of a late upload; start a new run beside it
+    return create_audit_folder(full_vin, replace_existing=False)
+
+
+def mark_done(full_vin: str):
+    """Rename (Ongoing) -> (Done) inside its shard. Returns the done folder, or None if unknown."""
+    with _locked(write=True):
+        entry = _index.get(full_vin)
+        if not entry:
+            return None
+
+        current_path = _to_abs(entry["path"])
+        if entry["state"] == "Done":
+            return current_path if os.path.isdir(current_path) else None
+        if not os.path.isdir(current_path):
+            return None
+
+        # Finished evidence is never overwritten: an earlier run in the same shard
+        # keeps its folder and this one is numbered after it
+        run = 1
+        done_path = os.path.join(os.path.dirname(current_path), _run_name(full_vin, "Done", run))
+        while os.path.exists(done_path):
+            run += 1
+            done_path = os.path.join(os.path.dirname(current_path), _run_name(full_vin, "Done", run))
+        shutil.move(current_path, done_path)
+
+        entry["path"] = _to_rel(done_path)
+        entry["state"] = "Done"
+        entry["finished"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        _journal(full_vin)
+    return done_path
+
+
+# ============================== #
+# ✅ MIGRATION / INDEX REBUILD
+# ============================== #
+def _audit_started(folder_path: str):
+    """Start time from InfoBeforeScan.txt, falling back to the folder mtime."""
+    info_path = os.path.join(folder_path, "InfoBeforeScan.txt")
+    try:
+        with open(info_path, "r", encoding="utf-8") as f:
+            first_line = f.readline().strip()
+        if first_line.startswith("Audit Started:"):
+            return datetime.strptime(first_line.split(":", 1)[1].strip(), "%Y-%m-%d %H:%M:%S")
+    except (OSError, ValueError):
+        pass
+    return datetime.fromtimestamp(os.path.getmtime(folder_path))
+
+
+def _register_found(full_vin: str, state: str, folder_path: str, started: datetime):
+    # Index the most recent run per VIN; earlier finished runs go to previous_runs
+    entry = _index.get(full_vin)
+    started_text = started.strftime("%Y-%m-%d %H:%M:%S")
+    rel_path = _to_rel(folder_path)
+    if entry and entry["path"] == rel_path:
+        return
+    if entry and entry.get("started", "") > started_text:
+        if rel_path not in entry.setdefault("previous_runs", []):
+            entry["previous_runs"].append(rel_path)
+        return
+    previous = list(entry.get("previous_runs", [])) + [entry["path"]] if entry else []
+    _index[full_vin] = {"path": rel_path, "state": state, "started": started_text,
+                        **({"previous_runs": previous} if previous else {})}
+
+
+def migrate_results():
+    """
+    Move legacy flat results/<VIN> (Ongoing|Done) folders into the sharded layout and
+    (re)build the index from everything found on disk. Safe to run more than once.
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with _locked(write=True):
+        return _migrate()
+
+
+def _migrate():
+    moved = 0
+    for name in os.listdir(RESULTS_DIR):
+        path = os.path.join(RESULTS_DIR, name)
+        if not os.path.isdir(path):
+            continue
+
+        match = FOLDER_RE.match(name)
+        if match:
+            # Legacy flat folder -> move into its shard
+            full_vin, state = match.group("vin"), match.group("state")
+            started = _audit_started(path)
+            target_dir = _shard_dir(full_vin, started)
+            os.makedirs(target_dir, exist_ok=True)
+            target_path = os.path.join(target_dir, name)
+            if os.path.exists(target_path):
+                print(f"⚠️ Skipping {name}: {target_path} already exists")
+                continue
+            shutil.move(path, target_path)
+            _register_found(full_vin, state, target_path, started)
+            moved += 1
+            continue
+
+        if DATE_DIR_RE.match(name):
+            # Already sharded -> just index it
+            for prefix in os.listdir(path):
+                prefix_path = os.path.join(path, prefix)
+                if not os.path.isdir(prefix_path):
+                    continue
+                for audit_name in os.listdir(prefix_path):
+                    audit_match = FOLDER_RE.match(audit_name)
+                    audit_path = os.path.join(prefix_path, audit_name)
+                    if audit_match and os.path.isdir(audit_path):
+                        _register_found(
+                            audit_match.group("vin"), audit_match.group("state"),
+                            audit_path, _audit_started(audit_path)
+                        )
+
+    _save_index()
+    return {"moved": moved, "indexed": len(_index)}
+
+
+def load_index():
+    """Called once per process from the app lifespan: builds the index on the first start on this layout."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with _locked(write=True):
+        # Checked under the cross-process lock: of several workers starting together, one migrates
+        if not os.path.exists(INDEX_FILE):
+            result = _migrate()
+            print(f"Results index built: {result}")
+
+
+def _before_fork():
+    _lock.acquire()  # never fork while a thread (e.g. the report worker) is mid-update
+
+
+def _after_fork_in_parent():
+    _lock.release()
+
+
+def _after_fork_in_child():
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_before_fork, after_in_parent=_after_fork_in_parent,
+                        after_in_child=_after_fork_in_child)
+
+os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+if __name__ == "__main__":
+    # python -m utils.results_store  -> migrate legacy flat results/ folders
+    print(migrate_results())
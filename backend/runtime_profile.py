@@ -0,0 +1,383 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# ✅ Per-host CPU runtime profile: how many threads each inference engine may use
+# (torch intra-op, OpenMP / MKL / OpenBLAS, OpenCV, PaddleOCR cpu_threads) and how many
+# pipelines run at once. Unset, every library sizes its pool to all cores and every
+# concurrent pipeline does the same, so workers oversubscribe the box. Calibrate once
+# per host with the registered KSpec models, from the backend directory:
+#
+#   python -m utils.runtime_profile calibrate              try the combinations, write the profile
+#   python -m utils.runtime_profile calibrate --imgsz 640,512 --seconds 20
+#   python -m utils.runtime_profile show                   the profile and what startup applies
+#
+# Every combination runs in a fresh process (thread pools are fixed once the libraries
+# load), with one YOLO / OCR replica per concurrent pipeline. The fastest one is written
+# to data/runtime_profile.json (KSPEC_RUNTIME_PROFILE to move it) with the whole results
+# table; app.py, utils.prefork and utils.inference_server apply it at startup. Explicit
+# environment variables (OMP_NUM_THREADS, KSPEC_INFERENCE_CONCURRENCY, ...) still win.
+# Without a profile the engines get cores / concurrent pipelines threads each.
+# There is no batch size to tune: every request carries one photo.
+PROFILE_ENV = "KSPEC_RUNTIME_PROFILE"
+DEFAULT_PROFILE_FILE = "data/runtime_profile.json"
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+CONCURRENCY_ENV = "KSPEC_INFERENCE_CONCURRENCY"
+NEAR_BEST = 0.05     # within 5% of the best throughput, prefer the lower p95
+
+_applied = None
+
+
+def profile_path():
+    return os.getenv(PROFILE_ENV, DEFAULT_PROFILE_FILE)
+
+
+def load():
+    """The calibrated profile, or None (missing, unreadable or from another machine)."""
+    path = profile_path()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = json.load(f)
+        settings = profile["settings"]
+        int(settings["threads"]), int(settings["workers"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Ignoring runtime profile {path}: {e}")
+        return None
+    cores = profile.get("machine", {}).get("cpu_count")
+    if cores != os.cpu_count():
+        print(f"⚠️ Ignoring runtime profile {path}: calibrated for {cores} cores, this host has {os.cpu_count()}")
+        return None
+    return profile
+
+
+def _default_threads(pipelines: int):
+    return max(1, (os.cpu_count() or 1) // max(1, pipelines))
+
+
+def apply(processes: int = 1, settings: dict = None):
+    """
+    Size the thread pools of this process and its inference concurrency, once, before
+    the heavy libraries load. processes: worker processes sharing the host (prefork);
+    settings: use these instead of the profile file (calibration trials).
+    """
+    global _applied
+    if _applied is not None:
+        return _applied
+
+    source = "calibration trial" if settings else None
+    if settings is None:
+        profile = load()
+        settings = profile["settings"] if profile else None
+        source = profile_path() if profile else "default"
+    if settings:
+        threads = int(settings["threads"])
+        concurrency = max(1, math.ceil(int(settings["workers"]) / max(1, processes)))
+        os.environ.setdefault(CONCURRENCY_ENV, str(concurrency))
+    else:
+        threads = _default_threads(max(1, processes) * int(os.getenv(CONCURRENCY_ENV, "1")))
+    for var in THREAD_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+    if os.environ["OMP_NUM_THREADS"].isdigit():
+        threads = int(os.environ["OMP_NUM_THREADS"])  # set by hand: size the other pools the same
+
+    import cv2
+    cv2.setNumThreads(threads)
+    _applied = {"source": source, "threads": threads, "concurrency": int(os.getenv(CONCURRENCY_ENV, "1")),
+                "imgsz": (settings or {}).get("imgsz")}
+    configure_torch()
+    return _applied
+
+
+def configure_torch():
+    """torch keeps its own intra-op pool: size it once torch is loaded (yolo_utils calls this)."""
+    if _applied is not None and "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(_applied["threads"])
+
+
+def threads():
+    """Threads per engine (PaddleOCR cpu_threads); the default when apply() has not run."""
+    return _applied["threads"] if _applied else _default_threads(int(os.getenv(CONCURRENCY_ENV, "1")))
+
+
+def imgsz():
+    """Calibrated YOLO input size, or None for the model's own."""
+    return _applied["imgsz"] if _applied else None
+
+
+def state():
+    return dict(_applied) if _applied else {"source": None}
+
+
+# ============================== #
+# ✅ Calibration
+# ============================== #
+def machine_info(engines: str):
+    import cv2
+    return {"platform": platform.platform(), "machine": platform.machine(), "cpu_count": os.cpu_count(),
+            "python": platform.python_version(), "opencv": cv2.__version__, "engines": engines}
+
+
+def _powers_of_two(limit: int):
+    values, n = [], 1
+    while n < limit:
+        values.append(n)
+        n *= 2
+    return values + [limit]
+
+
+def candidates(cores: int, workers=None, threads=None):
+    """(workers, threads) pairs that fit the cores, unless the lists are given explicitly."""
+    explicit = workers is not None or threads is not None
+    workers = workers or _powers_of_two(cores)
+    threads = threads or _powers_of_two(cores)
+    return [(w, t) for w in workers for t in threads if explicit or w * t <= cores]
+
+
+def _percentile(values, pct: float):
+    values = sorted(values)
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)] if values else None
+
+
+def _trial_image(image_mp: float):
+    import cv2
+    from utils import standin_engines
+
+    width = int(math.sqrt(image_mp * 1e6 * 4 / 3))
+    img = cv2.resize(standin_engines.synthetic_image(400, 300), (width, int(width * 3 / 4)),
+                     interpolation=cv2.INTER_CUBIC)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return img, buf.tobytes()
+
+
+def run_trial(model_paths, workers: int, seconds: float, image_mp: float):
+    """
+    `workers` pipelines in parallel, each with its own replicas, doing what a
+    process_component request does with the engines: YOLO on the photo (models in
+    turn), then OCR. Call in a process whose thread pools are already sized.
+    """
+    from utils import ocr_utils, yolo_utils
+
+    img, jpeg = _trial_image(image_mp)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    ready = threading.Barrier(workers + 1)
+    stop = threading.Event()
+
+    def pipeline(index):
+        try:
+            models = [yolo_utils.new_yolo_obb(path) for path in model_paths]
+            ocr = ocr_utils.new_ocr()
+            yolo_utils.predict_obb(models[0], img)
+            ocr_utils.ocr_image(ocr, jpeg)  # warm-up
+        except Exception as e:
+            errors.append(repr(e))
+            ready.abort()
+            return
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            return  # another pipeline failed to load
+        done = index
+        while not stop.is_set():
+            started = time.perf_counter()
+            yolo_utils.predict_obb(models[done % len(models)], img)
+            ocr_utils.ocr_image(ocr, jpeg)
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+            done += 1
+
+    pool = [threading.Thread(target=pipeline, args=(i,), daemon=True) for i in range(workers)]
+    for thread in pool:
+        thread.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        raise RuntimeError(errors[0] if errors else "pipeline failed to start")
+    started = time.perf_counter()
+    time.sleep(seconds)
+    with lock:
+        window = list(latencies)  # jobs finished inside the window
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in pool:
+        thread.join()
+    return {"jobs": len(window), "jobs_per_s": round(len(window) / elapsed, 3),
+            "p50_ms": round(_percentile(window, 50), 1) if window else None,
+            "p95_ms": round(_percentile(window, 95), 1) if window else None}
+
+
+def _trial_main(args):
+    # Runs in a fresh interpreter: size the pools before cv2 / torch / paddle load
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(args.threads)
+    apply(processes=args.workers, settings={"workers": args.workers, "threads": args.threads, "imgsz": args.imgsz})
+    if args.standin:
+        from utils import standin_engines
+        standin_engines.install()
+    result = run_trial(args.models.split(os.pathsep), args.workers, args.seconds, args.image_mp)
+    print(json.dumps(result))
+    return 0
+
+
+def _run_trial_process(model_paths, workers: int, threads: int, size, args):
+    command = [sys.executable, "-m", "utils.runtime_profile", "_trial", "--workers", str(workers),
+               "--threads", str(threads), "--seconds", str(args.seconds), "--image-mp", str(args.image_mp),
+               "--models", os.pathsep.join(model_paths)]
+    if size:
+        command += ["--imgsz", str(size)]
+    if args.standin:
+        command.append("--standin")
+    env = dict(os.environ)
+    for var in THREAD_ENV_VARS + (CONCURRENCY_ENV,):
+        env.pop(var, None)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (package_root, env.get("PYTHONPATH")) if p)
+    done = subprocess.run(command, env=env, capture_output=True, text=True, timeout=args.seconds * 4 + 600)
+    lines = [line for line in done.stdout.splitlines() if line.startswith("{")]
+    if done.returncode != 0 or not lines:
+        error = (done.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"error": error}
+    return json.loads(lines[-1])
+
+
+def best(results):
+    """Highest throughput; among settings within NEAR_BEST of it, the lowest p95."""
+    ok = [r for r in results if r.get("jobs_per_s")]
+    if not ok:
+        return None
+    top = max(r["jobs_per_s"] for r in ok)
+    near = [r for r in ok if r["jobs_per_s"] >= top * (1 - NEAR_BEST)]
+    return min(near, key=lambda r: (r["p95_ms"], r["workers"] * r["threads"]))
+
+
+def print_table(results, chosen=None):
+    print(f"\n{'workers':>8}{'threads':>9}{'imgsz':>7}{'jobs/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        mark = "  ← chosen" if r is chosen else ""
+        size = r.get("imgsz") or "model"
+        if "error" in r:
+            print(f"{r['workers']:>8}{r['threads']:>9}{size:>7}    failed: {r['error']}")
+            continue
+        p50 = f"{r['p50_ms']:.1f}" if r["p50_ms"] is not None else "-"
+        p95 = f"{r['p95_ms']:.1f}" if r["p95_ms"] is not None else "-"
+        print(f"{r['workers']:>8}{r['threads']:>9}{size:>7}{r['jobs_per_s']:>10.2f}{p50:>10}{p95:>10}{mark}")
+
+
+def _calibration_models(args):
+    if args.standin:
+        from utils import standin_engines
+        path = os.path.join(tempfile.mkdtemp(prefix="kspec-calibrate-"), "standin.pt")
+        return [standin_engines.write_model(path, ["part"])]
+    from utils import yolo_utils
+    paths = yolo_utils.kspec_model_paths()
+    return [os.path.abspath(p) for p in paths[:args.models]]
+
+
+def calibrate(args):
+    model_paths = _calibration_models(args)
+    if not model_paths:
+        print("No KSpec models registered (data/kspecs): add one or calibrate with --standin")
+        return 1
+    cores = os.cpu_count() or 1
+    pairs = candidates(cores, _int_list(args.workers), _int_list(args.threads))
+    sizes = _int_list(args.imgsz) or [None]
+    print(f"🔧 Calibrating on {cores} cores with {len(model_paths)} model(s): {len(pairs) * len(sizes)} settings, "
+          f"{args.seconds:g}s each")
+
+    results = []
+    for workers, threads in pairs:
+        for size in sizes:
+            print(f"  workers={workers} threads={threads} imgsz={size or 'model'} ...", flush=True)
+            results.append({"workers": workers, "threads": threads, "imgsz": size,
+                            **_run_trial_process(model_paths, workers, threads, size, args)})
+
+    chosen = best(results)
+    print_table(results, chosen)
+    if chosen is None:
+        print("\n❌ No setting completed, profile not written")
+        return 1
+
+    profile = {
+        "machine": machine_info("standin" if args.standin else "real"),
+        "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "models": [os.path.basename(p) for p in model_paths],
+        "seconds_per_setting": args.seconds,
+        "image_mp": args.image_mp,
+        "settings": {"workers": chosen["workers"], "threads": chosen["threads"], "imgsz": chosen["imgsz"]},
+        "expected": {k: chosen[k] for k in ("jobs_per_s", "p50_ms", "p95_ms")},
+        "results": results,
+    }
+    path = args.output or profile_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+    print(f"\n📝 Runtime profile written to {path}: {chosen['workers']} pipeline(s) x {chosen['threads']} "
+          f"thread(s), expect ~{chosen['jobs_per_s']:.2f} jobs/s")
+    return 0
+
+
+def show(args):
+    profile = load()
+    if profile is None:
+        print(f"No usable runtime profile at {profile_path()}; startup uses cores / pipelines threads")
+    else:
+        print(f"Runtime profile {profile_path()} (recorded {profile.get('recorded')}, models {profile.get('models')})")
+        chosen = next((r for r in profile.get("results", [])
+                       if all(r.get(k) == v for k, v in profile["settings"].items())), None)
+        print_table(profile.get("results", []), chosen)
+    print(f"\nApplied at startup here: {apply(processes=args.processes)}")
+    return 0
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(",") if v.strip()] if text else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate and inspect this host's CPU runtime profile")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cal = commands.add_parser("calibrate", help="benchmark thread / concurrency settings and write the profile")
+    cal.add_argument("--seconds", type=float, default=15.0, help="measuring time per setting")
+    cal.add_argument("--workers", help="concurrent pipelines to try, comma separated (default: powers of two)")
+    cal.add_argument("--threads", help="threads per engine to try, comma separated (default: powers of two)")
+    cal.add_argument("--imgsz", help="YOLO input sizes to try, e.g. 640,512 (default: the model's own)")
+    cal.add_argument("--models", type=int, default=3, help="registered KSpec models to rotate through")
+    cal.add_argument("--image-mp", type=float, default=12.0, help="synthetic photo size, megapixels")
+    cal.add_argument("--standin", action="store_true", help="stand-in engines (utils.standin_engines)")
+    cal.add_argument("--output", help=f"profile file (default: {DEFAULT_PROFILE_FILE} or ${PROFILE_ENV})")
+
+    sh = commands.add_parser("show", help="print the profile and the settings startup would apply")
+    sh.add_argument("--processes", type=int, default=1, help="API worker processes (prefork --workers)")
+
+    trial = commands.add_parser("_trial")  # one setting, in a child process (see calibrate)
+    trial.add_argument("--workers", type=int, required=True)
+    trial.add_argument("--threads", type=int, required=True)
+    trial.add_argument("--seconds", type=float, required=True)
+    trial.add_argument("--image-mp", type=float, required=True)
+    trial.add_argument("--imgsz", type=int)
+    trial.add_argument("--models", required=True)
+    trial.add_argument("--standin", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "calibrate":
+        return calibrate(args)
+    if args.command == "show":
+        return show(args)
+    return _trial_main(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
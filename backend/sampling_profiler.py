@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import Counter
+
+# ✅ Low-overhead sampling profiler for the live server (no restart, no tracing hooks).
+# A background thread snapshots the Python stacks of the watched threads every few ms
+# (sys._current_frames) and counts identical stacks; the result is exported as
+# collapsed stacks (flamegraph.pl / speedscope / inferno) or speedscope JSON.
+# Only Python frames are visible: time inside cv2 / torch / PaddleOCR shows up on the
+# Python line that called into them, which is what we need to find the slow step.
+PROFILES_DIR = "profiles"
+KEEP_PROFILES = 50
+DEFAULT_INTERVAL = 0.005
+FORMATS = ("collapsed", "speedscope")
+
+_request_sampler = contextvars.ContextVar("request_sampler", default=None)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()  # root first
+    return tuple(labels)
+
+
+class Sampler:
+    """
+    Samples all threads (thread_ids=None) or only the given ones until stop().
+    Usable as a context manager.
+    """
+
+    def __init__(self, thread_ids=None, interval: float = DEFAULT_INTERVAL):
+        self.thread_ids = set(thread_ids) if thread_ids else None
+        self.interval = interval
+        self.counts = Counter()     # (thread name, stack) -> samples
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.time() - self.started if self.started else 0.0
+        return self
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                    continue
+                self.counts[(names.get(ident, f"thread-{ident}"), _stack(frame))] += 1
+            self.samples += 1
+
+    # ------------------------------ export ------------------------------ #
+    def collapsed(self):
+        """One 'thread;root;...;leaf count' line per distinct stack."""
+        lines = [";".join((thread,) + stack) + f" {count}"
+                 for (thread, stack), count in self.counts.most_common()]
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str = "kspec backend"):
+        """speedscope.app file format: one sampled profile per thread, weights in ms."""
+        frames, frame_index = [], {}
+        by_thread = {}
+        for (thread, stack), count in self.counts.items():
+            indexes = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    func, _, where = label.partition(" (")
+                    file, _, line = where.rstrip(")").rpartition(":")
+                    frames.append({"name": func, "file": file, "line": int(line) if line.isdigit() else None})
+                indexes.append(frame_index[label])
+            by_thread.setdefault(thread, []).append((indexes, count * self.interval * 1000))
+
+        profiles = []
+        for thread, samples in sorted(by_thread.items()):
+            total = sum(weight for _, weight in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(total, 3),
+                "samples": [indexes for indexes, _ in samples],
+                "weights": [round(weight, 3) for _, weight in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "kspec-backend sampling_profiler",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def export(self, fmt: str, name: str = "kspec backend"):
+        """(body, media type) for fmt in FORMATS."""
+        if fmt == "speedscope":
+            return json.dumps(self.speedscope(name)), "application/json"
+        return self.collapsed(), "text/plain; charset=utf-8"
+
+
+# ============================== #
+# ✅ Per-request mode
+# ============================== #
+def bind(sampler: Sampler):
+    """Make sampler the current request's profiler; returns the token for unbind()."""
+    return _request_sampler.set(sampler)
+
+
+def unbind(token):
+    _request_sampler.reset(token)
+
+
+def watch_current_thread():
+    """Threadpool work of a profiled request: sample this thread too."""
+    sampler = _request_sampler.get()
+    if sampler is not None and sampler.thread_ids is not None:
+        sampler.thread_ids.add(threading.get_ident())
+
+
+def save(sampler: Sampler, fmt: str, name: str):
+    """Write a profile under PROFILES_DIR, keep the newest KEEP_PROFILES, return its id."""
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    body, _ = sampler.export(fmt, name)
+    ext = "json" if fmt == "speedscope" else "txt"
+    tmp = os.path.join(PROFILES_DIR, f".{profile_id}.{ext}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(body)
+    os.replace(tmp, os.path.join(PROFILES_DIR, f"{profile_id}.{ext}"))
+
+    saved = sorted(n for n in os.listdir(PROFILES_DIR) if not n.startswith("."))
+    for old in saved[:-KEEP_PROFILES]:
+        try:
+            os.remove(os.path.join(PROFILES_DIR, old))
+        except OSError:
+            pass
+    return profile_id
+
+
+def load(profile_id: str):
+    """(path, media type) of a saved profile, or (None, None)."""
+    if not profile_id or "/" in profile_id or "\\" in profile_id or profile_id.startswith("."):
+        return None, None
+    for ext, media_type in (("json", "application/json"), ("txt", "text/plain; charset=utf-8")):
+        path = os.path.join(PROFILES_DIR, f"{profile_id}.{ext}")
+        if os.path.exists(path):
+            return path, media_type
+    return None, None
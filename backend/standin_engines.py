@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+
+import cv2
+import numpy as np
+
+# ✅ Offline stand-ins for YOLO and PaddleOCR, for load tests and benchmarks on any box.
+# A stand-in model is a small JSON file (saved with a .pt name so KSpecs look normal)
+# listing the classes it "detects" and how much work one inference costs: the image is
+# letterboxed to 640 like the real preprocessing, then blurred `work` times, so CPU
+# contention shows up the way it would with real models. Stub OCR returns the texts
+# embedded after the JPEG end marker by embed_ocr_text (decoders ignore trailing bytes).
+#
+#   KSPEC_STANDIN_ENGINES=1 uvicorn app:app      (app.py installs them)
+STANDIN_ENV = "KSPEC_STANDIN_ENGINES"
+OCR_MARKER = b"\xff\xfeKSPEC-STANDIN-OCR:"
+INPUT_SIZE = 640
+DEFAULT_YOLO_WORK = 12
+DEFAULT_OCR_WORK = 20
+
+_specs = {}
+_specs_lock = threading.Lock()
+
+
+def write_model(path: str, classes: list, work: int = DEFAULT_YOLO_WORK):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"standin_yolo": 1, "classes": classes, "work": work}, f)
+    return path
+
+
+def _model_spec(model_path: str):
+    spec = _specs.get(model_path)
+    if spec is None:
+        with open(model_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        with _specs_lock:
+            _specs[model_path] = spec
+    return spec
+
+
+def _busy_work(img: np.ndarray, size: int, work: int):
+    small = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    for _ in range(work):
+        small = cv2.GaussianBlur(small, (9, 9), 0)
+    return small
+
+
+def run_yolo_obb(model_path: str, img: np.ndarray):
+    """Same return shape as utils.yolo_utils.run_yolo_obb_local: every class, one centered box each."""
+    return predict_obb(_model_spec(model_path), img)
+
+
+def _new_model(model_path: str):
+    with open(model_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def predict_obb(spec: dict, img: np.ndarray):
+    from utils import runtime_profile
+    _busy_work(img, runtime_profile.imgsz() or INPUT_SIZE, spec.get("work", DEFAULT_YOLO_WORK))
+    h, w = img.shape[:2]
+    box = np.array([[[w * 0.25, h * 0.25], [w * 0.75, h * 0.25], [w * 0.75, h * 0.75], [w * 0.25, h * 0.75]]],
+                   dtype=np.float32)
+    detections = [{"class": c.lower(), "confidence": 0.9} for c in spec["classes"]]
+    return detections, [box.copy() for _ in detections]
+
+
+def embed_ocr_text(image_bytes: bytes, texts: list):
+    return image_bytes + OCR_MARKER + json.dumps(texts).encode("utf-8")
+
+
+def run_ocr(image_bytes: bytes, work: int = DEFAULT_OCR_WORK):
+    """Decode + resize like utils.ocr_utils.run_ocr_local, then return the embedded texts."""
+    from utils import image_decode
+    try:
+        img, _ = image_decode.decode(image_bytes, 960)
+        _busy_work(img, 960, work)
+    except image_decode.ImageRejected:
+        pass
+    marker = image_bytes.rfind(OCR_MARKER)
+    if marker < 0:
+        return []
+    return json.loads(image_bytes[marker + len(OCR_MARKER):].decode("utf-8"))
+
+
+class _StubOCR:
+    def predict(self, img):
+        return []
+
+
+def _ocr_image(ocr, image_bytes: bytes):
+    return run_ocr(image_bytes)
+
+
+def install():
+    """Route YOLO / OCR through the stand-ins for this process."""
+    from utils import ocr_utils, yolo_utils
+
+    yolo_utils.run_yolo_obb_local = run_yolo_obb
+    yolo_utils.load_yolo_obb = _model_spec
+    yolo_utils.new_yolo_obb = _new_model
+    yolo_utils.predict_obb = predict_obb
+    yolo_utils.warm_up = lambda: None
+    ocr_utils.run_ocr_local = run_ocr
+    ocr_utils.get_ocr = _StubOCR
+    ocr_utils.new_ocr = _StubOCR
+    ocr_utils.ocr_image = _ocr_image
+    print("🧪 Stand-in YOLO / OCR engines installed")
+
+
+def synthetic_image(width: int, height: int, seed: int = 0):
+    """Camera-like test image: smooth gradients plus noise, so JPEG sizes are realistic."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width * 255, y / height * 255, (x + y) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 12, size=(height, width, 3)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_jpeg(width: int, height: int, seed: int = 0, quality: int = 85):
+    ok, buf = cv2.imencode(".jpg", synthetic_image(width, height, seed), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode synthetic image")
+    return buf.tobytes()
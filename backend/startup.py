@@ -0,0 +1,81 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# ✅ Startup timeline + readiness of the heavy subsystems.
+# Routers are imported with timed(...) so every import shows up in the timeline; OCR,
+# YOLO and the lookup tables load in background threads (start_background) while the
+# server already accepts connections. /ready reports each subsystem's state.
+_t0 = time.perf_counter()
+_lock = threading.Lock()
+_timeline = []     # [{"name", "start_ms", "duration_ms"}] in start order
+_subsystems = {}   # name -> {"state", "required", "started_ms", "duration_ms", "error"}
+
+
+def _now_ms():
+    return round((time.perf_counter() - _t0) * 1000, 1)
+
+
+@contextmanager
+def timed(name: str):
+    """Record how long a block (an import, an init step) took since process start."""
+    start = time.perf_counter()
+    start_ms = _now_ms()
+    try:
+        yield
+    finally:
+        with _lock:
+            _timeline.append({"name": name, "start_ms": start_ms, "duration_ms": round((time.perf_counter() - start) * 1000, 1)})
+
+
+def register(name: str, required: bool = True):
+    with _lock:
+        _subsystems.setdefault(name, {"state": "pending", "required": required, "started_ms": None, "duration_ms": None, "error": None})
+
+
+def _run(name: str, init):
+    start = time.perf_counter()
+    try:
+        with timed(f"init:{name}"):
+            init()
+        state, error = "ready", None
+    except Exception as e:
+        state, error = "failed", str(e)
+        print(f"❌ Startup: {name} failed: {e}")
+    duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    with _lock:
+        _subsystems[name].update(state=state, error=error, duration_ms=duration_ms)
+    if state == "ready":
+        print(f"✅ Startup: {name} ready in {duration_ms:.0f} ms")
+
+
+def start_background(name: str, init, required: bool = True):
+    """Run init() in a daemon thread; its outcome is reported by readiness()."""
+    register(name, required)
+    with _lock:
+        if _subsystems[name]["state"] != "pending":
+            return
+        _subsystems[name].update(state="loading", started_ms=_now_ms())
+    threading.Thread(target=_run, args=(name, init), name=f"startup-{name}", daemon=True).start()
+
+
+def is_ready(name: str):
+    return _subsystems.get(name, {}).get("state") == "ready"
+
+
+def readiness():
+    with _lock:
+        subsystems = {name: dict(info) for name, info in _subsystems.items()}
+    ready = all(info["state"] == "ready" for info in subsystems.values() if info["required"])
+    return {"ready": ready, "uptime_ms": _now_ms(), "subsystems": subsystems}
+
+
+def timeline():
+    with _lock:
+        return sorted(_timeline, key=lambda e: e["start_ms"])
+
+
+def print_timeline():
+    print("⏱️ Startup timeline (ms since process start):")
+    for entry in timeline():
+        print(f"   {entry['start_ms']:>9.1f}  {entry['duration_ms']:>8.1f}  {entry['name']}")
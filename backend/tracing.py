@@ -0,0 +1,392 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import argparse
+import threading
+import traceback
+import contextvars
+from contextlib import contextmanager
+
+from utils import file_lock
+
+# ✅ Structured request tracing instead of print() on the request path.
+# Each request gets an id (X-Request-ID, taken from the client if it sent one) and a
+# root span; span(...) / stage(...) time the pipeline steps inside it and event(...) /
+# exception(...) replace the console dumps. Records are queued and written as JSONL by
+# a background thread (logs/trace.jsonl, rotated at TRACE_MAX_BYTES), so a slow or
+# busy console never stalls a request; when the queue is full records are dropped and
+# counted instead of blocking.
+#
+#   KSPEC_TRACE_DIR=logs            where trace.jsonl lives
+#   KSPEC_TRACE_STDOUT=1            also echo every record to stdout (development)
+#   KSPEC_OTEL_ENDPOINT=http://collector:4318
+#                                   also export finished spans as OTLP/HTTP JSON
+#   python -m utils.tracing collector --port 4318    stand-in collector for that
+TRACE_DIR = os.getenv("KSPEC_TRACE_DIR", "logs")
+TRACE_FILE = "trace.jsonl"
+TRACE_MAX_BYTES = 20 * 1024 * 1024
+TRACE_BACKUPS = 5
+MAX_QUEUE = 10000
+BATCH = 500
+SERVICE_NAME = "kspec-backend"
+
+_trace = contextvars.ContextVar("trace", default=None)   # {"request_id", "trace_id"}
+_span = contextvars.ContextVar("span", default=None)     # current span id
+_stage_start = contextvars.ContextVar("stage_start", default=None)
+
+_queue = queue.Queue(maxsize=MAX_QUEUE)
+_writer = None
+_writer_lock = threading.Lock()
+_stats = {"written": 0, "dropped": 0, "exported": 0, "export_failures": 0}
+
+
+def _new_span_id():
+    return os.urandom(8).hex()
+
+
+def _trace_id(request_id: str):
+    """OTel trace ids are 32 hex chars; reuse the request id when it already is one."""
+    rid = request_id.replace("-", "").lower()
+    if len(rid) == 32 and all(c in "0123456789abcdef" for c in rid):
+        return rid
+    return uuid.uuid5(uuid.NAMESPACE_URL, request_id).hex
+
+
+def current_request_id():
+    trace = _trace.get()
+    return trace["request_id"] if trace else None
+
+
+# ============================== #
+# ✅ Recording API
+# ============================== #
+@contextmanager
+def request(name: str, request_id: str = None, **attrs):
+    """Root span of one request; everything recorded inside carries its request id."""
+    request_id = request_id or uuid.uuid4().hex
+    trace_token = _trace.set({"request_id": request_id, "trace_id": _trace_id(request_id)})
+    stage_token = _stage_start.set(time.perf_counter())
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        _stage_start.reset(stage_token)
+        _trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block; inside it the yielded dict's "attrs", "name" and "status" can be set."""
+    parent = _span.get()
+    record = {"span_id": _new_span_id(), "parent_id": parent, "attrs": dict(attrs)}
+    token = _span.set(record["span_id"])
+    start, started = time.time(), time.perf_counter()
+    status = "ok"
+    try:
+        yield record
+    except BaseException as e:
+        status = "error"
+        record["attrs"].setdefault("error", f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _span.reset(token)
+        _emit_span(record.get("name", name), record["span_id"], parent, start,
+                   (time.perf_counter() - started) * 1000, record.get("status", status), record["attrs"])
+
+
+def stage(name: str, **attrs):
+    """
+    End of a pipeline stage: records a span from the previous stage (or the request
+    start) to now, with the stage's RSS delta / traced peak from memory_accounting.
+    """
+    from utils import memory_accounting
+
+    now = time.perf_counter()
+    started = _stage_start.get()
+    _stage_start.set(now)
+    memory = memory_accounting.checkpoint(name)
+    if memory:
+        attrs["rss_delta"] = memory["rss_delta"]
+        if memory["traced_peak"] is not None:
+            attrs["traced_peak"] = memory["traced_peak"]
+    if started is None or _trace.get() is None:
+        return
+    duration_ms = (now - started) * 1000
+    _emit_span(name, _new_span_id(), _span.get(), time.time() - duration_ms / 1000, duration_ms, "ok", attrs)
+
+
+def event(name: str, level: str = "info", **fields):
+    _emit({"type": "event", "level": level, "name": name, "fields": fields})
+
+
+def exception(name: str, exc: BaseException, **fields):
+    """An error with its traceback, in place of traceback.print_exc()."""
+    _emit({"type": "event", "level": "error", "name": name, "fields": {
+        **fields,
+        "error": f"{type(exc).__name__}: {exc}",
+        "traceback": "".join(traceback.format_exception(type(exc), exc, exc.__traceback__)),
+    }})
+
+
+def _emit_span(name, span_id, parent_id, start, duration_ms, status, attrs):
+    _emit({"type": "span", "name": name, "span_id": span_id, "parent_id": parent_id,
+           "start": round(start, 6), "duration_ms": round(duration_ms, 3), "status": status, "attrs": attrs})
+
+
+def _emit(record: dict):
+    trace = _trace.get()
+    record = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()), "pid": os.getpid(),
+              "request_id": trace["request_id"] if trace else None,
+              "trace_id": trace["trace_id"] if trace else None,
+              **({"span_id": _span.get()} if record["type"] == "event" else {}), **record}
+    _ensure_writer()
+    try:
+        _queue.put_nowait(record)
+    except queue.Full:
+        _stats["dropped"] += 1
+
+
+class TracingMiddleware:
+    """
+    Root span per HTTP request, named after the matched route; the request id comes
+    from the client's X-Request-ID when it sent a sane one and is echoed back.
+    """
+
+    def __init__(self, app, untraced_prefixes=("/data", "/health", "/ready")):
+        self.app = app
+        self.untraced_prefixes = tuple(untraced_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.untraced_prefixes):
+            return await self.app(scope, receive, send)
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1").strip()
+        request_id = incoming if 0 < len(incoming) <= 64 and incoming.isascii() \
+            and incoming.replace("-", "").replace("_", "").isalnum() else uuid.uuid4().hex
+
+        with request(f"{scope['method']} {scope['path']}", request_id,
+                     method=scope["method"], path=scope["path"]) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root["attrs"]["status_code"] = message["status"]
+                    if message["status"] >= 500:
+                        root["status"] = "error"
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None and getattr(route, "path", None):
+                    root["name"] = f"{scope['method']} {route.path}"
+
+
+# ============================== #
+# ✅ Background writer
+# ============================== #
+def _ensure_writer():
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        with _writer_lock:
+            if _writer is None or not _writer.is_alive():
+                _writer = threading.Thread(target=_writer_loop, name="trace-writer", daemon=True)
+                _writer.start()
+
+
+def _trace_path():
+    return os.path.join(TRACE_DIR, TRACE_FILE)
+
+
+def _rotate_if_needed(path: str):
+    """Rotate trace.jsonl -> .1 -> ... under a file lock (prefork workers share the file)."""
+    try:
+        if os.path.getsize(path) < TRACE_MAX_BYTES:
+            return
+    except OSError:
+        return
+    with file_lock.locked(path + ".lock"):
+        try:
+            if os.path.getsize(path) < TRACE_MAX_BYTES:
+                return  # another worker rotated it already
+        except OSError:
+            return
+        for i in range(TRACE_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+
+
+def _write_batch(records: list):
+    path = _trace_path()
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records).encode("utf-8")
+    # O_APPEND: whole batches from several worker processes never interleave mid-line
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    _stats["written"] += len(records)
+    if os.getenv("KSPEC_TRACE_STDOUT"):
+        sys.stdout.write(data.decode("utf-8"))
+        sys.stdout.flush()
+    _rotate_if_needed(path)
+
+
+def _writer_loop():
+    while True:
+        records = [_queue.get()]
+        while len(records) < BATCH:
+            try:
+                records.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write_batch(records)
+            if os.getenv("KSPEC_OTEL_ENDPOINT"):
+                _export(records)
+        except Exception as e:
+            _stats["dropped"] += len(records)
+            sys.stderr.write(f"⚠️ Trace writer: {e}\n")
+        finally:
+            for _ in records:
+                _queue.task_done()
+
+
+def flush(timeout: float = 5.0):
+    """Wait until every queued record is written (tests, shutdown). False on timeout."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return not _queue.unfinished_tasks
+
+
+def stats():
+    return {**_stats, "queued": _queue.qsize(), "file": _trace_path(),
+            "otel_endpoint": os.getenv("KSPEC_OTEL_ENDPOINT")}
+
+
+# ============================== #
+# ✅ OTLP/HTTP JSON export
+# ============================== #
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}
+
+
+def to_otlp(records: list):
+    """OTLP ExportTraceServiceRequest (JSON encoding) for the span records in a batch."""
+    spans = []
+    for r in records:
+        if r["type"] != "span" or not r.get("trace_id"):
+            continue
+        start_ns = int(r["start"] * 1e9)
+        attrs = {**r["attrs"], "kspec.request_id": r["request_id"], "process.pid": r["pid"]}
+        spans.append({
+            "traceId": r["trace_id"],
+            "spanId": r["span_id"],
+            **({"parentSpanId": r["parent_id"]} if r["parent_id"] else {}),
+            "name": r["name"],
+            "kind": 2 if r["parent_id"] is None else 1,  # SERVER for the request, INTERNAL below it
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(r["duration_ms"] * 1e6)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items() if v is not None],
+            "status": {"code": 2 if r["status"] == "error" else 1},
+        })
+    if not spans:
+        return None
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": "utils.tracing"}, "spans": spans}],
+    }]}
+
+
+def _export(records: list):
+    import urllib.request
+
+    payload = to_otlp(records)
+    if payload is None:
+        return
+    url = os.getenv("KSPEC_OTEL_ENDPOINT").rstrip("/") + "/v1/traces"
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=2) as resp:
+            resp.read()
+        _stats["exported"] += len(payload["resourceSpans"][0]["scopeSpans"][0]["spans"])
+    except OSError:
+        _stats["export_failures"] += 1
+
+
+# ============================== #
+# ✅ Fork safety (preload-then-fork serving)
+# ============================== #
+def _after_fork_in_child():
+    # The parent's writer thread doesn't exist in the child; its queued records stay with the parent
+    global _queue, _writer, _writer_lock
+    _queue = queue.Queue(maxsize=MAX_QUEUE)
+    _writer = None
+    _writer_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(flush, 2.0)
+
+
+# ============================== #
+# ✅ Stand-in OpenTelemetry collector
+# ============================== #
+def run_collector(port: int, out_path: str):
+    """Accept OTLP/HTTP JSON on /v1/traces and append every span to out_path as JSONL."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    out_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            lines = []
+            for resource_spans in body.get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    lines += [json.dumps(s) + "\n" for s in scope_spans.get("spans", [])]
+            with out_lock, open(out_path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    print(f"📡 Stand-in OTLP collector on :{port}/v1/traces -> {out_path}")
+    server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tracing tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    collector = sub.add_parser("collector", help="stand-in OpenTelemetry collector (OTLP/HTTP JSON)")
+    collector.add_argument("--port", type=int, default=4318)
+    collector.add_argument("--out", default="collected_spans.jsonl")
+    args = parser.parse_args(argv)
+    if args.command == "collector":
+        run_collector(args.port, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,52 @@
-import pandas as pd
 import re
-from fastapi import APIRouter, File, UploadFile
+import threading
+from fastapi import APIRouter, File, Request, UploadFile
 from fastapi.responses import JSONResponse
 from utils.ocr_utils import run_ocr
+from utils import tracing
+from utils import admission
+from utils import capture_profile
+from utils import image_decode
 
 router = APIRouter()
 
-# ✅ Load and normalize CSV
-WORKER_DF = pd.read_csv("data/CalLineWorkerSheet.csv")
-WORKER_DF.columns = WORKER_DF.columns.str.strip()
-WORKER_DF["P.No"] = WORKER_DF["P.No"].astype(str).str.strip()
-WORKER_DF["Name"] = WORKER_DF["Name"].astype(str).str.strip()
-WORKER_DF["Department"] = WORKER_DF["Department"].astype(str).str.strip()
+_worker_df = None
+_worker_lock = threading.Lock()
 
-VALID_PNOS = set(WORKER_DF["P.No"])
+
+def get_worker_df():
+    """Load and normalize the worker CSV once (startup warm-up or first request)."""
+    global _worker_df
+    if _worker_df is None:
+        with _worker_lock:
+            if _worker_df is None:
+                import pandas as pd
+                worker_df = pd.read_csv("data/CalLineWorkerSheet.csv")
+                worker_df.columns = worker_df.columns.str.strip()
+                worker_df["P.No"] = worker_df["P.No"].astype(str).str.strip()
+                worker_df["Name"] = worker_df["Name"].astype(str).str.strip()
+                worker_df["Department"] = worker_df["Department"].astype(str).str.strip()
+                _worker_df = worker_df
+    return _worker_df
 
 @router.post("/verify_person")
-async def verify_person(file: UploadFile = File(...)):
+async def verify_person(request: Request, file: UploadFile = File(...)):
     try:
-        all_texts = run_ocr(await file.read())
-        combined_text = " ".join(all_texts).lower()
+        image_bytes = await image_decode.read_upload(file)
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
+    capture_profile.record_upload(request.headers, "person", image_bytes)
+    # Blocks the operator from starting an audit: first in line for inference
+    return await admission.run_inference(request, "interactive", _verify_person, image_bytes)
+
 
-        print("\n=== OCR RAW TEXT ===")
-        print(combined_text)
-        print("====================")
+def _verify_person(image_bytes: bytes):
+    try:
+        all_texts = run_ocr(image_bytes)
+        combined_text = " ".join(all_texts).lower()
+        tracing.event("person_ocr_text", level="debug", text=combined_text)
 
         candidates = list(re.findall(r"\b\d{5,7}\b", combined_text))
-        print(f"Detected candidate numbers: {candidates}")
 
         best_match, best_score = None, -1
         for match in candidates:
@@ -42,10 +62,14 @@ async def verify_person(file: UploadFile = File(...)):
                 best_score = score
                 best_match = match
 
-        print(f"✅ Best match (based on scoring): {best_match}, score: {best_score}")
+        tracing.event("pno_candidates", candidates=candidates, best_match=best_match, score=best_score)
 
-        if best_match and best_match in VALID_PNOS:
-            row = WORKER_DF.loc[WORKER_DF["P.No"] == best_match].iloc[0]
+        with tracing.span("worker_lookup") as span:
+            worker_df = get_worker_df()
+            found = bool(best_match) and best_match in worker_df["P.No"].values
+            span["attrs"]["found"] = found
+        if found:
+            row = worker_df.loc[worker_df["P.No"] == best_match].iloc[0]
             return JSONResponse(content={
                 "status": "verified",
                 "pno": best_match,
@@ -53,12 +77,13 @@ async def verify_person(file: UploadFile = File(...)):
                 "department": row.get("Department", "Unknown")
             })
 
-        print("❌ No matching P.No found in CSV.")
         return JSONResponse(content={
             "status": "not_found",
             "detected": candidates
         })
 
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
     except Exception as e:
-        print(f"❌ ERROR: {str(e)}")
+        tracing.exception("verify_person_failed", e)
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
@@ -1,37 +1,61 @@
-import pandas as pd
 import re
-from fastapi import APIRouter, File, UploadFile
+import threading
+from fastapi import APIRouter, File, Request, UploadFile
 from fastapi.responses import JSONResponse
 from utils.ocr_utils import run_ocr
+from utils import tracing
+from utils import admission
+from utils import capture_profile
+from utils import image_decode
 
 router = APIRouter()
 
-# ✅ Load and normalize CSV
-VIN_DF = pd.read_csv("data/VINSpecification.csv")
-VIN_DF.columns = VIN_DF.columns.str.strip()
-for col in VIN_DF.columns:
-    VIN_DF[col] = VIN_DF[col].astype(str).str.strip()
+_vin_map = None
+_vin_lock = threading.Lock()
 
-VIN_MAP = {row["VIN_NUMBER"]: row.to_dict() for _, row in VIN_DF.iterrows()}
+
+def get_vin_map():
+    """Load and normalize the VIN CSV once (startup warm-up or first request)."""
+    global _vin_map
+    if _vin_map is None:
+        with _vin_lock:
+            if _vin_map is None:
+                import pandas as pd
+                vin_df = pd.read_csv("data/VINSpecification.csv")
+                vin_df.columns = vin_df.columns.str.strip()
+                for col in vin_df.columns:
+                    vin_df[col] = vin_df[col].astype(str).str.strip()
+                _vin_map = {row["VIN_NUMBER"]: row.to_dict() for _, row in vin_df.iterrows()}
+    return _vin_map
 
 @router.post("/verify_vin")
-async def verify_vin(file: UploadFile = File(...)):
+async def verify_vin(request: Request, file: UploadFile = File(...)):
     try:
-        all_texts = run_ocr(await file.read())
-        combined_text = " ".join(all_texts).upper()
+        image_bytes = await image_decode.read_upload(file)
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
+    capture_profile.record_upload(request.headers, "vin", image_bytes)
+    # Blocks the operator from starting an audit: first in line for inference
+    return await admission.run_inference(request, "interactive", _verify_vin, image_bytes)
+
 
-        print("\n=== OCR RAW TEXT ===")
-        print(combined_text)
-        print("====================")
+def _verify_vin(image_bytes: bytes):
+    try:
+        all_texts = run_ocr(image_bytes)
+        combined_text = " ".join(all_texts).upper()
+        tracing.event("vin_ocr_text", level="debug", text=combined_text)
 
         vin_match = re.search(r"\bS[A-Z0-9]{16}\b", combined_text)
         if not vin_match:
+            tracing.event("vin_not_detected", texts=len(all_texts))
             return JSONResponse(content={"status": "not_found", "detected_texts": all_texts})
 
         full_vin = vin_match.group(0)
         vin_last6 = full_vin[-6:]
 
-        row = VIN_MAP.get(vin_last6, None)
+        with tracing.span("vin_lookup", vin_last6=vin_last6) as span:
+            row = get_vin_map().get(vin_last6, None)
+            span["attrs"]["found"] = row is not None
         if row is None:
             return JSONResponse(content={
                 "status": "not_found",
@@ -47,6 +71,8 @@ async def verify_vin(file: UploadFile = File(...)):
             "full_vin_number": row.get("FULL_VIN_NUMBER", full_vin)
         })
 
+    except image_decode.ImageRejected as e:
+        return image_decode.rejected_response(e)
     except Exception as e:
-        print(f"❌ ERROR: {e}")
+        tracing.exception("verify_vin_failed", e)
         return JSONResponse(content={"status": "error", "message": str(e)}, status_code=500)
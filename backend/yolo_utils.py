@@ -0,0 +1,73 @@
+import os
+import threading
+import numpy as np
+
+from utils import inference_client
+from utils import runtime_profile
+from utils import tracing
+
+# ✅ YOLO OBB models, loaded once per model path. With INFERENCE_SERVER set,
+# run_yolo_obb forwards to the shared inference service instead of loading here.
+MODEL_CACHE = {}
+_cache_lock = threading.Lock()
+
+
+def load_yolo_obb(model_path: str):
+    if model_path not in MODEL_CACHE:
+        with _cache_lock:
+            if model_path not in MODEL_CACHE:
+                from ultralytics import YOLO  # heavy, warmed up in the background at startup
+                runtime_profile.configure_torch()
+                MODEL_CACHE[model_path] = YOLO(model_path)
+    return MODEL_CACHE[model_path]
+
+
+def new_yolo_obb(model_path: str):
+    """A separate instance of the model (an extra replica for utils.engine_pool), not the cached one."""
+    from ultralytics import YOLO
+    runtime_profile.configure_torch()
+    return YOLO(model_path)
+
+
+def warm_up():
+    import ultralytics  # noqa: F401  (models themselves load per KSpec on first use)
+    runtime_profile.configure_torch()
+
+
+def run_yolo_obb_local(model_path: str, img: np.ndarray):
+    return predict_obb(load_yolo_obb(model_path), img)
+
+
+def predict_obb(model, img: np.ndarray):
+    imgsz = runtime_profile.imgsz()  # calibrated input size (utils.runtime_profile), else the model's
+    results = model.predict(img, verbose=False, **({"imgsz": imgsz} if imgsz else {}))
+    detections = []
+    boxes = []
+    for r in results:
+        names = r.names
+        for obb in r.obb:
+            cls_id = int(obb.cls[0].item())
+            conf = float(obb.conf[0].item())
+            detections.append({"class": names[cls_id].lower(), "confidence": conf})
+            boxes.append(obb.xyxyxyxy.cpu().numpy())  # 4-point rotated bbox
+    return detections, boxes
+
+
+def kspec_model_paths():
+    """Every YOLO model referenced by a stored KSpec (for preloading)."""
+    from utils import asset_store, kspec_store
+
+    manifest = kspec_store.read_manifest()
+    paths = set()
+    for model_code in manifest:
+        kspec = kspec_store.load_kspec(model_code, manifest) or {}
+        paths.update(c[k] for c, k, kind in asset_store.iter_asset_fields(kspec) if kind == "model")
+    return sorted(p for p in paths if os.path.exists(p))
+
+
+def run_yolo_obb(model_path: str, img: np.ndarray):
+    remote = inference_client.enabled()
+    with tracing.span("yolo", model=os.path.basename(model_path), remote=remote) as span:
+        detections, boxes = (inference_client.run_yolo_obb if remote else run_yolo_obb_local)(model_path, img)
+        span["attrs"]["detections"] = len(detections)
+    return detections, boxes
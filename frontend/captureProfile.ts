@@ -0,0 +1,111 @@
+// utils/captureProfile.ts
+import AsyncStorage from '@react-native-async-storage/async-storage';
+import axios from 'axios';
+import * as ImageManipulator from 'expo-image-manipulator';
+import { getBackendBaseURL } from './api';
+
+// ✅ Capture profiles from the backend (GET /capture_profile): the long side and JPEG
+// quality each component's pipeline actually uses. Photos are scaled to that before
+// upload instead of sending full-resolution quality-1 shots the server shrinks anyway.
+// vin / person run MLKit on the device on the full capture; their profiles only say what
+// the server's OCR would read, should those photos be uploaded.
+
+export type CaptureProfile = {
+  max_side: number;
+  jpeg_quality: number; // 0-100
+};
+
+type CaptureProfiles = {
+  version: string;
+  vin: CaptureProfile;
+  person: CaptureProfile;
+  components?: Record<string, CaptureProfile>;
+};
+
+export type CapturedPhoto = {
+  uri: string;
+  width: number;
+  height: number;
+};
+
+export type ScaledPhoto = CapturedPhoto & {
+  originalWidth: number;
+  originalHeight: number;
+  version: string | null;
+};
+
+const STORAGE_KEY = 'capture_profiles';
+
+// Until the backend has answered once (what it derives for the default pipeline)
+const FALLBACK: CaptureProfiles = {
+  version: '',
+  vin: { max_side: 960, jpeg_quality: 90 },
+  person: { max_side: 960, jpeg_quality: 90 },
+};
+const FALLBACK_COMPONENT: CaptureProfile = { max_side: 1280, jpeg_quality: 90 };
+
+const loadCaptureProfiles = async (): Promise<CaptureProfiles> => {
+  const cached = await AsyncStorage.getItem(STORAGE_KEY);
+  return cached ? JSON.parse(cached) : FALLBACK;
+};
+
+// ✅ Refresh the cached profiles (with a case spec: its components too)
+export const fetchCaptureProfiles = async (caseSpec?: string): Promise<CaptureProfiles> => {
+  try {
+    const baseURL = await getBackendBaseURL();
+    const query = caseSpec ? `?case_spec=${encodeURIComponent(caseSpec)}` : '';
+    const res = await axios.get(`${baseURL}/capture_profile${query}`, { timeout: 5000 });
+    if (res.data.status === 'success') {
+      await AsyncStorage.setItem(STORAGE_KEY, JSON.stringify(res.data));
+      return res.data;
+    }
+  } catch (err: any) {
+    console.warn('⚠️ Capture profile unavailable, using the cached one:', err.message || err);
+  }
+  return loadCaptureProfiles();
+};
+
+export const getCaptureProfile = async (
+  screen: 'vin' | 'person' | 'component',
+  component?: string
+): Promise<{ profile: CaptureProfile; version: string | null }> => {
+  const profiles = await loadCaptureProfiles();
+  const profile = screen === 'component'
+    ? profiles.components?.[component ?? ''] ?? FALLBACK_COMPONENT
+    : profiles[screen] ?? FALLBACK[screen];
+  return { profile, version: profiles.version || null };
+};
+
+// ✅ Rotate (optional) and scale down to the profile's long side in one re-encode.
+// Capture at quality 1: this is where the photo gets its only lossy compression.
+export const scaleForPipeline = async (
+  photo: CapturedPhoto,
+  capture: { profile: CaptureProfile; version: string | null },
+  rotate = 0
+): Promise<ScaledPhoto> => {
+  const { profile, version } = capture;
+  const swapped = rotate % 180 !== 0;
+  const width = swapped ? photo.height : photo.width;
+  const height = swapped ? photo.width : photo.height;
+
+  const actions: ImageManipulator.Action[] = [];
+  if (rotate) actions.push({ rotate });
+  if (Math.max(width, height) > profile.max_side) {
+    actions.push(width >= height ? { resize: { width: profile.max_side } } : { resize: { height: profile.max_side } });
+  }
+
+  const base = { originalWidth: photo.width, originalHeight: photo.height, version };
+  const result = await ImageManipulator.manipulateAsync(photo.uri, actions, {
+    compress: profile.jpeg_quality / 100,
+    format: ImageManipulator.SaveFormat.JPEG,
+  });
+  return { uri: result.uri, width: result.width, height: result.height, ...base };
+};
+
+// Sent with uploads so the backend can tell pre-scaled photos apart (/metrics "capture")
+export const captureHeaders = (version?: string | null, original?: string | null): Record<string, string> => {
+  const headers: Record<string, string> = {};
+  if (version) headers['X-Capture-Profile'] = version;
+  if (original) headers['X-Capture-Original'] = original;
+  return headers;
+};
@@ -14,10 +14,11 @@ import {
 } from 'react-native';
 import MlkitOcr from 'react-native-mlkit-ocr';
 import { getBackendBaseURL } from '../utils/api';
+import { captureHeaders } from '../utils/captureProfile';
 
 export default function ProcessingPage() {
   const router = useRouter();
-  const { component, module, partIndex, capturedImage } = useLocalSearchParams();
+  const { component, module, partIndex, capturedImage, captureProfile, captureOriginal } = useLocalSearchParams();
 
   const [imageUri, setImageUri] = useState<string | null>(null);
   const rotationAnim = useRef(new Animated.Value(0)).current;
@@ -94,7 +95,8 @@ const processComponent = async (uri: string) => {
 
     // ✅ Retry the /process_component call
     const res = await retryPost(`${baseURL}/process_component`, formData, {
-      "Content-Type": "multipart/form-data"
+      "Content-Type": "multipart/form-data",
+      ...captureHeaders(captureProfile as string, captureOriginal as string),
     });
 
     if (res.data.status === "success") {
@@ -1,6 +1,5 @@
 import { FontAwesome, MaterialIcons } from '@expo/vector-icons';
 import AsyncStorage from '@react-native-async-storage/async-storage';
-import * as ImageManipulator from 'expo-image-manipulator';
 import * as ImagePicker from 'expo-image-picker';
 import { useLocalSearchParams, useRouter } from 'expo-router';
 import { useEffect, useState } from 'react';
@@ -14,6 +13,7 @@ import {
   View,
 } from 'react-native';
 import { useSafeAreaInsets } from 'react-native-safe-area-context';
+import { CapturedPhoto, getCaptureProfile, scaleForPipeline } from '../utils/captureProfile';
 
 interface ComponentEntry {
   name: string;
@@ -27,6 +27,7 @@ export default function RectifyPage() {
   const insets = useSafeAreaInsets();
   const { component, module, partIndex } = useLocalSearchParams();
   const [imageUri, setImageUri] = useState<string | null>(null);
+  const [captured, setCaptured] = useState<CapturedPhoto | null>(null);
   const [rotation, setRotation] = useState(0);
   const [entry, setEntry] = useState<ComponentEntry | null>(null);
   const [referenceImage, setReferenceImage] = useState<string | null>(null);
@@ -70,10 +71,11 @@ export default function RectifyPage() {
         mediaTypes: ImagePicker.MediaTypeOptions.Images,
         allowsEditing: true,
         aspect: [4, 3],
-        quality: 1,
+        quality: 1,  // compressed once, to the profile, in handleProceed
       });
       if (!result.canceled) {
         setImageUri(result.assets[0].uri);
+        setCaptured(result.assets[0]);
       } else {
         router.back();
       }
@@ -93,22 +95,14 @@ export default function RectifyPage() {
 
   const handleProceed = async () => {
     try {
-      if (!imageUri) {
+      if (!imageUri || !captured) {
         Alert.alert('Error', 'No image to process');
         return;
       }
 
-      let finalUri = imageUri;
-
-      // ✅ Apply rotation physically (only if rotation != 0)
-      if (rotation !== 0) {
-        const manipulated = await ImageManipulator.manipulateAsync(
-          imageUri,
-          [{ rotate: rotation }],
-          { compress: 1, format: ImageManipulator.SaveFormat.JPEG }
-        );
-        finalUri = manipulated.uri;
-      }
+      // ✅ Apply rotation physically and scale to what this component's pipeline needs
+      const capture = await getCaptureProfile('component', component as string);
+      const scaled = await scaleForPipeline(captured, capture, rotation);
 
       // ✅ Pass processed image to next screen
       router.push({
@@ -117,7 +111,9 @@ export default function RectifyPage() {
           component,
           module,
           partIndex: partIndex?.toString() || '0',
-          capturedImage: finalUri, // ✅ rotated image URI
+          capturedImage: scaled.uri, // ✅ rotated + scaled image URI
+          captureProfile: scaled.version ?? '',
+          captureOriginal: `${scaled.originalWidth}x${scaled.originalHeight}`,
         },
       });
     } catch (error) {
@@ -22,6 +22,7 @@ import axios from 'axios';
 import MlkitOcr from 'react-native-mlkit-ocr';
 import { ComponentEntry } from '../types/component';
 import { getBackendBaseURL } from '../utils/api';
+import { fetchCaptureProfiles } from '../utils/captureProfile';
 
 export default function VinScreen() {
   const [image, setImage] = useState<string | null>(null);
@@ -121,7 +122,7 @@ const handleTakePhoto = async () => {
     Alert.alert("VIN Verified ✅", `VIN: ${detectedVin}\nCase Spec: ${caseSpec}`);
 
     // ✅ Step 3: Fetch Case Spec
-    const caseRes = await retryGet(`${baseURL}/get_case_spec?case_code=${caseSpec}`);
+    const caseRes = await retryGet(`${baseURL}/get_case_spec?case_code=${caseSpec}&lite=1`);
 
     if (caseRes.data.status !== "success") {
       Alert.alert("Error", "Could not fetch Case Spec config.");
@@ -147,6 +148,7 @@ const handleTakePhoto = async () => {
     await AsyncStorage.setItem("interior_components", JSON.stringify(frontendConfig.interior));
     await AsyncStorage.setItem("exterior_components", JSON.stringify(frontendConfig.exterior));
     await AsyncStorage.setItem("loose_components", JSON.stringify(frontendConfig.loose));
+    await fetchCaptureProfiles(caseSpec);  // per-component resolution for rectify
 
     await initializeAuditFlow("interior", frontendConfig.interior);
     await initializeAuditFlow("exterior", frontendConfig.exterior);